@@ -1,8 +1,8 @@
 from django.contrib import admin
 
-from apps.mine.models import Text, ModeratedText, Task, Classroom, Notification, Miner
+from apps.mine.models import Text, ModeratedText, Task, Classroom, Notification, NotificationEvent, Miner
 
 
-@admin.register(Text, ModeratedText, Task, Classroom, Notification, Miner)
+@admin.register(Text, ModeratedText, Task, Classroom, Notification, NotificationEvent, Miner)
 class BasicAdmin(admin.ModelAdmin):
     pass
@@ -0,0 +1,119 @@
+"""
+What the teacher changed. Both sides of a moderation are split into word and punctuation tokens
+and aligned with difflib, and the resulting edit script is stored with the moderation as an
+Alignment: every replace, delete and insert span as character offsets into the original and the
+corrected text, packed into 17 bytes an edit. Equal runs are not stored, they are whatever lies
+between the edits.
+
+Alignments are computed in the background once per moderation, align_rows is free of the database
+so that big batches can be computed in a process pool, see the align_moderations command.
+Bumping VERSION marks every stored alignment stale.
+"""
+import re
+import struct
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+from django.db import transaction
+from django.db.models import Q
+
+from apps.mine.models import Alignment, ModeratedText
+
+
+VERSION = 1
+TOKEN = re.compile(r'\w+|[^\w\s]')
+EDIT = struct.Struct('<B4I')
+OPS = ('replace', 'delete', 'insert')
+
+Edit = namedtuple('Edit', 'op start end corrected_start corrected_end')
+
+
+def tokenize(text):
+    """The (start, end) offsets of the tokens of text."""
+    return [match.span() for match in TOKEN.finditer(text)]
+
+
+def align(original, corrected):
+    """The edits turning original into corrected, in order."""
+    a, b = tokenize(original), tokenize(corrected)
+    matcher = SequenceMatcher(None, [original[i:j] for i, j in a], [corrected[i:j] for i, j in b], autojunk=False)
+    edits = []
+    for op, i1, i2, j1, j2 in matcher.get_opcodes():
+        if op == 'equal':
+            continue
+        start, end = span(a, i1, i2)
+        corrected_start, corrected_end = span(b, j1, j2)
+        edits.append(Edit(op, start, end, corrected_start, corrected_end))
+    return edits
+
+
+def span(tokens, first, last):
+    """Offsets of tokens[first:last], an empty slice sits at the start of the token after it."""
+    if first < last:
+        return tokens[first][0], tokens[last - 1][1]
+    offset = tokens[first][0] if first < len(tokens) else (tokens[-1][1] if tokens else 0)
+    return offset, offset
+
+
+def pack(edits):
+    return b''.join(EDIT.pack(OPS.index(edit.op), *edit[1:]) for edit in edits)
+
+
+def unpack(data):
+    return [Edit(OPS[op], *offsets) for op, *offsets in EDIT.iter_unpack(data)]
+
+
+def align_rows(rows):
+    """[(pk, packed edits)] for rows of (pk, original, corrected), runs in pool workers."""
+    return [(pk, pack(align(original, corrected))) for pk, original, corrected in rows]
+
+
+def store(results):
+    """Saves the packed edits of align_rows, replacing older alignments of the same moderations."""
+    with transaction.atomic():
+        Alignment.objects.filter(moderated_text_id__in=[pk for pk, _ in results]).delete()
+        Alignment.objects.bulk_create(
+            [Alignment(moderated_text_id=pk, version=VERSION, edits=edits) for pk, edits in results], batch_size=500)
+
+
+def rows(moderated_texts):
+    return moderated_texts.order_by('pk').values_list('pk', 'original__content', 'content')
+
+
+def stale():
+    """Moderations without an alignment of the current version."""
+    return ModeratedText.objects.filter(Q(alignment__isnull=True) | Q(alignment__version__lt=VERSION))
+
+
+def compute(moderated_text_pks):
+    """Aligns moderated_text_pks in this process, returns how many there were."""
+    results = align_rows(rows(ModeratedText.objects.filter(pk__in=moderated_text_pks)))
+    store(results)
+    return len(results)
+
+
+def edits_of(text):
+    """The stored edits of the moderation of text, aligned on the spot while they are missing or stale."""
+    try:
+        alignment = text.moderated_text.alignment
+    except Alignment.DoesNotExist:
+        alignment = None
+    if alignment is not None and alignment.version == VERSION:
+        return unpack(alignment.edits)
+    return align(text.content, text.moderated_text.content)
+
+
+def segments(original, corrected, edits):
+    """
+    Original and corrected interleaved as (op, original part, corrected part) runs, where op is
+    'equal' or the op of an edit, for showing the corrections inline.
+    """
+    runs, position = [], 0
+    for edit in edits:
+        if edit.start > position:
+            runs.append(('equal', original[position:edit.start], ''))
+        runs.append((edit.op, original[edit.start:edit.end], corrected[edit.corrected_start:edit.corrected_end]))
+        position = edit.end
+    if position < len(original):
+        runs.append(('equal', original[position:], ''))
+    return runs
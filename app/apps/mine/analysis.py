@@ -0,0 +1,174 @@
+"""
+Text analysis shared by everything that reads essays as words: tokenizing, normalizing and
+stemming Kazakh.
+
+Tokens are runs of letters and digits, found in the raw text so that their offsets point into
+it. A token's form is its NFC, lowercased spelling with look-alike letters folded in: Latin
+letters typed inside Cyrillic words, and the Tatar and Bashkir letters or IPA symbols keyboards
+offer instead of the Kazakh ones. Stems strip the suffix chain of a form layer by layer from
+the end, the outermost first, each layer at most once and its longest suffix that leaves a stem
+of MIN_STEM letters, or of the layer's own minimum in MIN_STEMS, then undo the voicing of the last
+consonant (кітабымда -> кітаб -> кітап). There is no dictionary behind it, so it errs on the side
+of stripping too little, and stops at the common ROOTS that merely end like a suffix.
+
+Word forms repeat heavily across the corpus, so form and stem are memoized: analysing a text
+costs one dictionary lookup per token and the real work once per distinct form. Bumping VERSION
+marks anything stored from the analysis of an earlier version stale.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from config.settings.common import ANALYSIS_CACHE_SIZE
+
+
+VERSION = 2
+TOKEN = re.compile(r'[\w\u0300-\u036f\u00ad\u200b]+')
+CYRILLIC = re.compile(r'[\u0400-\u04ff]')
+MIN_STEM = 2
+# Case, verb and derivation suffixes are short and common word endings (шеше, дене, халық)
+MIN_STEMS = {'case': 3, 'verb': 3, 'derivation': 3}
+
+# Letters of other alphabets typed for Kazakh ones
+VARIANTS = {
+    'ə': 'ә', 'Ə': 'Ә', 'ɵ': 'ө', 'Ɵ': 'Ө', 'ҡ': 'қ', 'Ҡ': 'Қ', 'ӊ': 'ң', 'Ӊ': 'Ң', 'ӻ': 'ғ', 'Ӻ': 'Ғ',
+    '\u00ad': '', '\u200b': '',
+}
+# Latin letters looking like Cyrillic ones, folded in words that also have Cyrillic letters
+HOMOGLYPHS = str.maketrans({
+    'a': 'а', 'c': 'с', 'e': 'е', 'h': 'һ', 'i': 'і', 'k': 'к', 'o': 'о', 'p': 'р', 'x': 'х', 'y': 'у',
+    'A': 'А', 'B': 'В', 'C': 'С', 'E': 'Е', 'H': 'Н', 'I': 'І', 'K': 'К', 'M': 'М', 'O': 'О', 'P': 'Р',
+    'T': 'Т', 'X': 'Х', 'Y': 'У',
+})
+PUNCTUATION = {
+    '«': '"', '»': '"', '“': '"', '”': '"', '„': '"', '‘': "'", '’': "'", '‐': '-', '–': '-', '—': '-',
+    '…': '...', '\u00a0': ' ',
+}
+NORMALIZE = str.maketrans(dict(VARIANTS, **PUNCTUATION))
+FORM = str.maketrans(VARIANTS)
+SPACE = re.compile(r'\s+')
+VOICED = {'б': 'п', 'г': 'к', 'ғ': 'қ'}
+
+# Suffixes by layer, outermost first. A layer with a condition is only stripped after the layer it
+# names, a suffix marked ~ only after some outer layer: on its own it is more often part of the word.
+LAYERS = (
+    ('personal', 'мын мін бын бін пын пін мыз міз быз біз пыз піз сың сің сыз сіз сыңдар сіңдер сыздар сіздер', None),
+    ('case', 'ның нің дың дің тың тің ға ге қа ке на не ны ні ды ді ты ті да де та те '
+             'дан ден тан тен нан нен мен бен пен ша ше', None),
+    ('possessive', 'ым ім ың ің ~ы ~і сы сі ~ын ~ін ымыз іміз мыз міз ыңыз іңіз ңыз ңіз ларың лерің дарың дерің', None),
+    ('plural', 'лар лер дар дер тар тер', None),
+    ('tense', 'а е й', 'personal'),
+    ('verb', 'ған ген қан кен атын етін йтын йтін ып іп са се', None),
+    ('derivation', 'лық лік дық дік тық тік', None),
+)
+# Roots ending like a suffix that would leave a word of its own behind
+ROOTS = frozenset('''
+    бастық бөлім ғалым жақсы мұғалім сынып
+'''.split())
+
+
+class SuffixTrie:
+    """Suffixes stored back to front, so that the suffixes a word ends with are one walk from its end."""
+
+    def __init__(self, suffixes=()):
+        self.root = {}
+        for suffix in suffixes:
+            self.add(suffix)
+
+    def add(self, suffix):
+        chained = suffix.startswith('~')
+        suffix = suffix.lstrip('~')
+        node = self.root
+        for char in reversed(suffix):
+            node = node.setdefault(char, {})
+        node[None] = (len(suffix), chained)
+
+    def matches(self, word):
+        """The (length, chained) of the suffixes word ends with, longest first."""
+        found, node = [], self.root
+        for char in reversed(word):
+            node = node.get(char)
+            if node is None:
+                break
+            if None in node:
+                found.append(node[None])
+        return found[::-1]
+
+
+TRIES = tuple((name, SuffixTrie(suffixes.split()), condition) for name, suffixes, condition in LAYERS)
+
+
+def normalize(text):
+    """text in NFC with Kazakh letters, plain quotes and dashes and single spaces, for display and queries."""
+    text = unicodedata.normalize('NFC', text).translate(NORMALIZE)
+    text = TOKEN.sub(lambda match: fold(match.group()), text)
+    return SPACE.sub(' ', text).strip()
+
+
+def fold(word):
+    return word.translate(HOMOGLYPHS) if CYRILLIC.search(word) else word
+
+
+def tokenize(text):
+    """The (start, end) offsets of the tokens of text."""
+    return [match.span() for match in TOKEN.finditer(text)]
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def form(token):
+    """The normalized, lowercased spelling of token."""
+    return fold(unicodedata.normalize('NFC', token).translate(FORM)).casefold()
+
+
+@lru_cache(maxsize=ANALYSIS_CACHE_SIZE)
+def stem(word):
+    """word, a form, without its suffix chain."""
+    stripped = set()
+    for name, trie, condition in TRIES:
+        if word in ROOTS:
+            break
+        if condition is not None and condition not in stripped:
+            continue
+        min_stem = MIN_STEMS.get(name, MIN_STEM)
+        for length, chained in trie.matches(word):
+            if chained and not stripped:
+                continue
+            # A one letter suffix needs a longer stem, or every word ending in a vowel would lose it
+            if len(word) - length >= (min_stem + 1 if length == 1 else min_stem):
+                word = word[:-length]
+                stripped.add(name)
+                break
+    if stripped and word[-1] in VOICED:
+        word = word[:-1] + VOICED[word[-1]]
+    return word
+
+
+def words(text):
+    """The forms of the tokens of text, in order, without tokens that were only soft hyphens or zero width spaces."""
+    return [word for word in map(form, TOKEN.findall(text)) if word]
+
+
+def stems(text):
+    return [stem(word) for word in words(text)]
+
+
+def analyze(documents):
+    """
+    The stems of every document of documents, a list of texts. Each distinct form of the batch
+    is stemmed once, the cache only sees the forms it has not seen yet.
+    """
+    forms = [words(document) for document in documents]
+    table = {word: None for document in forms for word in document}
+    for word in table:
+        table[word] = stem(word)
+    return [[table[word] for word in document] for document in forms]
+
+
+def cache_info():
+    """The hits, misses and sizes of the form and stem caches."""
+    return {'form': form.cache_info(), 'stem': stem.cache_info()}
+
+
+def cache_clear():
+    form.cache_clear()
+    stem.cache_clear()
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 
 class MineConfig(AppConfig):
-    name = 'mine'
+    name = 'apps.mine'
+
+    def ready(self):
+        from apps.mine import signals  # noqa
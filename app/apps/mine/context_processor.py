@@ -1,5 +1,6 @@
 from django.http import request
 from apps.mine.models import Classroom
+from apps.mine.notifications import unread_count
 from config.settings.common import EMAIL_HOST_USER
 
 app_superuser = EMAIL_HOST_USER
@@ -8,3 +9,9 @@ app_superuser = EMAIL_HOST_USER
 def main_classrooms(request):
     classrooms = Classroom.objects.filter(owner__email=app_superuser).order_by('pk').values_list('pk', 'title')
     return {'main_classrooms': classrooms}
+
+
+def unread_notifications(request):
+    if not request.user.is_authenticated:
+        return {}
+    return {'unread_notifications': unread_count(request.user.pk)}
@@ -0,0 +1,104 @@
+"""
+Export of the corpus: every graded essay paired with its correction and grades, as JSON lines or
+CSV. Rows are read with iterator(chunk_size), a server-side cursor on PostgreSQL, as plain tuples
+and written out chunk by chunk, so memory stays flat whatever the size of the corpus.
+
+A text is exported with its Text.moderated_text and the edit script of apps.mine.alignment,
+filtered by the classroom and level of its task and by when it was graded.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+
+from django.utils import timezone
+
+from apps.mine import alignment
+from apps.mine.models import Text
+from config.settings.common import CORPUS_EXPORT_CHUNK_SIZE
+
+
+COLUMNS = (
+    ('text_id', 'pk'),
+    ('moderation_id', 'moderated_text_id'),
+    ('miner_id', 'creator_id'),
+    ('classroom_id', 'task__classroom_id'),
+    ('task_id', 'task_id'),
+    ('task_level', 'task__task_level'),
+    ('written_at', 'date'),
+    ('moderated_at', 'moderated_at'),
+    ('grammar_grade', 'moderated_text__grammar_grade'),
+    ('essay_grade', 'moderated_text__essay_grade'),
+    ('original', 'content'),
+    ('corrected', 'moderated_text__content'),
+    ('edits', 'moderated_text__alignment__edits'),
+)
+HEADER = tuple(name for name, _ in COLUMNS)
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def day_start(date):
+    return timezone.make_aware(datetime.combine(date, time.min))
+
+
+def pairs(classroom_pks=None, levels=None, since=None, until=None):
+    """Graded texts in export order, since and until are dates, both inclusive."""
+    texts = Text.objects.filter(status=Text.MODERATED, moderated_text__isnull=False)
+    if classroom_pks:
+        texts = texts.filter(task__classroom_id__in=classroom_pks)
+    if levels:
+        texts = texts.filter(task__task_level__in=levels)
+    if since is not None:
+        texts = texts.filter(moderated_at__gte=day_start(since))
+    if until is not None:
+        texts = texts.filter(moderated_at__lt=day_start(until + timedelta(days=1)))
+    return texts.order_by('pk')
+
+
+def rows(texts, chunk_size=CORPUS_EXPORT_CHUNK_SIZE):
+    """Rows of COLUMNS, with the edits unpacked into [op, start, end, corrected start, corrected end] lists."""
+    for *row, edits in texts.values_list(*(field for _, field in COLUMNS)).iterator(chunk_size=chunk_size):
+        row.append(None if edits is None else [list(edit) for edit in alignment.unpack(edits)])
+        yield row
+
+
+def jsonl(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(HEADER, row)), ensure_ascii=False, default=str) + '\n'
+
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        if row[-1] is not None:
+            row[-1] = json.dumps(row[-1])
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def chunks(lines, size=CORPUS_EXPORT_CHUNK_SIZE):
+    """Joins lines into chunks of size lines, fewer and bigger writes than one per row."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+def export(format, texts, chunk_size=CORPUS_EXPORT_CHUNK_SIZE):
+    """The export of texts in format ('jsonl' or 'csv') as a stream of string chunks."""
+    if format == 'csv':
+        lines = csv_lines(rows(texts, chunk_size))
+        yield ','.join(HEADER) + '\r\n'
+    else:
+        lines = jsonl(rows(texts, chunk_size))
+    yield from chunks(lines, chunk_size)
@@ -0,0 +1,171 @@
+"""
+What teachers correct. The moderation of every text is cut into edit pairs: for each edit of its
+Alignment, the span of the original and the span of the correction it became, normalized for
+display by apps.mine.analysis and casefolded, an empty span standing for nothing inserted or
+deleted. Each text keeps its pairs as Correction rows, with its miner and the classroom and level
+of its task, and the pairs of every text add up to CorrectionCount rows in the same four scopes
+apps.mine.frequencies counts n-grams in. The top corrections of a scope are one index lookup, the
+miners making a mistake one index range.
+
+recount() replaces the pairs of texts with those of their current moderation and takes the old
+ones away from the counts they were added to, so it can run as often as anything changes: once a
+moderation is aligned, see the align_moderations task, and when a text changes moderation or task.
+count_task() moves the pairs of a task that changes classroom or level without realigning them.
+"""
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Sum
+
+from apps.mine import alignment, analysis, frequencies
+from apps.mine.models import Correction, CorrectionCount, Text
+
+
+EVERY_CLASSROOM, EVERY_LEVEL = frequencies.EVERY_CLASSROOM, frequencies.EVERY_LEVEL
+MAX_LENGTH = Correction._meta.get_field('original').max_length
+BATCH_SIZE = 500
+
+
+def side(span):
+    """span as it is counted, its normalized and casefolded text."""
+    return analysis.normalize(span).casefold()
+
+
+def split(original, corrected):
+    """
+    original and corrected, the spans of one edit, token by token when they have as many tokens,
+    difflib merges neighbouring replacements into one.
+    """
+    a, b = alignment.tokenize(original), alignment.tokenize(corrected)
+    if len(a) != len(b) or len(a) < 2:
+        return [(original, corrected)]
+    return [(original[i:j], corrected[k:l]) for (i, j), (k, l) in zip(a, b)]
+
+
+def pairs(original, corrected, edits):
+    """The (original span, corrected span) counts of edits, short enough to be counted."""
+    found = Counter()
+    for edit in edits:
+        for spans in split(original[edit.start:edit.end], corrected[edit.corrected_start:edit.corrected_end]):
+            pair = tuple(map(side, spans))
+            # Quotes and spacing changes normalize away
+            if pair[0] != pair[1] and max(map(len, pair)) <= MAX_LENGTH:
+                found[pair] += 1
+    return found
+
+
+def scopes(classroom_pk, task_level):
+    """The (classroom, level) scopes a pair counted in classroom_pk at task_level adds to."""
+    return {(EVERY_CLASSROOM, EVERY_LEVEL), (EVERY_CLASSROOM, task_level), (classroom_pk, EVERY_LEVEL),
+            (classroom_pk, task_level)}
+
+
+def changes(rows, sign):
+    """CorrectionCount deltas for rows of (classroom, task_level, original, corrected, count)."""
+    deltas = Counter()
+    for classroom_pk, task_level, original, corrected, count in rows:
+        for classroom, level in scopes(classroom_pk, task_level):
+            deltas[classroom, level, original, corrected] += sign * count
+    return deltas
+
+
+def counted(corrections):
+    return corrections.values_list('classroom', 'task_level', 'original', 'corrected', 'count')
+
+
+def extract(text_pks):
+    """The Correction rows of the current moderations of text_pks, aligned on the spot when their alignment is stale."""
+    found = []
+    rows = Text.objects.filter(pk__in=text_pks, moderated_text__isnull=False).values_list(
+        'pk', 'creator_id', 'task__classroom_id', 'task__task_level', 'content', 'moderated_text__content',
+        'moderated_text__alignment__version', 'moderated_text__alignment__edits')
+    for pk, miner_pk, classroom_pk, task_level, original, corrected, version, edits in rows:
+        edits = alignment.unpack(edits) if version == alignment.VERSION else alignment.align(original, corrected)
+        found += [
+            Correction(text_id=pk, miner_id=miner_pk, classroom=classroom_pk or EVERY_CLASSROOM,
+                       task_level=task_level or EVERY_LEVEL, original=a, corrected=b, count=count)
+            for (a, b), count in sorted(pairs(original, corrected, edits).items())
+        ]
+    return found
+
+
+def recount(text_pks):
+    """Replaces the pairs of text_pks with those of their current moderation, a text without one has none."""
+    text_pks = sorted(set(text_pks))
+    for start in range(0, len(text_pks), BATCH_SIZE):
+        batch = text_pks[start:start + BATCH_SIZE]
+        with transaction.atomic():
+            # Texts recounted at once by two processes would take their old pairs away twice
+            list(Text.objects.select_for_update().filter(pk__in=batch).order_by('pk').values_list('pk', flat=True))
+            old = Correction.objects.filter(text_id__in=batch)
+            deltas = changes(counted(old), -1)
+            found = extract(batch)
+            deltas.update(changes(((c.classroom, c.task_level, c.original, c.corrected, c.count) for c in found), 1))
+            old.delete()
+            Correction.objects.bulk_create(found, batch_size=500)
+            frequencies.apply(deltas, CorrectionCount)
+
+
+def forget(text_pks):
+    """Takes the pairs of text_pks away, before the texts are deleted."""
+    with transaction.atomic():
+        old = Correction.objects.filter(text_id__in=text_pks)
+        frequencies.apply(changes(counted(old), -1), CorrectionCount)
+        old.delete()
+
+
+def count_task(task_pk, placed):
+    """Moves the pairs of the texts of task_pk to placed, a (classroom_pk, task_level) pair or None when it goes."""
+    classroom_pk, task_level = placed or (None, None)
+    classroom_pk, task_level = classroom_pk or EVERY_CLASSROOM, task_level or EVERY_LEVEL
+    with transaction.atomic():
+        moved = Correction.objects.filter(text__task_id=task_pk)
+        rows = list(counted(moved))
+        deltas = changes(rows, -1)
+        deltas.update(changes(((classroom_pk, task_level) + row[2:] for row in rows), 1))
+        moved.update(classroom=classroom_pk, task_level=task_level)
+        frequencies.apply(deltas, CorrectionCount)
+
+
+def forget_classroom(classroom_pk):
+    """Counts the pairs of a deleted classroom in every classroom only, as its tasks are left without one."""
+    CorrectionCount.objects.filter(classroom=classroom_pk).delete()
+    Correction.objects.filter(classroom=classroom_pk).update(classroom=EVERY_CLASSROOM)
+
+
+def top(k=50, classroom_pk=EVERY_CLASSROOM, task_level=EVERY_LEVEL):
+    """The k most frequent corrections of a scope as (original, corrected, count), most frequent first."""
+    return list(CorrectionCount.objects.filter(classroom=classroom_pk, task_level=task_level)
+                .order_by('-count').values_list('original', 'corrected', 'count')[:k])
+
+
+def miners(original, corrected=None, k=50):
+    """
+    The k miners whose texts had original corrected, to corrected or to anything, as (miner_pk,
+    count), most often first. Both are normalized like the pairs.
+    """
+    found = Correction.objects.filter(original=side(original))
+    if corrected is not None:
+        found = found.filter(corrected=side(corrected))
+    return list(found.values('miner').annotate(total=Sum('count')).order_by('-total', 'miner')
+                .values_list('miner', 'total')[:k])
+
+
+def mistakes(miner_pk, k=50):
+    """The k corrections made most often to the texts of miner_pk as (original, corrected, count)."""
+    return list(Correction.objects.filter(miner_id=miner_pk).values('original', 'corrected')
+                .annotate(total=Sum('count')).order_by('-total', 'original', 'corrected')
+                .values_list('original', 'corrected', 'total')[:k])
+
+
+def count_range(start, stop):
+    """Counts the texts with start <= pk < stop and returns how many were moderated, runs in pool workers."""
+    text_pks = list(Text.objects.filter(pk__gte=start, pk__lt=stop, moderated_text__isnull=False)
+                    .values_list('pk', flat=True))
+    recount(text_pks)
+    return len(text_pks)
+
+
+def clear():
+    Correction.objects.all().delete()
+    CorrectionCount.objects.all().delete()
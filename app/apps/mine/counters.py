@@ -0,0 +1,69 @@
+"""
+Per-classroom totals: tasks, participants, pending and moderated texts. The signal handlers in
+apps.mine.signals and apps.mine.moderation shift them in place, so the classroom pages never
+run COUNT(*) over their rows. recount rebuilds them from scratch.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from apps.mine.models import Classroom, ClassroomCounter, Miner, Task, Text
+
+
+STATUS_FIELDS = {
+    Text.PENDING: 'pending_texts',
+    Text.MODERATED: 'moderated_texts',
+}
+
+
+def shift(classroom_pk, **deltas):
+    deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if classroom_pk is not None and deltas:
+        ClassroomCounter.objects.filter(classroom_id=classroom_pk).update(**deltas)
+
+
+def shift_text(classroom_pk, status, delta):
+    shift(classroom_pk, **{STATUS_FIELDS[status]: delta})
+
+
+def refresh_participants(classroom_pks):
+    """Recounts the participants of classroom_pks, memberships change one miner at a time."""
+    for classroom_pk in set(classroom_pks):
+        count = Miner.classroom.through.objects.filter(classroom_id=classroom_pk).count()
+        ClassroomCounter.objects.filter(classroom_id=classroom_pk).update(participants=count)
+
+
+def recount(classroom_pks=None):
+    """Rebuilds the counters of classroom_pks, of every classroom by default, and returns how many there are."""
+    classrooms = Classroom.objects.all()
+    if classroom_pks is not None:
+        classrooms = classrooms.filter(pk__in=classroom_pks)
+    classroom_pks = list(classrooms.values_list('pk', flat=True))
+
+    def totals(queryset, field):
+        return dict(queryset.filter(**{field + '__in': classroom_pks}).order_by()
+                    .values_list(field).annotate(count=Count('pk')))
+
+    tasks = totals(Task.objects.all(), 'classroom_id')
+    participants = totals(Miner.classroom.through.objects.all(), 'classroom_id')
+    texts = {status: totals(Text.objects.filter(status=status), 'classroom_id') for status in STATUS_FIELDS}
+    with transaction.atomic():
+        ClassroomCounter.objects.filter(classroom_id__in=classroom_pks).delete()
+        ClassroomCounter.objects.bulk_create([
+            ClassroomCounter(
+                classroom_id=classroom_pk,
+                tasks=tasks.get(classroom_pk, 0),
+                participants=participants.get(classroom_pk, 0),
+                pending_texts=texts[Text.PENDING].get(classroom_pk, 0),
+                moderated_texts=texts[Text.MODERATED].get(classroom_pk, 0),
+            ) for classroom_pk in classroom_pks
+        ], batch_size=1000)
+    return len(classroom_pks)
+
+
+def counter(classroom):
+    """The counter of classroom, recounted if it went missing."""
+    try:
+        return classroom.counter
+    except ClassroomCounter.DoesNotExist:
+        recount([classroom.pk])
+        return ClassroomCounter.objects.get(classroom=classroom)
@@ -3,6 +3,7 @@ from crispy_forms.layout import Submit
 from django import forms
 from django.utils.translation import ugettext_lazy as _
 
+from apps.mine.corpus import FORMATS
 from apps.mine.models import Text, ModeratedText, Task, Classroom
 
 
@@ -121,4 +122,38 @@ class ModifyTaskForm(forms.ModelForm):
             'task_level': _('Тапсырма деңгейі'),
             'task_title': _('Тапсырма атауы'),
             'task_description': _('Тапсырма сипаттамасы'),
-        }
\ No newline at end of file
+        }
+
+class GradeImportForm(forms.Form):
+    file = forms.FileField(label=_('Бағалар файлы (CSV немесе JSONL)'))
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_id = 'id-offline-ticket'
+        self.helper.form_class = 'OfflineTicket'
+        self.helper.form_method = 'post'
+        self.helper.add_input(Submit('submit', _('Жүктеу'), css_class='btn btn-dark'))
+
+
+class CorpusExportForm(forms.Form):
+    format = forms.ChoiceField(choices=[(format, format.upper()) for format in FORMATS], initial='jsonl')
+    classroom = forms.ModelMultipleChoiceField(queryset=Classroom.objects.order_by('title'), required=False)
+    level = forms.MultipleChoiceField(choices=Task.LEVEL_CHOICES, required=False)
+    since = forms.DateField(required=False, help_text='Graded on or after, YYYY-MM-DD')
+    until = forms.DateField(required=False, help_text='Graded on or before, YYYY-MM-DD')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.helper = FormHelper()
+        self.helper.form_method = 'get'
+        self.helper.add_input(Submit('submit', 'Export', css_class='btn btn-dark'))
+
+    def filters(self):
+        """The keyword arguments of apps.mine.corpus.pairs for the cleaned data."""
+        return {
+            'classroom_pks': [classroom.pk for classroom in self.cleaned_data['classroom']],
+            'levels': self.cleaned_data['level'],
+            'since': self.cleaned_data['since'],
+            'until': self.cleaned_data['until'],
+        }
@@ -0,0 +1,180 @@
+"""
+Word and n-gram frequencies of the corpus. Every text with a task counts its unigrams, bigrams and
+trigrams once as the original side and, through its Text.moderated_text, once as the corrected
+side, in four scopes: the classroom and level of its task, the classroom at every level, every
+classroom at the level, and the whole corpus. Each count is one NgramCount row, indexed so that
+the top n-grams of a scope and the frequency of one n-gram are single index lookups.
+
+Every text keeps what it was counted as in a CountedText row: the word form ids of both sides,
+as stored by apps.mine.tokens, and the placement they were added in. recount() takes that away
+and adds the texts as they are now, with one INSERT ... ON CONFLICT DO UPDATE per batch of rows,
+so it can run as often as anything changes and its decrements stay exact whatever happened to the
+text meanwhile. The signal handlers in apps.mine.signals and apps.mine.grading queue it as the
+count_frequencies task once texts are written, moved, graded or deleted. Counts that drop to zero
+are deleted. The rebuild_frequencies command recounts the corpus from scratch, a range of pks per
+worker of a process pool, so memory stays flat however big the tables grow.
+"""
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from apps.mine import tokens
+from apps.mine.analysis import words
+from apps.mine.models import CountedText, ModeratedText, NgramCount, Text
+
+
+SIZES = (1, 2, 3)
+EVERY_CLASSROOM, EVERY_LEVEL = 0, ''
+MAX_LENGTH = NgramCount._meta.get_field('ngram').max_length
+UPSERT_BATCH_SIZE = 500
+BATCH_SIZE = 500
+
+
+def ngrams(forms):
+    """The (n, n-gram) counts of forms, the word forms of a text, n-grams are forms joined by spaces."""
+    counts = Counter()
+    for n in SIZES:
+        counts.update((n, ' '.join(forms[i:i + n])) for i in range(len(forms) - n + 1))
+    return Counter({key: count for key, count in counts.items() if len(key[1]) <= MAX_LENGTH})
+
+
+def scopes(classroom_pk, task_level):
+    """The (classroom, level) scopes a text of a task in classroom_pk at task_level counts in."""
+    placed = [(EVERY_CLASSROOM, EVERY_LEVEL), (EVERY_CLASSROOM, task_level)]
+    if classroom_pk is not None:
+        placed += [(classroom_pk, EVERY_LEVEL), (classroom_pk, task_level)]
+    return placed
+
+
+def changes(contents, sign):
+    """
+    Row deltas for contents, an iterable of (side, word forms, classroom_pk, task_level), keyed
+    by (side, classroom, task_level, n, ngram).
+    """
+    deltas = Counter()
+    for side, forms, classroom_pk, task_level in contents:
+        if not forms:
+            continue
+        for (n, ngram), count in ngrams(forms).items():
+            for classroom, level in scopes(classroom_pk, task_level):
+                deltas[side, classroom, level, n, ngram] += sign * count
+    return deltas
+
+
+def apply(deltas, model=NgramCount):
+    """
+    Shifts the counts of model by deltas, keyed by its unique_together fields, creating the rows
+    that are missing and deleting those that reach zero.
+    """
+    keys = sorted(key for key, delta in deltas.items() if delta)
+    if not keys:
+        return
+    fields = model._meta.unique_together[0]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # In key order, so that concurrent writers lock rows in the same order
+        for start in range(0, len(keys), UPSERT_BATCH_SIZE):
+            batch = keys[start:start + UPSERT_BATCH_SIZE]
+            sql = ('INSERT INTO {table} ({fields}, count) VALUES {values} '
+                   'ON CONFLICT ({fields}) DO UPDATE SET count = {table}.count + EXCLUDED.count').format(
+                table=table, fields=', '.join(fields),
+                values=', '.join(['({})'.format(', '.join(['%s'] * (len(fields) + 1)))] * len(batch)))
+            cursor.execute(sql, [param for key in batch for param in key + (deltas[key], )])
+        emptied = {}
+        for key in keys:
+            if deltas[key] < 0:
+                emptied.setdefault(key[:-1], []).append(key[-1])
+        for prefix, shrunk in emptied.items():
+            for start in range(0, len(shrunk), UPSERT_BATCH_SIZE):
+                model.objects.filter(count__lte=0, **dict(zip(fields, prefix)), **{
+                    fields[-1] + '__in': shrunk[start:start + UPSERT_BATCH_SIZE]}).delete()
+
+
+def counted(rows):
+    """The contents of changes() for rows of (classroom, task_level, original, corrected), packed form ids."""
+    rows = [(classroom_pk, task_level, tokens.unpack(original), None if corrected is None else tokens.unpack(corrected))
+            for classroom_pk, task_level, original, corrected in rows]
+    found = tokens.forms([pk for _, _, original, corrected in rows for ids in (original, corrected or ()) for pk in ids])
+    for classroom_pk, task_level, original, corrected in rows:
+        yield NgramCount.ORIGINAL, [found[pk] for pk in original], classroom_pk, task_level
+        if corrected is not None:
+            yield NgramCount.CORRECTED, [found[pk] for pk in corrected], classroom_pk, task_level
+
+
+def extract(text_pks):
+    """The CountedText rows of both sides of text_pks as they are now, those without a task have none."""
+    rows = list(Text.objects.filter(pk__in=text_pks, task__isnull=False).values_list(
+        'pk', 'moderated_text_id', 'task__classroom_id', 'task__task_level'))
+    originals = tokens.load(Text, [pk for pk, _, _, _ in rows])
+    corrections = tokens.load(ModeratedText, [pk for _, pk, _, _ in rows if pk is not None])
+    ids = tokens.form_ids([word for found in (originals, corrections) for side in found.values() for word in side.words])
+    return [
+        CountedText(text=pk, classroom=classroom_pk, task_level=task_level,
+                    original=tokens.pack(ids[word] for word in originals[pk].words),
+                    corrected=tokens.pack(ids[word] for word in corrections[moderated_text_pk].words)
+                    if moderated_text_pk in corrections else None)
+        for pk, moderated_text_pk, classroom_pk, task_level in rows
+    ]
+
+
+def recount(text_pks):
+    """
+    Replaces what text_pks were counted as with both sides of their current tokens, in the
+    placement of their task. A text that is deleted or has no task counts nothing.
+    """
+    text_pks = sorted(set(text_pks))
+    for start in range(0, len(text_pks), BATCH_SIZE):
+        batch = text_pks[start:start + BATCH_SIZE]
+        with transaction.atomic():
+            # Texts recounted at once by two processes would take their old n-grams away twice,
+            # deleted texts only have their snapshot left to lock
+            list(Text.objects.select_for_update().filter(pk__in=batch).order_by('pk').values_list('pk', flat=True))
+            old = CountedText.objects.filter(text__in=batch)
+            deltas = changes(counted(old.select_for_update().order_by('text').values_list(
+                'classroom', 'task_level', 'original', 'corrected')), -1)
+            found = extract(batch)
+            deltas.update(changes(counted((c.classroom, c.task_level, c.original, c.corrected) for c in found), 1))
+            old.delete()
+            CountedText.objects.bulk_create(found, batch_size=500)
+            apply(deltas)
+
+
+def forget_classroom(classroom_pk):
+    """Counts the texts of a deleted classroom in every classroom only, as its tasks are left without one."""
+    NgramCount.objects.filter(classroom=classroom_pk).delete()
+    CountedText.objects.filter(classroom=classroom_pk).update(classroom=None)
+
+
+def top(side=NgramCount.ORIGINAL, n=1, k=50, classroom_pk=EVERY_CLASSROOM, task_level=EVERY_LEVEL):
+    """The k most frequent n-grams of a scope as (n-gram, count) pairs, most frequent first."""
+    return list(NgramCount.objects.filter(side=side, classroom=classroom_pk, task_level=task_level, n=n)
+                .order_by('-count').values_list('ngram', 'count')[:k])
+
+
+def frequency(ngram, side=NgramCount.ORIGINAL, classroom_pk=EVERY_CLASSROOM, task_level=EVERY_LEVEL):
+    """How often ngram occurs in a scope, it is normalized like the corpus."""
+    tokens = words(ngram)
+    found = NgramCount.objects.filter(side=side, classroom=classroom_pk, task_level=task_level, n=len(tokens),
+                                      ngram=' '.join(tokens)).values_list('count', flat=True).first()
+    return found or 0
+
+
+def count_range(start, stop):
+    """Counts the texts with start <= pk < stop and returns how many there were, runs in pool workers."""
+    text_pks = list(Text.objects.filter(pk__gte=start, pk__lt=stop).values_list('pk', flat=True))
+    recount(text_pks)
+    return len(text_pks)
+
+
+def ranges(size):
+    """[start, stop) pk ranges of size covering every text."""
+    bounds = Text.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is None:
+        return []
+    return [(start, start + size) for start in range(bounds['first'], bounds['last'] + 1, size)]
+
+
+def clear():
+    CountedText.objects.all().delete()
+    NgramCount.objects.all().delete()
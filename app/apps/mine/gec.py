@@ -0,0 +1,196 @@
+"""
+Export of the corpus for training grammatical error correction models. Every graded essay and its
+correction are cut into sentences of word and punctuation tokens, the tokens of apps.mine.alignment,
+and written as M2, one S line per source sentence followed by its A lines, and as parallel source
+and target files, one tokenized sentence a line. Sentences end after a run of . ! ? or ..., unless
+an edit spans the end. An insertion at the end of a sentence belongs to it.
+
+The export is a directory of gzip-compressed shards of GEC_EXPORT_SHARD_SIZE essays in pk order,
+part-NNNNN.m2.gz, .src.gz and .tgt.gz, and a manifest.json listing the shards written so far. Each
+shard is read, aligned and written by one worker of a process pool, with the stored alignment when
+it is of the current version, and only shows up in the manifest once it and every shard before it
+are complete, so an interrupted export resumes after the last shard of the manifest.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+from bisect import bisect_left, bisect_right
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from apps.mine import alignment, corpus
+from config.settings.common import CORPUS_EXPORT_CHUNK_SIZE
+
+
+VERSION = 1
+MANIFEST = 'manifest.json'
+WORD = re.compile(r'\w')
+ENDS = frozenset('.!?…')
+TYPES = {'replace': 'R:OTHER', 'insert': 'M:OTHER', 'delete': 'U:OTHER'}
+NOOP = 'A -1 -1|||noop|||-NONE-|||REQUIRED|||-NONE-|||0'
+EXTENSIONS = {'m2': 'm2', 'source': 'src', 'target': 'tgt'}
+
+
+def boundaries(tokens):
+    """The indices of tokens at which a new sentence starts."""
+    found, ended = [], False
+    for i, token in enumerate(tokens):
+        if WORD.match(token):
+            if ended:
+                found.append(i)
+            ended = False
+        elif token in ENDS:
+            ended = True
+    return found
+
+
+def token_edits(a, b, edits):
+    """edits as (op, i1, i2, j1, j2) token indices into a and b, the (start, end) offsets of the tokens."""
+    a_starts, b_starts = [start for start, _ in a], [start for start, _ in b]
+    return [(edit.op, bisect_left(a_starts, edit.start), bisect_left(a_starts, edit.end),
+             bisect_left(b_starts, edit.corrected_start), bisect_left(b_starts, edit.corrected_end))
+            for edit in edits]
+
+
+def sentences(source, target, edits):
+    """
+    (source tokens, target tokens, edits) of each sentence of a pair of token lists and their
+    token edits, the edit indices relative to the sentence.
+    """
+    starts = [i for i in boundaries(source) if not any(i1 < i < i2 for _, i1, i2, _, _ in edits)]
+    ends = starts + [len(source)]
+    grouped = [[] for _ in ends]
+    for edit in edits:
+        _, i1, i2, _, _ = edit
+        grouped[(bisect_left if i1 == i2 else bisect_right)(ends, i1)].append(edit)
+    found, start, target_start = [], 0, 0
+    for end, sentence_edits in zip(ends, grouped):
+        target_end = target_start + end - start + sum((j2 - j1) - (i2 - i1) for _, i1, i2, j1, j2 in sentence_edits)
+        found.append((source[start:end], target[target_start:target_end],
+                      [(op, i1 - start, i2 - start, j1 - target_start, j2 - target_start)
+                       for op, i1, i2, j1, j2 in sentence_edits]))
+        start, target_start = end, target_end
+    return found
+
+
+def m2(source, target, edits):
+    lines = ['S ' + ' '.join(source)]
+    lines += ['A {} {}|||{}|||{}|||REQUIRED|||-NONE-|||0'.format(i1, i2, TYPES[op], ' '.join(target[j1:j2]))
+              for op, i1, i2, j1, j2 in edits] or [NOOP]
+    return '\n'.join(lines) + '\n\n'
+
+
+def convert(original, corrected, edits):
+    """The sentences of a pair as (m2, source line, target line, edit count), aligned on the spot when edits is None."""
+    if edits is None:
+        edits = alignment.align(original, corrected)
+    a, b = alignment.tokenize(original), alignment.tokenize(corrected)
+    source, target = [original[i:j] for i, j in a], [corrected[i:j] for i, j in b]
+    return [(m2(*sentence), ' '.join(sentence[0]) + '\n', ' '.join(sentence[1]) + '\n', len(sentence[2]))
+            for sentence in sentences(source, target, token_edits(a, b, edits)) if sentence[0]]
+
+
+def name(number, kind):
+    return 'part-{:05d}.{}.gz'.format(number, EXTENSIONS[kind])
+
+
+def digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def query(filters):
+    """corpus.pairs of filters as they are in the manifest, with dates as YYYY-MM-DD."""
+    dates = {key: parse_date(filters[key]) if filters[key] else None for key in ('since', 'until')}
+    return corpus.pairs(filters['classroom_pks'], filters['levels'], **dates)
+
+
+def write_shard(directory, number, filters, first, last):
+    """
+    Writes the shard of the pairs of filters with first <= pk <= last and returns its manifest
+    entry, runs in pool workers.
+    """
+    texts = query(filters).filter(pk__gte=first, pk__lte=last)
+    rows = texts.values_list('content', 'moderated_text__content', 'moderated_text__alignment__version',
+                             'moderated_text__alignment__edits').iterator(chunk_size=CORPUS_EXPORT_CHUNK_SIZE)
+    paths = {kind: os.path.join(directory, name(number, kind)) for kind in EXTENSIONS}
+    files = {kind: gzip.open(path + '.tmp', 'wt', encoding='utf-8', compresslevel=6) for kind, path in paths.items()}
+    pairs = sentence_count = edit_count = 0
+    try:
+        for original, corrected, version, edits in rows:
+            edits = alignment.unpack(edits) if version == alignment.VERSION else None
+            for m2_lines, source, target, count in convert(original, corrected, edits):
+                files['m2'].write(m2_lines)
+                files['source'].write(source)
+                files['target'].write(target)
+                sentence_count += 1
+                edit_count += count
+            pairs += 1
+    finally:
+        for f in files.values():
+            f.close()
+    for path in paths.values():
+        os.replace(path + '.tmp', path)
+    return {
+        'number': number, 'first_pk': first, 'last_pk': last, 'pairs': pairs, 'sentences': sentence_count,
+        'edits': edit_count,
+        'files': {kind: {'name': os.path.basename(path), 'bytes': os.path.getsize(path), 'sha256': digest(path)}
+                  for kind, path in paths.items()},
+    }
+
+
+def shards(texts, size, after=None):
+    """(first pk, last pk) of every shard of size texts in pk order, after the pk after."""
+    if after is not None:
+        texts = texts.filter(pk__gt=after)
+    found, first, count, pk = [], None, 0, None
+    for pk in texts.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=CORPUS_EXPORT_CHUNK_SIZE):
+        if first is None:
+            first = pk
+        count += 1
+        if count == size:
+            found.append((first, pk))
+            first, count = None, 0
+    if first is not None:
+        found.append((first, pk))
+    return found
+
+
+def new_manifest(filters, shard_size):
+    return {
+        'version': VERSION, 'alignment_version': alignment.VERSION, 'filters': filters, 'shard_size': shard_size,
+        'started': timezone.now().isoformat(), 'completed': None, 'shards': [],
+    }
+
+
+def read_manifest(directory):
+    """The manifest of the export in directory, None when there is none."""
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def remove_shards(directory, manifest):
+    """Deletes the files of the shards listed in manifest and the manifest itself."""
+    for shard in manifest['shards']:
+        for kind in shard['files'].values():
+            path = os.path.join(directory, kind['name'])
+            if os.path.exists(path):
+                os.remove(path)
+    os.remove(os.path.join(directory, MANIFEST))
+
+
+def write_manifest(directory, manifest):
+    """Replaces the manifest in one rename, so that an interruption leaves the old or the new one."""
+    path = os.path.join(directory, MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
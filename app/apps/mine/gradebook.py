@@ -0,0 +1,172 @@
+"""
+Grade rollups per (miner, classroom), per task and per (classroom, task level). Grades are the
+integers 0 to 10, so a scope is summed up by its histogram: one MinerGrade, TaskGrade or
+LevelGrade row per grade holding how many texts got it as their grammar and as their essay
+grade. Means and percentiles are read off the eleven counts whatever the number of texts.
+
+A text counts with its Text.moderated_text, in the classroom and level of its task. The signal
+handlers in apps.mine.signals and apps.mine.grading shift the buckets as grades come and go,
+rebuild recomputes them from scratch.
+"""
+from collections import Counter, OrderedDict, defaultdict
+from itertools import accumulate
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from apps.mine.models import LevelGrade, MinerGrade, Task, TaskGrade, Text
+
+
+GRADES = range(0, 11)
+KINDS = ('grammar', 'essay')
+
+
+def keys(miner_pk, task_pk, classroom_pk, task_level):
+    """The bucket key of each rollup a text of the miner for the task counts in."""
+    return (
+        (MinerGrade, (('miner_id', miner_pk), ('classroom_id', classroom_pk))),
+        (TaskGrade, (('task_id', task_pk), )),
+        (LevelGrade, (('classroom_id', classroom_pk), ('task_level', task_level))),
+    )
+
+
+def changes(graded, sign):
+    """
+    Bucket deltas for graded, an iterable of (miner_pk, task_pk, classroom_pk, task_level,
+    grammar_grade, essay_grade), keyed by (model, key, grade) and then by grammar or essay.
+    """
+    deltas = defaultdict(Counter)
+    for miner_pk, task_pk, classroom_pk, task_level, grammar_grade, essay_grade in graded:
+        for model, key in keys(miner_pk, task_pk, classroom_pk, task_level):
+            deltas[model, key, grammar_grade]['grammar'] += sign
+            deltas[model, key, essay_grade]['essay'] += sign
+    return deltas
+
+
+def apply(deltas):
+    """Shifts the buckets by deltas, one UPDATE per bucket, creating the buckets that are missing."""
+    for (model, key, grade), counts in deltas.items():
+        counts = {kind: count for kind, count in counts.items() if count}
+        if not counts:
+            continue
+        buckets = model.objects.filter(grade=grade, **dict(key))
+        if buckets.update(**{kind: F(kind) + count for kind, count in counts.items()}):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(grade=grade, **dict(key), **counts)
+        except IntegrityError:
+            # Created by a concurrent grading since the update
+            buckets.update(**{kind: F(kind) + count for kind, count in counts.items()})
+
+
+def count(graded, sign):
+    apply(changes(graded, sign))
+
+
+def graded_texts(texts):
+    """The graded rows of changes() for the moderated texts among texts, a Text queryset."""
+    return texts.filter(status=Text.MODERATED, moderated_text__isnull=False, task__classroom__isnull=False) \
+        .values_list('creator_id', 'task_id', 'task__classroom_id', 'task__task_level',
+                     'moderated_text__grammar_grade', 'moderated_text__essay_grade')
+
+
+def count_grade(text_pk, grammar_grade, essay_grade, sign):
+    """Adds (sign=1) or takes away (sign=-1) the grades of text_pk."""
+    text = Text.objects.filter(pk=text_pk, task__classroom__isnull=False) \
+        .values_list('creator_id', 'task_id', 'task__classroom_id', 'task__task_level').first()
+    if text is not None:
+        count([text + (grammar_grade, essay_grade)], sign)
+
+
+def count_text(text_pk, task_pk, sign):
+    """Called when text_pk starts (sign=1) or stops (sign=-1) answering task_pk."""
+    task = Task.objects.filter(pk=task_pk, classroom__isnull=False).values_list('classroom_id', 'task_level').first()
+    if task is None:
+        return
+    count([(miner_pk, task_pk) + task + tuple(grades) for miner_pk, _, _, _, *grades
+           in graded_texts(Text.objects.filter(pk=text_pk))], sign)
+
+
+def count_task(task_pk, classroom_pk, task_level, sign):
+    """Adds (sign=1) or takes away (sign=-1) the graded texts of task_pk from classroom_pk and task_level."""
+    if classroom_pk is None:
+        return
+    count([(miner_pk, task_pk, classroom_pk, task_level) + tuple(grades) for miner_pk, _, _, _, *grades
+           in graded_texts(Text.objects.filter(task_id=task_pk))], sign)
+
+
+def rebuild(classroom_pks=None):
+    """Recomputes the buckets of classroom_pks, of every classroom by default, and returns how many there are."""
+    texts = Text.objects.all()
+    if classroom_pks is not None:
+        texts = texts.filter(task__classroom_id__in=classroom_pks)
+    buckets = defaultdict(Counter)
+    for kind in KINDS:
+        totals = graded_texts(texts).order_by().values_list(
+            'creator_id', 'task_id', 'task__classroom_id', 'task__task_level', 'moderated_text__' + kind + '_grade') \
+            .annotate(count=Count('pk'))
+        for miner_pk, task_pk, classroom_pk, task_level, grade, total in totals:
+            for model, key in keys(miner_pk, task_pk, classroom_pk, task_level):
+                buckets[model, key, grade][kind] += total
+
+    with transaction.atomic():
+        for model, field in ((MinerGrade, 'classroom_id'), (TaskGrade, 'task__classroom_id'), (LevelGrade, 'classroom_id')):
+            rows = model.objects.all()
+            if classroom_pks is not None:
+                rows = rows.filter(**{field + '__in': classroom_pks})
+            rows.delete()
+            model.objects.bulk_create([
+                model(grade=grade, **dict(key), **counts)
+                for (bucket_model, key, grade), counts in buckets.items() if bucket_model is model
+            ], batch_size=1000)
+    return len(buckets)
+
+
+class Distribution:
+    """The grades of a scope as histogram, where histogram[g] texts got grade g."""
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.count = sum(histogram)
+        self.cumulative = list(accumulate(histogram))
+
+    @property
+    def mean(self):
+        if self.count:
+            return sum(grade * count for grade, count in zip(GRADES, self.histogram)) / self.count
+
+    def percentile(self, p):
+        """The smallest grade at least p percent of the texts got or stayed under (nearest rank)."""
+        if not self.count:
+            return None
+        rank = max(1, -(-p * self.count // 100))
+        return next(grade for grade, total in zip(GRADES, self.cumulative) if total >= rank)
+
+    @property
+    def median(self):
+        return self.percentile(50)
+
+    @property
+    def quartiles(self):
+        return self.percentile(25), self.percentile(75)
+
+    @property
+    def shares(self):
+        """The percentage of texts per grade, for drawing the histogram."""
+        return [round(100 * count / self.count) if self.count else 0 for count in self.histogram]
+
+
+def distributions(buckets, *fields):
+    """
+    The grammar and essay Distribution of every scope of buckets, a queryset of one rollup model,
+    keyed by the values of fields in the order the scopes first appear.
+    """
+    histograms = OrderedDict()
+    for *key, grade, grammar, essay in buckets.values_list(*fields, 'grade', 'grammar', 'essay'):
+        key = key[0] if len(key) == 1 else tuple(key)
+        histogram = histograms.setdefault(key, {kind: [0] * len(GRADES) for kind in KINDS})
+        histogram['grammar'][grade] += grammar
+        histogram['essay'][grade] += essay
+    return OrderedDict(
+        (key, {kind: Distribution(histogram[kind]) for kind in KINDS}) for key, histogram in histograms.items())
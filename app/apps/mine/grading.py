@@ -0,0 +1,174 @@
+"""
+Bulk grading. A moderator uploads a CSV or JSON lines file, or posts a JSON list, of rows with
+text_id, content, grammar_grade and essay_grade. Every row is checked before anything is written
+and the first problem of each row is reported, so a file is either imported whole or not at all.
+
+The moderations are written with bulk_create, which sends no post_save signals, so grade() moves
+the texts to MODERATED, shifts the counters, progress rows and gradebook and notifies the miners
+itself, once per classroom instead of once per text. Alignments, tokens and n-gram frequencies
+are queued in batches.
+"""
+import csv
+import io
+import json
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import ugettext as _
+
+from apps.mine import counters, gradebook, progress
+from apps.mine.models import Classroom, ModeratedText, Text
+from apps.mine.moderation import held_by_other, queue_classrooms
+from apps.mine.notifications import notify
+from apps.mine.task import align_moderations, count_frequencies, send_grade_emails, tokenize_texts
+from config.settings.common import ALIGNMENT_BATCH_SIZE
+
+
+FIELDS = ('text_id', 'content', 'grammar_grade', 'essay_grade')
+GRADES = range(0, 11)
+
+
+class GradeError(Exception):
+    """Raised with the problems of every failing row, nothing has been written."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def error(line, message):
+    return {'line': line, 'message': message}
+
+
+def read_rows(file, name=''):
+    """
+    The (line, row) pairs of an uploaded file, JSON lines when name ends with .jsonl or .json
+    and CSV with a header row otherwise.
+    """
+    try:
+        lines = io.StringIO(file.read().decode('utf-8-sig'), newline='')
+    except UnicodeDecodeError:
+        raise GradeError([error(1, _("Файл UTF-8 кодтауында болуы керек"))])
+    if name.lower().endswith(('.jsonl', '.json')):
+        rows, errors = [], []
+        for line, content in enumerate(lines, 1):
+            if not content.strip():
+                continue
+            try:
+                rows.append((line, json.loads(content)))
+            except ValueError:
+                errors.append(error(line, _("JSON қатесі")))
+        if errors:
+            raise GradeError(errors)
+        return rows
+    # Line 1 is the header
+    return list(enumerate(csv.DictReader(lines), 2))
+
+
+def clean(rows):
+    """Checks the fields of every row, returns the cleaned rows and the errors."""
+    cleaned, errors, seen = [], [], set()
+    for line, row in rows:
+        if not isinstance(row, dict) or not all(field in row for field in FIELDS):
+            errors.append(error(line, _("Бағандар: {}").format(', '.join(FIELDS))))
+            continue
+        try:
+            text_pk, grammar_grade, essay_grade = (int(row[field]) for field in ('text_id', 'grammar_grade', 'essay_grade'))
+        except (TypeError, ValueError):
+            errors.append(error(line, _("text_id және бағалар бүтін сан болуы керек")))
+            continue
+        content = row['content'].strip() if isinstance(row['content'], str) else ''
+        if grammar_grade not in GRADES or essay_grade not in GRADES:
+            errors.append(error(line, _("Баға 0 мен 10 аралығында болуы керек")))
+        elif not content:
+            errors.append(error(line, _("Өзгертілген эссе бос")))
+        elif text_pk in seen:
+            errors.append(error(line, _("{} эссесі файлда қайталанады").format(text_pk)))
+        else:
+            cleaned.append({'line': line, 'text_pk': text_pk, 'content': content,
+                            'grammar_grade': grammar_grade, 'essay_grade': essay_grade})
+        seen.add(text_pk)
+    return cleaned, errors
+
+
+def grade(user, rows, host):
+    """
+    Grades the texts of rows as user and returns how many there were. Raises GradeError when
+    a row is malformed or its text is not a pending text of the user's classrooms.
+    """
+    if not rows:
+        raise GradeError([error(1, _("Файлда бағалар жоқ"))])
+    grades, errors = clean(rows)
+    now = timezone.now()
+    with transaction.atomic():
+        texts = {
+            text.pk: text for text in Text.objects
+            .filter(pk__in=[row['text_pk'] for row in grades], classroom__in=queue_classrooms(user))
+            .select_for_update(of=('self', )).order_by('pk')
+            .values_list('pk', 'status', 'claimed_by_id', 'claim_expires', 'classroom_id', 'creator_id',
+                         'task_id', 'task__classroom_id', 'task__task_level', named=True)
+        }
+        for row in grades:
+            text = texts.get(row['text_pk'])
+            if text is None:
+                errors.append(error(row['line'], _("{} эссесі табылмады").format(row['text_pk'])))
+            elif text.status == Text.MODERATED:
+                errors.append(error(row['line'], _("{} эссесі тексеріліп қойған").format(row['text_pk'])))
+            elif held_by_other(text.claimed_by_id, text.claim_expires, user.pk):
+                errors.append(error(row['line'], _("{} эссесін басқа модератор тексеріп жатыр").format(row['text_pk'])))
+        if errors:
+            raise GradeError(sorted(errors, key=lambda e: e['line']))
+
+        ModeratedText.objects.bulk_create([
+            ModeratedText(original_id=row['text_pk'], moderator=user, date=now, content=row['content'],
+                          grammar_grade=row['grammar_grade'], essay_grade=row['essay_grade'])
+            for row in grades
+        ], batch_size=500)
+        moderations = ModeratedText.objects.filter(original=OuterRef('pk')).order_by('date', 'pk')
+        Text.objects.filter(pk__in=texts).update(
+            status=Text.MODERATED, moderated_at=now, moderated_text=Subquery(moderations.values('pk')[:1]),
+            claimed_by=None, claim_expires=None)
+        account(list(texts.values()), host)
+        gradebook.count([
+            (text.creator_id, text.task_id, text.task__classroom_id, text.task__task_level,
+             row['grammar_grade'], row['essay_grade'])
+            for text, row in ((texts[row['text_pk']], row) for row in grades) if text.task__classroom_id
+        ], 1)
+        text_pks = sorted(pk for pk, text in texts.items() if text.task_id)
+        moderated_text_pks = list(Text.objects.filter(pk__in=texts).values_list('moderated_text_id', flat=True))
+        for start in range(0, len(moderated_text_pks), ALIGNMENT_BATCH_SIZE):
+            batch = moderated_text_pks[start:start + ALIGNMENT_BATCH_SIZE]
+            transaction.on_commit(lambda batch=batch: align_moderations.delay(batch))
+            transaction.on_commit(lambda batch=batch: tokenize_texts.delay(moderated_text_pks=batch))
+        for start in range(0, len(text_pks), ALIGNMENT_BATCH_SIZE):
+            batch = text_pks[start:start + ALIGNMENT_BATCH_SIZE]
+            transaction.on_commit(lambda batch=batch: count_frequencies.delay(batch))
+    return len(grades)
+
+
+def account(texts, host):
+    """Shifts the counters and progress rows of the newly graded texts and notifies their miners."""
+    for classroom_pk, count in Counter(text.classroom_id for text in texts).items():
+        counters.shift(classroom_pk, pending_texts=-count, moderated_texts=count)
+
+    # Progress follows the classroom of the task, one UPDATE per classroom and number of texts graded
+    graded = Counter((text.task__classroom_id, text.creator_id) for text in texts if text.task__classroom_id)
+    miners = defaultdict(list)
+    for (classroom_pk, miner_pk), count in graded.items():
+        miners[classroom_pk, count].append(miner_pk)
+    for (classroom_pk, count), miner_pks in miners.items():
+        progress.shift(progress.rows(classroom_pk, miner_pks), graded=count)
+
+    # A miner's pk is their user's pk
+    recipients = defaultdict(set)
+    for text in texts:
+        recipients[text.classroom_id].add(text.creator_id)
+    classrooms = Classroom.objects.in_bulk(list(recipients))
+    for classroom_pk, miner_pks in recipients.items():
+        url = reverse('mine:miner-classroom-detail-results', args=[classroom_pk])
+        notify(miner_pks, '{} сыныбында эссеңіз тексерілді'.format(classrooms[classroom_pk].title), url)
+        transaction.on_commit(lambda classroom_pk=classroom_pk, miner_pks=sorted(miner_pks), url=host + url:
+                              send_grade_emails.delay(classroom_pk, miner_pks, url))
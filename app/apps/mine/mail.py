@@ -0,0 +1,97 @@
+import logging
+import re
+from functools import lru_cache
+from smtplib import SMTPException
+
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape
+from django.utils.translation import get_language
+
+from config.settings.common import EMAIL_HOST_USER, EMAIL_BATCH_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+EMAIL_BODY_TEMPLATE = 'mine/email_body.html'
+# Placeholders rendered into the skeleton in place of the per-recipient fields
+NAME_PLACEHOLDER = '__mine_email_name__'
+URL_PLACEHOLDER = '__mine_email_url__'
+PLACEHOLDERS = re.compile('({}|{})'.format(NAME_PLACEHOLDER, URL_PLACEHOLDER))
+
+
+class CompiledEmailTemplate:
+    """
+    Email body rendered once with placeholders for the recipient name and url.
+    render() only escapes those two fields and joins them with the cached segments.
+    """
+    def __init__(self, skeleton):
+        self.segments = PLACEHOLDERS.split(skeleton)
+
+    def render(self, name, url):
+        fields = {NAME_PLACEHOLDER: conditional_escape(name), URL_PLACEHOLDER: conditional_escape(url)}
+        segments = list(self.segments)
+        for i in range(1, len(segments), 2):
+            segments[i] = fields[segments[i]]
+        return ''.join(segments)
+
+
+@lru_cache(maxsize=128)
+def _compile_html_template(template_name, language, title, text):
+    context = {
+        'name': NAME_PLACEHOLDER,
+        'card_title': title,
+        'card_text': text,
+        'text_url': URL_PLACEHOLDER
+    }
+    return CompiledEmailTemplate(render_to_string(template_name, context))
+
+
+def compile_html_template(title, text, template_name=EMAIL_BODY_TEMPLATE):
+    return _compile_html_template(template_name, get_language(), title, text)
+
+
+def render_html_template(name, title, text, url):
+    return compile_html_template(title, text).render(name, url)
+
+
+def send_mass_email(subject, title, message, url, recipients, batch_size=EMAIL_BATCH_SIZE):
+    """
+    Sends one email per (name, email) pair of recipients. The html body is rendered
+    once per distinct name. Returns the list of emails that could not be delivered.
+    """
+    template = compile_html_template(title, message)
+    templates = {}
+    messages = []
+    for name, email in recipients:
+        if name not in templates:
+            templates[name] = template.render(name, url)
+        email_message = EmailMultiAlternatives(subject, message, EMAIL_HOST_USER, [email])
+        email_message.attach_alternative(templates[name], 'text/html')
+        messages.append(email_message)
+    return send_messages(messages, batch_size)
+
+
+def send_messages(messages, batch_size=EMAIL_BATCH_SIZE):
+    """
+    Sends messages over a single SMTP connection which is reopened every batch_size
+    messages (providers limit the number of messages per session) or after an error.
+    A failing recipient does not abort the batch, its address is reported instead.
+    """
+    failed = []
+    connection = get_connection()
+    for start in range(0, len(messages), batch_size):
+        for message in messages[start:start + batch_size]:
+            try:
+                connection.open()
+                connection.send_messages([message])
+            except (SMTPException, OSError) as e:
+                logger.warning('Could not send email to %s: %r', ', '.join(message.to), e)
+                failed.extend(message.to)
+                connection.close()
+        connection.close()
+
+    if messages and len(failed) == len(messages):
+        # Nothing was delivered, so the whole job can be retried without duplicates
+        raise SMTPException('Could not deliver any of {} messages'.format(len(messages)))
+    return failed
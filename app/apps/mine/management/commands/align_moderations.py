@@ -0,0 +1,51 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from apps.mine import alignment
+from apps.mine.models import ModeratedText
+from config.settings.common import ALIGNMENT_BATCH_SIZE
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
+
+
+class Command(BaseCommand):
+    help = 'Aligns the moderations without an alignment of the current version, or every moderation, in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='everything', help='Realign every moderation')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=ALIGNMENT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        moderated_texts = ModeratedText.objects.all() if options['everything'] else alignment.stale()
+        rows = alignment.rows(moderated_texts).iterator(chunk_size=options['batch_size'])
+        count = 0
+        if options['workers'] <= 1:
+            for batch in batches(rows, options['batch_size']):
+                count += self.store(alignment.align_rows(batch))
+        else:
+            # Workers only compute, the rows are read and the results written here. At most two
+            # batches per worker are in flight so that memory stays flat however many rows there are.
+            with ProcessPoolExecutor(options['workers']) as pool:
+                running = deque()
+                for batch in batches(rows, options['batch_size']):
+                    running.append(pool.submit(alignment.align_rows, batch))
+                    if len(running) >= 2 * options['workers']:
+                        count += self.store(running.popleft().result())
+                while running:
+                    count += self.store(running.popleft().result())
+        self.stdout.write('Aligned {} moderations'.format(count))
+
+    def store(self, results):
+        alignment.store(results)
+        return len(results)
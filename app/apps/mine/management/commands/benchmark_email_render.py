@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from apps.mine.mail import EMAIL_BODY_TEMPLATE, compile_html_template
+
+
+class Command(BaseCommand):
+    help = 'Measures email body renders per second for a classroom-wide announcement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        recipients = [('Оқушы {}'.format(i), 'qatesiz.kz/mine/miner/classroom/1/task/{}'.format(i))
+                      for i in range(options['recipients'])]
+        title = 'Жаңа тапсырма'
+        text = 'Сынып сыныбында жаңа тапсырма жарияланды'
+
+        start = time.perf_counter()
+        for name, url in recipients:
+            render_to_string(EMAIL_BODY_TEMPLATE, {'name': name, 'card_title': title, 'card_text': text, 'text_url': url})
+        self.report('render_to_string', len(recipients), time.perf_counter() - start)
+
+        start = time.perf_counter()
+        template = compile_html_template(title, text)
+        for name, url in recipients:
+            template.render(name, url)
+        self.report('compiled skeleton', len(recipients), time.perf_counter() - start)
+
+    def report(self, label, count, elapsed):
+        self.stdout.write('{:<20} {:>6} renders in {:.3f}s ({:.0f} renders/s)'.format(
+            label, count, elapsed, count / elapsed if elapsed else float('inf')))
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from apps.mine import retention
+from config.settings.common import NOTIFICATION_RETENTION_DAYS, NOTIFICATION_RETENTION_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Archives (or purges) read notifications older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=NOTIFICATION_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=NOTIFICATION_RETENTION_BATCH_SIZE)
+        parser.add_argument('--purge', action='store_true', help='Delete instead of archiving')
+        parser.add_argument('--drop-archive-before', metavar='YYYY-MM-DD',
+                            help='Also drop archived months older than this date')
+
+    def handle(self, *args, **options):
+        stats = retention.expire_notifications(days=options['days'],
+                                               archive=not options['purge'],
+                                               batch_size=options['batch_size'])
+        self.stdout.write('Expired {notifications} notifications and {events} events in {seconds}s '
+                          '({rows_per_second} rows/s)'.format(**stats))
+
+        if options['drop_archive_before']:
+            before = datetime.strptime(options['drop_archive_before'], '%Y-%m-%d').date()
+            deleted = retention.drop_archive_periods(before)
+            self.stdout.write('Dropped {} archived notifications before {}'.format(deleted, before))
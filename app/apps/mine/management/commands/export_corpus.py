@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.mine import corpus
+from apps.mine.models import Task
+
+
+def date(value):
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValueError(value)
+    return parsed
+
+
+class Command(BaseCommand):
+    help = 'Writes the graded essays with their corrections and grades as JSON lines or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(corpus.FORMATS), default='jsonl')
+        parser.add_argument('--output', help='File to write, standard output by default')
+        parser.add_argument('--classroom', type=int, action='append', dest='classrooms',
+                            help='Only export this classroom, may be repeated')
+        parser.add_argument('--level', action='append', dest='levels', choices=[level for level, _ in Task.LEVEL_CHOICES],
+                            help='Only export tasks of this level, may be repeated')
+        parser.add_argument('--since', type=date, help='Graded on or after this date, YYYY-MM-DD')
+        parser.add_argument('--until', type=date, help='Graded on or before this date, YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        texts = corpus.pairs(options['classrooms'], options['levels'], options['since'], options['until'])
+        chunks = corpus.export(options['format'], texts)
+        if not options['output']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        try:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(chunks)
+        except OSError as e:
+            raise CommandError(e)
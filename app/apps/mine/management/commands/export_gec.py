@@ -0,0 +1,87 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+
+from apps.mine import gec
+from apps.mine.management.commands.export_corpus import date
+from apps.mine.models import Task
+from config.settings.common import GEC_EXPORT_SHARD_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Writes the graded essays and their corrections as sharded, gzip-compressed M2 and parallel text ' \
+           'files with a manifest, in a process pool, resuming an interrupted export in the same directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory', help='Directory of the export, created when missing')
+        parser.add_argument('--classroom', type=int, action='append', dest='classrooms',
+                            help='Only export this classroom, may be repeated')
+        parser.add_argument('--level', action='append', dest='levels', choices=[level for level, _ in Task.LEVEL_CHOICES],
+                            help='Only export tasks of this level, may be repeated')
+        parser.add_argument('--since', type=date, help='Graded on or after this date, YYYY-MM-DD')
+        parser.add_argument('--until', type=date, help='Graded on or before this date, YYYY-MM-DD')
+        parser.add_argument('--shard-size', type=int, default=GEC_EXPORT_SHARD_SIZE, help='Essays per shard')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--restart', action='store_true', help='Start over instead of resuming')
+
+    def handle(self, *args, **options):
+        directory = options['directory']
+        filters = {
+            'classroom_pks': sorted(options['classrooms'] or []),
+            'levels': sorted(options['levels'] or []),
+            'since': options['since'] and options['since'].isoformat(),
+            'until': options['until'] and options['until'].isoformat(),
+        }
+        try:
+            os.makedirs(directory, exist_ok=True)
+            manifest = gec.read_manifest(directory)
+            if options['restart'] and manifest is not None:
+                # Shards of the previous export beyond those of this one would be left behind
+                gec.remove_shards(directory, manifest)
+                manifest = None
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        if manifest is None:
+            manifest = gec.new_manifest(filters, options['shard_size'])
+        elif (manifest['version'], manifest['alignment_version'], manifest['filters'], manifest['shard_size']) != \
+                (gec.VERSION, gec.alignment.VERSION, filters, options['shard_size']):
+            raise CommandError('{} holds an export of other options or versions, pass --restart to start over'.format(
+                directory))
+        elif manifest['completed']:
+            self.stdout.write('The export in {} is complete'.format(directory))
+            return
+
+        after = manifest['shards'][-1]['last_pk'] if manifest['shards'] else None
+        # Only the shard bounds are held, the rows are read by the workers
+        bounds = gec.shards(gec.query(filters), options['shard_size'], after)
+        jobs = [(directory, len(manifest['shards']) + i, filters, first, last) for i, (first, last) in enumerate(bounds)]
+        if options['workers'] <= 1:
+            for job in jobs:
+                self.record(directory, manifest, gec.write_shard(*job))
+        else:
+            # Forked workers must open database connections of their own. Shards are recorded in
+            # order, at most two per worker in flight, so that the manifest always lists a prefix of them.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                running = deque()
+                for job in jobs:
+                    running.append(pool.submit(gec.write_shard, *job))
+                    if len(running) >= 2 * options['workers']:
+                        self.record(directory, manifest, running.popleft().result())
+                while running:
+                    self.record(directory, manifest, running.popleft().result())
+
+        manifest['completed'] = timezone.now().isoformat()
+        gec.write_manifest(directory, manifest)
+        shards = manifest['shards']
+        self.stdout.write('Exported {} essays, {} sentences and {} edits in {} shards to {}'.format(
+            sum(shard['pairs'] for shard in shards), sum(shard['sentences'] for shard in shards),
+            sum(shard['edits'] for shard in shards), len(shards), directory))
+
+    def record(self, directory, manifest, shard):
+        manifest['shards'].append(shard)
+        gec.write_manifest(directory, manifest)
@@ -0,0 +1,49 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.mine import similarity
+from apps.mine.management.commands.align_moderations import batches
+from apps.mine.models import Similarity, Text
+from config.settings.common import SIMILARITY_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Fingerprints the texts without a fingerprint of the current version, or every text, in a process pool, ' \
+           'then flags their near-duplicates. Texts without tokens are tokenized here, run tokenize_texts first'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='everything', help='Fingerprint every text')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=SIMILARITY_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        texts = Text.objects.all() if options['everything'] else similarity.stale()
+        rows = similarity.rows(texts, options['batch_size'])
+        text_pks = []
+        if options['workers'] <= 1:
+            for batch in batches(rows, options['batch_size']):
+                text_pks += self.store(similarity.fingerprint_rows(batch))
+        else:
+            # Workers only compute, the rows are read and the results written here. At most two
+            # batches per worker are in flight so that memory stays flat however many rows there are.
+            with ProcessPoolExecutor(options['workers']) as pool:
+                running = deque()
+                for batch in batches(rows, options['batch_size']):
+                    running.append(pool.submit(similarity.fingerprint_rows, batch))
+                    if len(running) >= 2 * options['workers']:
+                        text_pks += self.store(running.popleft().result())
+                while running:
+                    text_pks += self.store(running.popleft().result())
+
+        # Matched once every fingerprint is in, each text against the whole corpus
+        for start in range(0, len(text_pks), options['batch_size']):
+            similarity.match(text_pks[start:start + options['batch_size']])
+        self.stdout.write('Fingerprinted {} texts, {} similarities flagged in all'.format(
+            len(text_pks), Similarity.objects.count()))
+
+    def store(self, results):
+        similarity.store(results)
+        return [pk for pk, _, _, _ in results]
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.mine import counters, gradebook, progress
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the materialized progress of every miner, the classroom counters and the gradebook, ' \
+           'or those of the given classrooms'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--classroom', type=int, action='append', dest='classrooms',
+                            help='Only rebuild this classroom, may be repeated')
+
+    def handle(self, *args, **options):
+        count = progress.rebuild(classroom_pks=options['classrooms'])
+        self.stdout.write('Rebuilt {} progress rows'.format(count))
+        count = counters.recount(classroom_pks=options['classrooms'])
+        self.stdout.write('Recounted {} classroom counters'.format(count))
+        count = gradebook.rebuild(classroom_pks=options['classrooms'])
+        self.stdout.write('Rebuilt {} gradebook buckets'.format(count))
@@ -0,0 +1,34 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from apps.mine import corrections, frequencies
+from apps.mine.models import Correction, CorrectionCount
+
+
+class Command(BaseCommand):
+    help = 'Recounts the corrections of every moderated text, pk range by pk range in a process pool. ' \
+           'Moderations graded meanwhile may be counted twice or not at all, run it while the site is quiet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--range-size', type=int, default=500, help='Text pks counted per job')
+
+    def handle(self, *args, **options):
+        # Texts are counted from the stored alignments, the stale ones are realigned here rather than by every worker
+        call_command('align_moderations', workers=options['workers'], stdout=self.stdout)
+        corrections.clear()
+        ranges = frequencies.ranges(options['range_size'])
+        starts, stops = [start for start, _ in ranges], [stop for _, stop in ranges]
+        if options['workers'] <= 1:
+            count = sum(map(corrections.count_range, starts, stops))
+        else:
+            # Forked workers must open database connections of their own
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                count = sum(pool.map(corrections.count_range, starts, stops))
+        self.stdout.write('Counted {} moderated texts into {} corrections and {} correction counts'.format(
+            count, Correction.objects.count(), CorrectionCount.objects.count()))
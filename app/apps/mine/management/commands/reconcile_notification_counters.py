@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from apps.mine.models import Notification, NotificationCounter
+from apps.mine.notifications import set_unread
+
+
+class Command(BaseCommand):
+    help = 'Recomputes unread notification counters and repairs the ones that drifted'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            actual = dict(Notification.objects.filter(read=False).order_by()
+                          .values_list('user').annotate(unread=Count('pk')))
+            stored = dict(NotificationCounter.objects.select_for_update().values_list('user_id', 'unread'))
+            drifted = {user_pk: actual.get(user_pk, 0) for user_pk in set(actual) | set(stored)
+                       if actual.get(user_pk, 0) != stored.get(user_pk)}
+            set_unread(drifted)
+        self.stdout.write('Repaired {} of {} counters'.format(len(drifted), len(set(actual) | set(stored))))
@@ -0,0 +1,45 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from apps.mine import tokens
+from apps.mine.management.commands.align_moderations import batches
+from apps.mine.models import ModeratedText, Text
+from config.settings.common import TOKENS_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Tokenizes the texts and moderations without tokens of the current analyzer version, or all of them, ' \
+           'in a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', dest='everything', help='Tokenize every text and moderation')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=TOKENS_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for model in (Text, ModeratedText):
+            contents = model.objects.all() if options['everything'] else tokens.stale(model)
+            rows = contents.order_by('pk').values_list('pk', 'content').iterator(chunk_size=options['batch_size'])
+            count = 0
+            if options['workers'] <= 1:
+                for batch in batches(rows, options['batch_size']):
+                    count += self.store(model, tokens.tokenize_rows(batch))
+            else:
+                # Workers only tokenize, the rows are read and the results written here. At most two
+                # batches per worker are in flight so that memory stays flat however many rows there are.
+                with ProcessPoolExecutor(options['workers']) as pool:
+                    running = deque()
+                    for batch in batches(rows, options['batch_size']):
+                        running.append(pool.submit(tokens.tokenize_rows, batch))
+                        if len(running) >= 2 * options['workers']:
+                            count += self.store(model, running.popleft().result())
+                    while running:
+                        count += self.store(model, running.popleft().result())
+            self.stdout.write('Tokenized {} {}'.format(count, model._meta.verbose_name_plural))
+
+    def store(self, model, results):
+        tokens.store(model, results)
+        return len(results)
@@ -0,0 +1,56 @@
+# Generated by Django 2.0 on 2026-10-18 17:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def create_events(apps, schema_editor):
+    """One event per distinct (link, description), the per-user rows only keep read state."""
+    Notification = apps.get_model('mine', 'Notification')
+    NotificationEvent = apps.get_model('mine', 'NotificationEvent')
+
+    groups = Notification.objects.values('link', 'description').annotate(date=models.Min('date'))
+    for group in groups.iterator():
+        event = NotificationEvent.objects.create(link=group['link'],
+                                                 description=group['description'],
+                                                 date=group['date'])
+        Notification.objects.filter(link=group['link'], description=group['description']).update(event=event)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0042_auto_20191208_2140'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationEvent',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('link', models.TextField(null=True)),
+                ('description', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='event',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='mine.NotificationEvent'),
+        ),
+        migrations.RunPython(create_events, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='notification',
+            name='description',
+        ),
+        migrations.RemoveField(
+            model_name='notification',
+            name='link',
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='event',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='mine.NotificationEvent'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.0 on 2026-10-18 12:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_unread(apps, schema_editor):
+    Notification = apps.get_model('mine', 'Notification')
+    NotificationCounter = apps.get_model('mine', 'NotificationCounter')
+
+    counts = Notification.objects.filter(read=False).order_by().values_list('user').annotate(unread=models.Count('pk'))
+    NotificationCounter.objects.bulk_create(
+        [NotificationCounter(user_id=user_pk, unread=unread) for user_pk, unread in counts], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_auto_20191001_1342'),
+        ('mine', '0044_digestentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('unread', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.0 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0046_archivednotification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'read', '-date', '-id'], name='mine_notif_user_read_date_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 2.0 on 2026-10-18 12:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def compute_progress(apps, schema_editor):
+    Miner = apps.get_model('mine', 'Miner')
+    Task = apps.get_model('mine', 'Task')
+    Text = apps.get_model('mine', 'Text')
+    ClassroomProgress = apps.get_model('mine', 'ClassroomProgress')
+
+    tasks = dict(Task.objects.filter(classroom__isnull=False).order_by()
+                 .values_list('classroom_id').annotate(count=models.Count('pk')))
+    texts = Text.objects.filter(task__classroom__isnull=False).order_by()
+    completed = {(miner_pk, classroom_pk): count for miner_pk, classroom_pk, count in texts
+                 .values_list('creator_id', 'task__classroom_id').annotate(count=models.Count('task_id', distinct=True))}
+    graded = {(miner_pk, classroom_pk): count for miner_pk, classroom_pk, count in texts
+              .filter(moderated_tasks__isnull=False)
+              .values_list('creator_id', 'task__classroom_id').annotate(count=models.Count('pk', distinct=True))}
+    ClassroomProgress.objects.bulk_create([
+        ClassroomProgress(miner_id=miner_pk, classroom_id=classroom_pk,
+                          pending=tasks.get(classroom_pk, 0) - completed.get((miner_pk, classroom_pk), 0),
+                          completed=completed.get((miner_pk, classroom_pk), 0),
+                          graded=graded.get((miner_pk, classroom_pk), 0))
+        for miner_pk, classroom_pk in Miner.classroom.through.objects.values_list('miner_id', 'classroom_id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0047_notification_user_read_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassroomProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pending', models.IntegerField(default=0)),
+                ('completed', models.IntegerField(default=0)),
+                ('graded', models.IntegerField(default=0)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='mine.Classroom')),
+                ('miner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='mine.Miner')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='classroomprogress',
+            unique_together={('miner', 'classroom')},
+        ),
+        migrations.RunPython(compute_progress, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.0 on 2026-10-18 12:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_moderations(apps, schema_editor):
+    Text = apps.get_model('mine', 'Text')
+    ModeratedText = apps.get_model('mine', 'ModeratedText')
+
+    first = ModeratedText.objects.filter(original=models.OuterRef('pk')).order_by('date', 'pk')
+    Text.objects.filter(pk__in=ModeratedText.objects.values('original_id')).update(
+        status='MODERATED',
+        moderated_text=models.Subquery(first.values('pk')[:1]),
+        moderated_at=models.Subquery(first.values('date')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0048_classroomprogress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='text',
+            name='moderated_text',
+            field=models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mine.ModeratedText'),
+        ),
+        migrations.AddField(
+            model_name='text',
+            name='status',
+            field=models.CharField(choices=[('PENDING', 'Тексерілмеген'), ('MODERATED', 'Тексерілген')], default='PENDING', max_length=9),
+        ),
+        migrations.RunPython(link_moderations, migrations.RunPython.noop),
+        migrations.RunSQL(
+            "CREATE INDEX mine_text_pending_idx ON mine_text (classroom_id, date DESC, id DESC) WHERE status = 'PENDING'",
+            'DROP INDEX mine_text_pending_idx',
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.0 on 2026-10-18 12:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def count_classrooms(apps, schema_editor):
+    Classroom = apps.get_model('mine', 'Classroom')
+    ClassroomCounter = apps.get_model('mine', 'ClassroomCounter')
+    Miner = apps.get_model('mine', 'Miner')
+    Task = apps.get_model('mine', 'Task')
+    Text = apps.get_model('mine', 'Text')
+
+    def totals(queryset):
+        return dict(queryset.filter(classroom__isnull=False).order_by()
+                    .values_list('classroom_id').annotate(count=models.Count('pk')))
+
+    tasks = totals(Task.objects.all())
+    participants = totals(Miner.classroom.through.objects.all())
+    pending = totals(Text.objects.filter(status='PENDING'))
+    moderated = totals(Text.objects.filter(status='MODERATED'))
+    ClassroomCounter.objects.bulk_create([
+        ClassroomCounter(classroom_id=pk, tasks=tasks.get(pk, 0), participants=participants.get(pk, 0),
+                         pending_texts=pending.get(pk, 0), moderated_texts=moderated.get(pk, 0))
+        for pk in Classroom.objects.values_list('pk', flat=True)
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0049_text_moderation_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassroomCounter',
+            fields=[
+                ('classroom', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counter', serialize=False, to='mine.Classroom')),
+                ('tasks', models.IntegerField(default=0)),
+                ('participants', models.IntegerField(default=0)),
+                ('pending_texts', models.IntegerField(default=0)),
+                ('moderated_texts', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['classroom', '-date', '-id'], name='mine_task_classroom_date_idx'),
+        ),
+        migrations.RunPython(count_classrooms, migrations.RunPython.noop),
+        migrations.RunSQL(
+            "CREATE INDEX mine_text_moderated_idx ON mine_text (classroom_id, moderated_at DESC, id DESC) "
+            "WHERE status = 'MODERATED'",
+            'DROP INDEX mine_text_moderated_idx',
+        ),
+    ]
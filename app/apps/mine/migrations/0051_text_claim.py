@@ -0,0 +1,26 @@
+# Generated by Django 2.0 on 2026-10-18 12:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('mine', '0050_classroomcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='claim_expires',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='text',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_texts', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 2.0 on 2026-10-18 13:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_gradebook(apps, schema_editor):
+    Text = apps.get_model('mine', 'Text')
+    rollups = {name: apps.get_model('mine', name) for name in ('MinerGrade', 'TaskGrade', 'LevelGrade')}
+
+    buckets = {}
+    texts = Text.objects.filter(status='MODERATED', moderated_text__isnull=False, task__classroom__isnull=False).order_by()
+    for kind in ('grammar', 'essay'):
+        totals = texts.values_list('creator_id', 'task_id', 'task__classroom_id', 'task__task_level',
+                                   'moderated_text__' + kind + '_grade').annotate(count=models.Count('pk'))
+        for miner_pk, task_pk, classroom_pk, task_level, grade, count in totals:
+            for name, key in (('MinerGrade', (('miner_id', miner_pk), ('classroom_id', classroom_pk))),
+                              ('TaskGrade', (('task_id', task_pk), )),
+                              ('LevelGrade', (('classroom_id', classroom_pk), ('task_level', task_level)))):
+                bucket = buckets.setdefault((name, key, grade), {'grammar': 0, 'essay': 0})
+                bucket[kind] += count
+    for name, model in rollups.items():
+        model.objects.bulk_create([
+            model(grade=grade, **dict(key), **counts)
+            for (bucket_name, key, grade), counts in buckets.items() if bucket_name == name
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0051_text_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LevelGrade',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.PositiveSmallIntegerField()),
+                ('grammar', models.IntegerField(default=0)),
+                ('essay', models.IntegerField(default=0)),
+                ('task_level', models.CharField(choices=[('BEGINNER', 'Қарапайым деңгей'), ('INTERMEDIATE', 'Орта деңгей'), ('ADVANCED', 'Күрделі деңгей')], max_length=12)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='level_grades', to='mine.Classroom')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MinerGrade',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.PositiveSmallIntegerField()),
+                ('grammar', models.IntegerField(default=0)),
+                ('essay', models.IntegerField(default=0)),
+                ('classroom', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='miner_grades', to='mine.Classroom')),
+                ('miner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grades', to='mine.Miner')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TaskGrade',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grade', models.PositiveSmallIntegerField()),
+                ('grammar', models.IntegerField(default=0)),
+                ('essay', models.IntegerField(default=0)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grades', to='mine.Task')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='taskgrade',
+            unique_together={('task', 'grade')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='minergrade',
+            unique_together={('miner', 'classroom', 'grade')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='levelgrade',
+            unique_together={('classroom', 'task_level', 'grade')},
+        ),
+        migrations.RunPython(fill_gradebook, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.0 on 2026-10-18 13:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0052_gradebook'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Alignment',
+            fields=[
+                ('moderated_text', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='alignment', serialize=False, to='mine.ModeratedText')),
+                ('version', models.PositiveSmallIntegerField()),
+                ('edits', models.BinaryField()),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
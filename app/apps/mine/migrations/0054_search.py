@@ -0,0 +1,74 @@
+# Generated by Django 2.0 on 2026-10-18 13:11
+
+from django.db import migrations
+
+
+# PostgreSQL only, the search columns and indexes are left out on other databases
+SEARCH_SQL = """
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE mine_text ADD COLUMN search tsvector;
+ALTER TABLE mine_moderatedtext ADD COLUMN search tsvector;
+ALTER TABLE mine_task ADD COLUMN search tsvector;
+
+CREATE FUNCTION mine_task_search() RETURNS trigger AS $$
+BEGIN
+    NEW.search := setweight(to_tsvector('pg_catalog.simple', coalesce(NEW.task_title, '')), 'A')
+        || setweight(to_tsvector('pg_catalog.simple', coalesce(NEW.task_description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER mine_text_search BEFORE INSERT OR UPDATE OF content ON mine_text
+    FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search, 'pg_catalog.simple', content);
+CREATE TRIGGER mine_moderatedtext_search BEFORE INSERT OR UPDATE OF content ON mine_moderatedtext
+    FOR EACH ROW EXECUTE PROCEDURE tsvector_update_trigger(search, 'pg_catalog.simple', content);
+CREATE TRIGGER mine_task_search BEFORE INSERT OR UPDATE OF task_title, task_description ON mine_task
+    FOR EACH ROW EXECUTE PROCEDURE mine_task_search();
+
+UPDATE mine_text SET search = to_tsvector('pg_catalog.simple', content);
+UPDATE mine_moderatedtext SET search = to_tsvector('pg_catalog.simple', content);
+UPDATE mine_task SET task_title = task_title;
+
+CREATE INDEX mine_text_search_idx ON mine_text USING gin (search);
+CREATE INDEX mine_moderatedtext_search_idx ON mine_moderatedtext USING gin (search);
+CREATE INDEX mine_task_search_idx ON mine_task USING gin (search);
+
+CREATE INDEX authentication_user_email_trgm_idx ON authentication_user USING gin (email gin_trgm_ops);
+CREATE INDEX authentication_user_first_name_trgm_idx ON authentication_user USING gin (first_name gin_trgm_ops);
+CREATE INDEX authentication_user_last_name_trgm_idx ON authentication_user USING gin (last_name gin_trgm_ops);
+"""
+
+DROP_SEARCH_SQL = """
+DROP INDEX authentication_user_email_trgm_idx;
+DROP INDEX authentication_user_first_name_trgm_idx;
+DROP INDEX authentication_user_last_name_trgm_idx;
+
+DROP TRIGGER mine_text_search ON mine_text;
+DROP TRIGGER mine_moderatedtext_search ON mine_moderatedtext;
+DROP TRIGGER mine_task_search ON mine_task;
+DROP FUNCTION mine_task_search();
+
+ALTER TABLE mine_text DROP COLUMN search;
+ALTER TABLE mine_moderatedtext DROP COLUMN search;
+ALTER TABLE mine_task DROP COLUMN search;
+"""
+
+
+def run(sql):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0002_auto_20191001_1342'),
+        ('mine', '0053_alignment'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(SEARCH_SQL), run(DROP_SEARCH_SQL)),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 2.0 on 2026-10-18 15:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0054_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Fingerprint',
+            fields=[
+                ('text', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='fingerprint', serialize=False, to='mine.Text')),
+                ('version', models.PositiveSmallIntegerField()),
+                ('content_hash', models.CharField(db_index=True, max_length=64)),
+                ('signature', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LshBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.BigIntegerField(db_index=True)),
+                ('text', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='mine.Text')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Similarity',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jaccard', models.FloatField()),
+                ('exact', models.BooleanField(default=False)),
+                ('date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('other', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='mine.Text')),
+                ('text', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='mine.Text')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarity',
+            unique_together={('text', 'other')},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.0 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0055_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NgramCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('side', models.CharField(choices=[('o', 'Эссе'), ('c', 'Тексерілген эссе')], max_length=1)),
+                ('classroom', models.IntegerField()),
+                ('task_level', models.CharField(blank=True, max_length=12)),
+                ('n', models.PositiveSmallIntegerField()),
+                ('ngram', models.CharField(max_length=255)),
+                ('count', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='ngramcount',
+            index=models.Index(fields=['side', 'classroom', 'task_level', 'n', '-count'], name='mine_ngram_top_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='ngramcount',
+            unique_together={('side', 'classroom', 'task_level', 'n', 'ngram')},
+        ),
+    ]
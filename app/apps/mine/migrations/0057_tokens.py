@@ -0,0 +1,45 @@
+# Generated by Django 2.0 on 2026-10-18 17:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0056_ngramcount'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModeratedTextTokens',
+            fields=[
+                ('version', models.PositiveSmallIntegerField()),
+                ('offsets', models.BinaryField()),
+                ('forms', models.BinaryField()),
+                ('moderated_text', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tokens', serialize=False, to='mine.ModeratedText')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='TextTokens',
+            fields=[
+                ('version', models.PositiveSmallIntegerField()),
+                ('offsets', models.BinaryField()),
+                ('forms', models.BinaryField()),
+                ('text', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='tokens', serialize=False, to='mine.Text')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='WordForm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('form', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+    ]
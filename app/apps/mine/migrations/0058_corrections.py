@@ -0,0 +1,58 @@
+# Generated by Django 2.0 on 2026-10-18 17:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0057_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Correction',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('classroom', models.IntegerField()),
+                ('task_level', models.CharField(blank=True, max_length=12)),
+                ('original', models.CharField(max_length=255)),
+                ('corrected', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CorrectionCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('classroom', models.IntegerField()),
+                ('task_level', models.CharField(blank=True, max_length=12)),
+                ('original', models.CharField(max_length=255)),
+                ('corrected', models.CharField(max_length=255)),
+                ('count', models.IntegerField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='correctioncount',
+            index=models.Index(fields=['classroom', 'task_level', '-count'], name='mine_correction_top_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='correctioncount',
+            unique_together={('classroom', 'task_level', 'original', 'corrected')},
+        ),
+        migrations.AddField(
+            model_name='correction',
+            name='miner',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='corrections', to='mine.Miner'),
+        ),
+        migrations.AddField(
+            model_name='correction',
+            name='text',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='corrections', to='mine.Text'),
+        ),
+        migrations.AddIndex(
+            model_name='correction',
+            index=models.Index(fields=['original', 'corrected', 'miner'], name='mine_correction_pair_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.0 on 2026-10-18 18:30
+
+from django.db import migrations
+
+
+# PostgreSQL only. email__icontains compiles to UPPER("email"::text) LIKE UPPER(...), which the
+# plain trigram index of 0054 cannot serve
+INDEX_SQL = 'CREATE INDEX authentication_user_email_upper_trgm_idx ON authentication_user ' \
+            'USING gin (upper(email::text) gin_trgm_ops);'
+DROP_INDEX_SQL = 'DROP INDEX authentication_user_email_upper_trgm_idx;'
+
+
+def run(sql):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(sql)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0058_corrections'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INDEX_SQL), run(DROP_INDEX_SQL)),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.0 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+def clear_counts(apps, schema_editor):
+    # Counts added without a CountedText would be added again by the first recount, rebuild_frequencies refills them
+    apps.get_model('mine', 'NgramCount').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mine', '0059_email_upper_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountedText',
+            fields=[
+                ('text', models.IntegerField(primary_key=True, serialize=False)),
+                ('classroom', models.IntegerField(null=True)),
+                ('task_level', models.CharField(blank=True, max_length=12)),
+                ('original', models.BinaryField()),
+                ('corrected', models.BinaryField(null=True)),
+            ],
+        ),
+        migrations.RunPython(clear_counts, migrations.RunPython.noop),
+    ]
@@ -33,6 +33,11 @@ class Task(models.Model):
     classroom = models.ForeignKey(Classroom, on_delete=models.SET_NULL, related_name='tasks', null=True)
     date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['classroom', '-date', '-id'], name='mine_task_classroom_date_idx'),
+        ]
+
     @property
     def short_text(self):
         return '{}...'.format(self.task_description[:40])
@@ -56,11 +61,24 @@ class Miner(models.Model):
 
 
 class Text(models.Model):
+    PENDING = 'PENDING'
+    MODERATED = 'MODERATED'
+    STATUS_CHOICES = [
+        (PENDING, _('Тексерілмеген')),
+        (MODERATED, _('Тексерілген')),
+    ]
     content = models.TextField()
     creator = models.ForeignKey(Miner, on_delete=models.CASCADE, related_name='completed_tasks')
     task = models.ForeignKey(Task, on_delete=models.SET_NULL, related_name='completed_tasks', null=True)
     classroom = models.ForeignKey(Classroom, on_delete=models.SET_NULL, related_name='completed_tasks', null=True)
     date = models.DateTimeField(default=timezone.now)
+    # Denormalized from ModeratedText by apps.mine.moderation, pending rows have a partial index
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default=PENDING)
+    moderated_at = models.DateTimeField(null=True, blank=True)
+    moderated_text = models.OneToOneField('ModeratedText', on_delete=models.SET_NULL, related_name='+', null=True, blank=True)
+    # Lease of the moderator grading the text, see apps.mine.moderation.claim_next
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, related_name='claimed_texts', null=True, blank=True)
+    claim_expires = models.DateTimeField(null=True, blank=True, db_index=True)
 
     @property
     def short_text(self):
@@ -98,12 +116,300 @@ class ModeratedText(models.Model):
         return '{} - {} - {}'.format(self.pk, self.original.task.task_title, self.moderator.email)
 
 
+class NotificationEvent(models.Model):
+    date = models.DateTimeField(default=timezone.now)
+    link = models.TextField(null=True)
+    description = models.CharField(max_length=100)
+
+    def __str__(self):
+        return '{} - {}'.format(self.pk, self.description)
+
+
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    event = models.ForeignKey(NotificationEvent, on_delete=models.CASCADE, related_name='notifications')
     date = models.DateTimeField(default=timezone.now)
+    read = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'read', '-date', '-id'], name='mine_notif_user_read_date_idx'),
+        ]
+
+    @property
+    def link(self):
+        return self.event.link
+
+    @property
+    def description(self):
+        return self.event.description
+
+    def __str__(self):
+        return '{} - {}'.format(self.user.email, self.description)
+
+
+class ArchivedNotification(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    date = models.DateTimeField()
     link = models.TextField(null=True)
     description = models.CharField(max_length=100)
-    read = models.BooleanField(default=False)
+    # First day of the month of date, archived rows are stored and dropped per period
+    period = models.DateField(db_index=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '{} - {} - {}'.format(self.period, self.user_id, self.description)
+
+
+class NotificationCounter(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_counter')
+    unread = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return '{} - {}'.format(self.user_id, self.unread)
+
+
+class DigestEntry(models.Model):
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='digest_entries')
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='digest_entries')
+    text = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='digest_entries')
+    host = models.CharField(max_length=255)
+    date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '{} - {} - {}'.format(self.recipient.email, self.classroom.title, self.text.pk)
+
+
+class ClassroomProgress(models.Model):
+    """How many tasks of a classroom a miner has left, has done and has had graded, see apps.mine.progress."""
+    miner = models.ForeignKey(Miner, on_delete=models.CASCADE, related_name='progress')
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='progress')
+    pending = models.IntegerField(default=0)
+    completed = models.IntegerField(default=0)
+    graded = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('miner', 'classroom')
+
+    def __str__(self):
+        return '{} - {} - {}/{}/{}'.format(self.miner_id, self.classroom_id, self.pending, self.completed, self.graded)
+
+
+class ClassroomCounter(models.Model):
+    """Totals shown with a classroom, kept by apps.mine.counters instead of counted per request."""
+    classroom = models.OneToOneField(Classroom, on_delete=models.CASCADE, primary_key=True, related_name='counter')
+    tasks = models.IntegerField(default=0)
+    participants = models.IntegerField(default=0)
+    pending_texts = models.IntegerField(default=0)
+    moderated_texts = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '{} - {}/{}/{}/{}'.format(
+            self.classroom_id, self.tasks, self.participants, self.pending_texts, self.moderated_texts)
+
+
+class GradeBucket(models.Model):
+    """
+    How many graded texts of a scope got grade as their grammar and as their essay grade, kept
+    by apps.mine.gradebook. A scope has at most one row per grade, the rows are its histogram.
+    """
+    grade = models.PositiveSmallIntegerField()
+    grammar = models.IntegerField(default=0)
+    essay = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class MinerGrade(GradeBucket):
+    miner = models.ForeignKey(Miner, on_delete=models.CASCADE, related_name='grades')
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='miner_grades')
+
+    class Meta:
+        unique_together = ('miner', 'classroom', 'grade')
+
+    def __str__(self):
+        return '{} - {} - {}: {}/{}'.format(self.miner_id, self.classroom_id, self.grade, self.grammar, self.essay)
+
+
+class TaskGrade(GradeBucket):
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name='grades')
+
+    class Meta:
+        unique_together = ('task', 'grade')
+
+    def __str__(self):
+        return '{} - {}: {}/{}'.format(self.task_id, self.grade, self.grammar, self.essay)
+
+
+class LevelGrade(GradeBucket):
+    classroom = models.ForeignKey(Classroom, on_delete=models.CASCADE, related_name='level_grades')
+    task_level = models.CharField(max_length=12, choices=Task.LEVEL_CHOICES)
+
+    class Meta:
+        unique_together = ('classroom', 'task_level', 'grade')
+
+    def __str__(self):
+        return '{} - {} - {}: {}/{}'.format(self.classroom_id, self.task_level, self.grade, self.grammar, self.essay)
+
+
+class Alignment(models.Model):
+    """Token-level edit script from a text to its moderation, packed by apps.mine.alignment."""
+    moderated_text = models.OneToOneField(ModeratedText, on_delete=models.CASCADE, primary_key=True, related_name='alignment')
+    version = models.PositiveSmallIntegerField()
+    edits = models.BinaryField()
+    date = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '{} - v{} - {} bytes'.format(self.moderated_text_id, self.version, len(self.edits))
+
+
+class Fingerprint(models.Model):
+    """MinHash signature and content hash of a text, computed by apps.mine.similarity."""
+    text = models.OneToOneField(Text, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    version = models.PositiveSmallIntegerField()
+    content_hash = models.CharField(max_length=64, db_index=True)
+    signature = models.BinaryField()
+
+    def __str__(self):
+        return '{} - v{} - {}'.format(self.text_id, self.version, self.content_hash[:12])
+
+
+class LshBucket(models.Model):
+    """One band of the signature of a text, texts sharing a key are candidate near-duplicates."""
+    key = models.BigIntegerField(db_index=True)
+    text = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='lsh_buckets')
+
+    def __str__(self):
+        return '{} - {}'.format(self.key, self.text_id)
+
+
+class Similarity(models.Model):
+    """A text found resembling another when it was fingerprinted, flagged to the moderators grading either."""
+    text = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='similarities')
+    other = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='+')
+    jaccard = models.FloatField()
+    exact = models.BooleanField(default=False)
+    date = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('text', 'other')
+
+    def __str__(self):
+        return '{} ~ {}: {:.2f}'.format(self.text_id, self.other_id, self.jaccard)
+
+
+class NgramCount(models.Model):
+    """
+    How often an n-gram occurs on one side of the corpus in one scope, kept by apps.mine.frequencies.
+    Classroom 0 and task level '' stand for every classroom and every level.
+    """
+    ORIGINAL = 'o'
+    CORRECTED = 'c'
+    SIDE_CHOICES = [
+        (ORIGINAL, _('Эссе')),
+        (CORRECTED, _('Тексерілген эссе')),
+    ]
+    side = models.CharField(max_length=1, choices=SIDE_CHOICES)
+    classroom = models.IntegerField()
+    task_level = models.CharField(max_length=12, blank=True)
+    n = models.PositiveSmallIntegerField()
+    ngram = models.CharField(max_length=255)
+    count = models.IntegerField()
+
+    class Meta:
+        unique_together = ('side', 'classroom', 'task_level', 'n', 'ngram')
+        indexes = [
+            models.Index(fields=['side', 'classroom', 'task_level', 'n', '-count'], name='mine_ngram_top_idx'),
+        ]
+
+    def __str__(self):
+        return '{} {}/{} {}: {}'.format(self.side, self.classroom, self.task_level, self.ngram, self.count)
+
+
+class CountedText(models.Model):
+    """
+    The word form ids of both sides of a text and the placement they were last added to the
+    NgramCount rows in, packed by apps.mine.tokens. Keyed by the pk of the text rather than
+    tied to it, so that apps.mine.frequencies can still take a deleted text away.
+    """
+    text = models.IntegerField(primary_key=True)
+    classroom = models.IntegerField(null=True)
+    task_level = models.CharField(max_length=12, blank=True)
+    original = models.BinaryField()
+    corrected = models.BinaryField(null=True)
+
+    def __str__(self):
+        return '{} {}/{}'.format(self.text, self.classroom, self.task_level)
+
+
+class WordForm(models.Model):
+    """A normalized word form, its pk is the token id stored by apps.mine.tokens."""
+    form = models.CharField(max_length=255, unique=True)
+
+    def __str__(self):
+        return '{} - {}'.format(self.pk, self.form)
+
+
+class TokenizedContent(models.Model):
+    """Token offsets and word form ids of a content, packed by apps.mine.tokens."""
+    version = models.PositiveSmallIntegerField()
+    offsets = models.BinaryField()
+    forms = models.BinaryField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return '{} - v{} - {} tokens'.format(self.pk, self.version, len(self.forms) // 4)
+
+
+class TextTokens(TokenizedContent):
+    text = models.OneToOneField(Text, on_delete=models.CASCADE, primary_key=True, related_name='tokens')
+
+
+class ModeratedTextTokens(TokenizedContent):
+    moderated_text = models.OneToOneField(ModeratedText, on_delete=models.CASCADE, primary_key=True, related_name='tokens')
+
+
+class Correction(models.Model):
+    """
+    How often the moderation of a text replaces original by corrected, kept by apps.mine.corrections
+    with the miner and the classroom and level of the task it is counted in.
+    """
+    text = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='corrections')
+    miner = models.ForeignKey(Miner, on_delete=models.CASCADE, related_name='corrections')
+    classroom = models.IntegerField()
+    task_level = models.CharField(max_length=12, blank=True)
+    original = models.CharField(max_length=255)
+    corrected = models.CharField(max_length=255)
+    count = models.PositiveIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['original', 'corrected', 'miner'], name='mine_correction_pair_idx'),
+        ]
+
+    def __str__(self):
+        return '{} - {}: {} -> {} x{}'.format(self.text_id, self.miner_id, self.original, self.corrected, self.count)
+
+
+class CorrectionCount(models.Model):
+    """
+    How often original is corrected to corrected in one scope, kept by apps.mine.corrections.
+    Classroom 0 and task level '' stand for every classroom and every level.
+    """
+    classroom = models.IntegerField()
+    task_level = models.CharField(max_length=12, blank=True)
+    original = models.CharField(max_length=255)
+    corrected = models.CharField(max_length=255)
+    count = models.IntegerField()
+
+    class Meta:
+        unique_together = ('classroom', 'task_level', 'original', 'corrected')
+        indexes = [
+            models.Index(fields=['classroom', 'task_level', '-count'], name='mine_correction_top_idx'),
+        ]
 
     def __str__(self):
-        return '{} - {}'.format(self.user.email, self.description)
\ No newline at end of file
+        return '{}/{} {} -> {}: {}'.format(self.classroom, self.task_level, self.original, self.corrected, self.count)
@@ -0,0 +1,151 @@
+"""
+Moderation state of texts. Text.status, moderated_at and moderated_text mirror the ModeratedText
+of a text so that the pending queue is a scan of the partial index over pending rows instead of
+an anti-join against ModeratedText. moderate() is the way to grade a text, the signal handlers
+in apps.mine.signals keep the columns right when moderations are added or removed elsewhere.
+
+Moderators take pending texts from a work queue. claim_next leases the oldest available texts
+to a moderator with SELECT ... FOR UPDATE SKIP LOCKED, so concurrent moderators each get
+different rows without waiting on one another, and a lease keeps the text to its moderator
+until it is graded, released or expires.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.utils import timezone
+
+from apps.mine import counters
+from apps.mine.models import Classroom, ModeratedText, Text
+from config.settings.common import EMAIL_HOST_USER, MODERATION_LEASE, MODERATION_PREFETCH
+
+
+class AlreadyModerated(Exception):
+    pass
+
+
+class Claimed(Exception):
+    """The text is leased to another moderator."""
+
+
+def moderate(text_pk, moderated_text):
+    """
+    Saves the unsaved moderated_text as the moderation of text_pk. The text row is locked
+    for the duration, so two moderators cannot grade it twice; the second gets AlreadyModerated.
+    """
+    with transaction.atomic():
+        text = Text.objects.select_for_update().get(pk=text_pk)
+        if text.status == Text.MODERATED:
+            raise AlreadyModerated(text_pk)
+        if held_by_other(text.claimed_by_id, text.claim_expires, moderated_text.moderator_id):
+            raise Claimed(text_pk)
+        moderated_text.original = text
+        moderated_text.save()
+    return moderated_text
+
+
+def link(moderated_text):
+    """
+    Marks the original of moderated_text moderated, unless it already has a moderation.
+    Returns whether moderated_text became the moderation of the text.
+    """
+    if Text.objects.filter(pk=moderated_text.original_id, moderated_text__isnull=True).update(
+            status=Text.MODERATED, moderated_at=moderated_text.date, moderated_text=moderated_text,
+            claimed_by=None, claim_expires=None):
+        counters.shift(moderated_text.original.classroom_id, pending_texts=-1, moderated_texts=1)
+        return True
+    return False
+
+
+def unlink(text_pk):
+    """
+    Points text_pk at its earliest remaining moderation, or makes it pending again, after one
+    of its moderations was deleted. Returns the moderation the text points at now.
+    """
+    text = Text.objects.filter(pk=text_pk).values_list('status', 'classroom_id').first()
+    if text is None:
+        return None
+    remaining = ModeratedText.objects.filter(original_id=text_pk).order_by('date', 'pk').first()
+    if remaining is not None:
+        Text.objects.filter(pk=text_pk).update(
+            status=Text.MODERATED, moderated_at=remaining.date, moderated_text=remaining)
+    else:
+        Text.objects.filter(pk=text_pk).update(status=Text.PENDING, moderated_at=None, moderated_text=None)
+        if text[0] == Text.MODERATED:
+            counters.shift(text[1], pending_texts=1, moderated_texts=-1)
+    return remaining
+
+
+# region Queue
+def queue_classrooms(user):
+    """Classrooms whose texts user grades, their own and the shared main classrooms."""
+    return Classroom.objects.filter(Q(owner=user) | Q(owner__email=EMAIL_HOST_USER))
+
+
+def queue(user, classroom_pks=None):
+    """Pending texts of the user's classrooms."""
+    texts = Text.objects.filter(status=Text.PENDING, classroom__in=queue_classrooms(user))
+    if classroom_pks is not None:
+        texts = texts.filter(classroom_id__in=classroom_pks)
+    return texts
+
+
+def available(user, now):
+    return Q(claimed_by__isnull=True) | Q(claim_expires__lte=now) | Q(claimed_by=user)
+
+
+def held_by_other(claimed_by_pk, claim_expires, user_pk):
+    return claimed_by_pk is not None and claimed_by_pk != user_pk and claim_expires > timezone.now()
+
+
+def claim_next(user, classroom_pks=None, exclude_pks=(), prefetch=MODERATION_PREFETCH):
+    """
+    Leases the oldest available text of the user's queue to them, plus prefetch more to open
+    next, and returns the leased texts oldest first. Texts the user already holds come first.
+    Rows another moderator is claiming at this moment are skipped rather than waited for.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pks = list(queue(user, classroom_pks).filter(available(user, now)).exclude(pk__in=exclude_pks)
+                   .annotate(held=Case(When(claimed_by=user, then=Value(0)), default=Value(1),
+                                       output_field=IntegerField()))
+                   .select_for_update(skip_locked=True)
+                   .order_by('held', 'date', 'pk')
+                   .values_list('pk', flat=True)[:prefetch + 1])
+        Text.objects.filter(pk__in=pks).update(claimed_by=user, claim_expires=now + timedelta(seconds=MODERATION_LEASE))
+    texts = Text.objects.select_related('task__classroom', 'creator__user').in_bulk(pks)
+    return [texts[pk] for pk in pks]
+
+
+def claim(user, text_pk):
+    """
+    Leases text_pk to user and returns True, or returns False while another moderator holds it.
+    Texts that are no longer pending are left alone, moderate() reports them.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        text = Text.objects.filter(pk=text_pk).select_for_update(skip_locked=True) \
+            .values_list('status', 'claimed_by_id', 'claim_expires').first()
+        if text is None:
+            # Locked by a moderator claiming or grading it right now
+            return not Text.objects.filter(pk=text_pk).exists()
+        status, claimed_by_pk, claim_expires = text
+        if status != Text.PENDING:
+            return True
+        if held_by_other(claimed_by_pk, claim_expires, user.pk):
+            return False
+        Text.objects.filter(pk=text_pk).update(claimed_by=user, claim_expires=now + timedelta(seconds=MODERATION_LEASE))
+    return True
+
+
+def release(user, text_pks=None):
+    """Gives the user's leases, or those on text_pks, back to the queue."""
+    texts = Text.objects.filter(claimed_by=user)
+    if text_pks is not None:
+        texts = texts.filter(pk__in=text_pks)
+    return texts.update(claimed_by=None, claim_expires=None)
+
+
+def release_expired():
+    return Text.objects.filter(claim_expires__lte=timezone.now()).update(claimed_by=None, claim_expires=None)
+# endregion Queue
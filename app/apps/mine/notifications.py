@@ -0,0 +1,135 @@
+import logging
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from apps.mine.models import Notification, NotificationEvent, NotificationCounter, DigestEntry
+from apps.mine.pubsub import get_pubsub, user_channel
+from config.settings.common import CACHE_TTL
+
+
+logger = logging.getLogger(__name__)
+
+# Keeps the upsert below the parameter limit of every backend
+COUNTER_BATCH_SIZE = 400
+
+
+def notify(user_pks, description, link=None):
+    """
+    Publishes one NotificationEvent and gives every user in user_pks an unread
+    Notification for it. The per-user rows are written with a single bulk insert.
+    """
+    user_pks = sorted(set(user_pks))
+    with transaction.atomic():
+        event = NotificationEvent.objects.create(description=description, link=link)
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_pk, event=event, date=event.date) for user_pk in user_pks])
+        adjust_unread(user_pks, 1)
+    message = notification_message(event)
+    transaction.on_commit(lambda: publish(user_pks, message))
+    return event
+
+
+def notification_message(event):
+    return {
+        'id': event.pk,
+        'description': event.description,
+        'link': event.link,
+        'date': event.date.isoformat(),
+    }
+
+
+def publish(user_pks, message):
+    """Pushes message to the live streams of user_pks, a failure only costs the live update."""
+    try:
+        get_pubsub().publish([user_channel(user_pk) for user_pk in user_pks], message)
+    except Exception:
+        logger.exception('Could not publish notification %s', message['id'])
+
+
+def queue_digest(recipient, classroom, text, host):
+    """
+    Buffers a submitted essay for the classroom owner's digest instead of notifying
+    them right away. Entries are flushed by apps.mine.task.flush_digests.
+    """
+    return DigestEntry.objects.create(recipient=recipient, classroom=classroom, text=text, host=host)
+
+
+def toggle_read(user, notification_pk):
+    """
+    Flips the read flag of one of user's notifications and returns the new value,
+    None if the notification does not exist. The update is conditional on the value
+    that was read, so concurrent toggles cannot skew the unread counter.
+    """
+    with transaction.atomic():
+        read = user.notifications.filter(pk=notification_pk).values_list('read', flat=True).first()
+        if read is None:
+            return None
+        if user.notifications.filter(pk=notification_pk, read=read).update(read=not read):
+            adjust_unread([user.pk], 1 if read else -1)
+    return not read
+
+
+def mark_read(user, notification_pks=None):
+    """Marks the given (by default all) unread notifications of user as read with a single UPDATE."""
+    notifications = user.notifications.filter(read=False)
+    if notification_pks is not None:
+        notifications = notifications.filter(pk__in=notification_pks)
+    with transaction.atomic():
+        count = notifications.update(read=True)
+        adjust_unread([user.pk], -count)
+    return count
+
+
+# region Counters
+def unread_cache_key(user_pk):
+    return 'notifications:unread:{}'.format(user_pk)
+
+
+def unread_count(user_pk):
+    """Number of unread notifications of the user, served from the cache with the counter table as fallback."""
+    key = unread_cache_key(user_pk)
+    count = cache.get(key)
+    if count is None:
+        count = NotificationCounter.objects.filter(user_id=user_pk).values_list('unread', flat=True).first() or 0
+        cache.set(key, count, CACHE_TTL)
+    return count
+
+
+def adjust_unread(user_pks, delta):
+    """
+    Adds delta to the unread counters of user_pks, creating missing counters, and drops
+    their cached values once the surrounding transaction commits.
+    """
+    user_pks = sorted(set(user_pks))
+    if not user_pks or not delta:
+        return
+    table = connection.ops.quote_name(NotificationCounter._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_pks), COUNTER_BATCH_SIZE):
+            batch = user_pks[start:start + COUNTER_BATCH_SIZE]
+            sql = ('INSERT INTO {table} (user_id, unread) VALUES {values} ON CONFLICT (user_id) DO UPDATE '
+                   'SET unread = CASE WHEN {table}.unread + %s > 0 THEN {table}.unread + %s ELSE 0 END').format(
+                table=table, values=', '.join(['(%s, %s)'] * len(batch)))
+            params = [param for user_pk in batch for param in (user_pk, max(delta, 0))] + [delta, delta]
+            cursor.execute(sql, params)
+    forget_unread(user_pks)
+
+
+def set_unread(counts):
+    """Overwrites counters with the {user_pk: unread} mapping, used to repair drift."""
+    user_pks = sorted(counts)
+    table = connection.ops.quote_name(NotificationCounter._meta.db_table)
+    with connection.cursor() as cursor:
+        for start in range(0, len(user_pks), COUNTER_BATCH_SIZE):
+            batch = user_pks[start:start + COUNTER_BATCH_SIZE]
+            sql = ('INSERT INTO {table} (user_id, unread) VALUES {values} ON CONFLICT (user_id) DO UPDATE '
+                   'SET unread = EXCLUDED.unread').format(table=table, values=', '.join(['(%s, %s)'] * len(batch)))
+            cursor.execute(sql, [param for user_pk in batch for param in (user_pk, counts[user_pk])])
+    forget_unread(user_pks)
+
+
+def forget_unread(user_pks):
+    keys = [unread_cache_key(user_pk) for user_pk in user_pks]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+# endregion Counters
@@ -0,0 +1,101 @@
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_cursor(date, pk):
+    delta = date - EPOCH
+    return '{}_{}'.format((delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds, pk)
+
+
+def decode_cursor(cursor):
+    """Returns the (date, pk) of a cursor, None when it is missing or malformed."""
+    try:
+        microseconds, pk = (int(part) for part in cursor.split('_'))
+    except (AttributeError, ValueError):
+        return None
+    return EPOCH + datetime.timedelta(microseconds=microseconds), pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous, date_field):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.date_field = date_field
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.cursor(self.object_list[0])
+
+    def cursor(self, obj):
+        return encode_cursor(getattr(obj, self.date_field), obj.pk)
+
+
+class KeysetPaginator:
+    """
+    Seek pagination over (date, pk), newest first. Pages are addressed by the cursor of their
+    boundary row instead of an offset, so with an index on (..., date, pk) every page is one
+    index range scan no matter how deep it is, and no COUNT(*) is needed.
+    """
+    def __init__(self, queryset, per_page, date_field='date'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.date_field = date_field
+
+    def page(self, after=None, before=None):
+        """The page of rows older than the after cursor, or newer than the before cursor."""
+        after, before = decode_cursor(after), decode_cursor(before)
+        if before is not None:
+            rows = list(self.queryset.filter(self.newer_than(*before))
+                        .order_by(self.date_field, 'pk')[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page][::-1], True, has_previous, self.date_field)
+
+        queryset = self.queryset
+        if after is not None:
+            queryset = queryset.filter(self.older_than(*after))
+        rows = list(queryset.order_by('-' + self.date_field, '-pk')[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return KeysetPage(rows[:self.per_page], has_next, after is not None, self.date_field)
+
+    def older_than(self, date, pk):
+        return Q(**{self.date_field + '__lt': date}) | Q(**{self.date_field: date, 'pk__lt': pk})
+
+    def newer_than(self, date, pk):
+        return Q(**{self.date_field + '__gt': date}) | Q(**{self.date_field: date, 'pk__gt': pk})
+
+
+class KeysetPaginationMixin:
+    """ListView mixin that pages with ?after=/?before= cursors instead of ?page= offsets."""
+    paginate_by = 20
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return paginator, page, page.object_list, page.has_other_pages()
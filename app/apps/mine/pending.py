@@ -0,0 +1,87 @@
+"""
+Pending tasks of a miner, computed in memory. The tasks of a classroom are cached once for
+everybody, and every miner has a cached bitmap of the task pks they have written a text for, so
+rendering a task list costs two cache reads however many miners share the classroom.
+
+The bitmap is a bytes object where bit pk % 8 of byte pk // 8 marks task pk, a few hundred bytes
+for a few thousand tasks. Submissions set their bit in place; anything else that changes which
+tasks a miner has done drops the bitmap so that it is rebuilt from the miner's texts.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.mine.models import Task, Text
+from config.settings.common import CACHE_TTL
+
+
+def tasks_cache_key(classroom_pk):
+    return 'mine:classroom-tasks:{}'.format(classroom_pk)
+
+
+def completed_cache_key(miner_pk):
+    return 'mine:completed-tasks:{}'.format(miner_pk)
+
+
+def classroom_tasks(classroom_pk):
+    """Tasks of the classroom, newest first, shared by every miner through the cache."""
+    key = tasks_cache_key(classroom_pk)
+    tasks = cache.get(key)
+    if tasks is None:
+        tasks = list(Task.objects.filter(classroom_id=classroom_pk).order_by('-date'))
+        cache.set(key, tasks, CACHE_TTL)
+    return tasks
+
+
+def forget_classroom_tasks(classroom_pks):
+    keys = [tasks_cache_key(classroom_pk) for classroom_pk in set(classroom_pks) if classroom_pk is not None]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def build_bitmap(pks):
+    bitmap = bytearray((max(pks) >> 3) + 1 if pks else 0)
+    for pk in pks:
+        bitmap[pk >> 3] |= 1 << (pk & 7)
+    return bytes(bitmap)
+
+
+def has_bit(bitmap, pk):
+    index = pk >> 3
+    return index < len(bitmap) and bool(bitmap[index] >> (pk & 7) & 1)
+
+
+def completed_bitmap(miner_pk):
+    key = completed_cache_key(miner_pk)
+    bitmap = cache.get(key)
+    if bitmap is None:
+        pks = list(Text.objects.filter(creator_id=miner_pk, task__isnull=False)
+                   .values_list('task_id', flat=True).distinct())
+        bitmap = build_bitmap(pks)
+        cache.set(key, bitmap, CACHE_TTL)
+    return bitmap
+
+
+def mark_completed(miner_pk, task_pk):
+    """Sets the bit of task_pk in the cached bitmap of the miner, if there is one, once the transaction commits."""
+    def update():
+        key = completed_cache_key(miner_pk)
+        bitmap = cache.get(key)
+        if bitmap is not None and not has_bit(bitmap, task_pk):
+            bitmap = bytearray(bitmap)
+            if len(bitmap) <= task_pk >> 3:
+                bitmap.extend(bytes((task_pk >> 3) + 1 - len(bitmap)))
+            bitmap[task_pk >> 3] |= 1 << (task_pk & 7)
+            cache.set(key, bytes(bitmap), CACHE_TTL)
+    transaction.on_commit(update)
+
+
+def forget_completed(miner_pks):
+    keys = [completed_cache_key(miner_pk) for miner_pk in set(miner_pks)]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def pending_tasks(miner_pk, classroom_pk):
+    """Tasks of the classroom the miner has not written a text for yet."""
+    bitmap = completed_bitmap(miner_pk)
+    return [task for task in classroom_tasks(classroom_pk) if not has_bit(bitmap, task.pk)]
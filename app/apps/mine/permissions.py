@@ -0,0 +1,15 @@
+from rest_framework.permissions import BasePermission
+
+
+class IsModerator(BasePermission):
+    """The API counterpart of BaseModeratorView."""
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.groups.filter(name='moderator').exists()
+
+
+class IsSuperuser(BasePermission):
+    """The API counterpart of BaseAdminView."""
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.is_superuser
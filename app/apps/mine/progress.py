@@ -0,0 +1,111 @@
+"""
+Materialized (miner, classroom) progress. Every classroom membership has one ClassroomProgress
+row whose counters are shifted in place with UPDATE ... SET x = x + n as tasks, texts and grades
+come and go, so listing a miner's classrooms with their counts is one indexed lookup. The signal
+handlers in apps.mine.signals call into this module, rebuild recomputes rows from scratch.
+
+A task counts as completed once the miner has a text for it, graded counts the miner's texts
+with at least one ModeratedText. Both follow the classroom of the task.
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from apps.mine.models import ClassroomProgress, Miner, ModeratedText, Task, Text
+
+
+def shift(queryset, **deltas):
+    deltas = {field: F(field) + delta for field, delta in deltas.items() if delta}
+    if deltas:
+        queryset.update(**deltas)
+
+
+def rows(classroom_pk, miner_pks=None):
+    queryset = ClassroomProgress.objects.filter(classroom_id=classroom_pk)
+    if miner_pks is not None:
+        queryset = queryset.filter(miner_id__in=miner_pks)
+    return queryset
+
+
+def task_added(classroom_pk):
+    """A new task has no texts yet, so it is pending for everyone in its classroom."""
+    shift(rows(classroom_pk), pending=1)
+
+
+def count_task(task_pk, classroom_pk, sign):
+    """Adds (sign=1) or takes away (sign=-1) an existing task and its texts from the rows of classroom_pk."""
+    texts = Text.objects.filter(task_id=task_pk)
+    done = texts.values('creator_id')
+    shift(rows(classroom_pk).filter(miner_id__in=done), completed=sign)
+    shift(rows(classroom_pk).exclude(miner_id__in=done), pending=sign)
+    graded = texts.filter(moderated_tasks__isnull=False).order_by() \
+        .values_list('creator_id').annotate(count=Count('pk', distinct=True))
+    for miner_pk, count in graded:
+        shift(rows(classroom_pk, [miner_pk]), graded=sign * count)
+
+
+def count_text(text_pk, creator_pk, task_pk, sign):
+    """Called when text_pk starts (sign=1) or stops (sign=-1) answering task_pk."""
+    classroom_pk = Task.objects.filter(pk=task_pk).values_list('classroom_id', flat=True).first()
+    if classroom_pk is None:
+        return
+    first = not Text.objects.filter(creator_id=creator_pk, task_id=task_pk).exclude(pk=text_pk).exists()
+    graded = ModeratedText.objects.filter(original_id=text_pk).exists()
+    shift(rows(classroom_pk, [creator_pk]),
+          pending=-sign if first else 0, completed=sign if first else 0, graded=sign if graded else 0)
+
+
+def count_grade(moderated_text_pk, text_pk, sign):
+    """
+    Called when moderated_text_pk is added to (sign=1) or removed from (sign=-1) text_pk, removals
+    only for the moderation the text pointed at, so that a text losing several at once counts once.
+    """
+    text = Text.objects.filter(pk=text_pk).values_list('creator_id', 'task__classroom_id').first()
+    if text is None or text[1] is None:
+        return
+    if ModeratedText.objects.filter(original_id=text_pk).exclude(pk=moderated_text_pk).exists():
+        return
+    shift(rows(text[1], [text[0]]), graded=sign)
+
+
+def scoped(queryset, miner_pks=None, classroom_pks=None, miner_field='miner_id', classroom_field='classroom_id'):
+    if miner_pks is not None:
+        queryset = queryset.filter(**{miner_field + '__in': miner_pks})
+    if classroom_pks is not None:
+        queryset = queryset.filter(**{classroom_field + '__in': classroom_pks})
+    return queryset.order_by()
+
+
+def compute(miner_pks=None, classroom_pks=None):
+    """The (pending, completed, graded) of every membership in scope, keyed by (miner_pk, classroom_pk)."""
+    memberships = scoped(Miner.classroom.through.objects.all(), miner_pks, classroom_pks) \
+        .values_list('miner_id', 'classroom_id')
+    tasks = dict(scoped(Task.objects.all(), classroom_pks=classroom_pks)
+                 .values_list('classroom_id').annotate(count=Count('pk')))
+    texts = scoped(Text.objects.filter(task__classroom__isnull=False), miner_pks, classroom_pks,
+                   miner_field='creator_id', classroom_field='task__classroom_id')
+    completed = {(miner_pk, classroom_pk): count for miner_pk, classroom_pk, count in texts
+                 .values_list('creator_id', 'task__classroom_id').annotate(count=Count('task_id', distinct=True))}
+    graded = {(miner_pk, classroom_pk): count for miner_pk, classroom_pk, count in texts
+              .filter(moderated_tasks__isnull=False)
+              .values_list('creator_id', 'task__classroom_id').annotate(count=Count('pk', distinct=True))}
+    return {
+        key: (tasks.get(key[1], 0) - completed.get(key, 0), completed.get(key, 0), graded.get(key, 0))
+        for key in memberships
+    }
+
+
+def rebuild(miner_pks=None, classroom_pks=None):
+    """Recomputes the rows in scope, everything by default, and returns how many there are."""
+    with transaction.atomic():
+        progress = compute(miner_pks, classroom_pks)
+        scoped(ClassroomProgress.objects.all(), miner_pks, classroom_pks).delete()
+        ClassroomProgress.objects.bulk_create([
+            ClassroomProgress(miner_id=miner_pk, classroom_id=classroom_pk,
+                              pending=pending, completed=completed, graded=graded)
+            for (miner_pk, classroom_pk), (pending, completed, graded) in progress.items()
+        ], batch_size=1000)
+    return len(progress)
+
+
+def forget(miner_pks=None, classroom_pks=None):
+    scoped(ClassroomProgress.objects.all(), miner_pks, classroom_pks).delete()
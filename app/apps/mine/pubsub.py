@@ -0,0 +1,69 @@
+import json
+import queue
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.utils.module_loading import import_string
+
+from config.settings.common import NOTIFICATION_PUBSUB_BACKEND
+
+
+def user_channel(user_pk):
+    return 'notifications:{}'.format(user_pk)
+
+
+class RedisPubSub:
+    """Redis channels shared by the web, stream and celery processes."""
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.redis = get_redis_connection('default')
+
+    def publish(self, channels, message):
+        data = json.dumps(message)
+        pipeline = self.redis.pipeline(transaction=False)
+        for channel in channels:
+            pipeline.publish(channel, data)
+        pipeline.execute()
+
+    def subscribe(self, channel, timeout):
+        """Yields received messages, or None when nothing arrived within timeout seconds."""
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        try:
+            while True:
+                message = pubsub.get_message(timeout=timeout)
+                yield json.loads(message['data']) if message else None
+        finally:
+            pubsub.close()
+
+
+class MemoryPubSub:
+    """In-process stand-in for tests and the development server."""
+    subscribers = defaultdict(list)
+    lock = threading.Lock()
+
+    def publish(self, channels, message):
+        with self.lock:
+            for channel in channels:
+                for subscriber in self.subscribers[channel]:
+                    subscriber.put(message)
+
+    def subscribe(self, channel, timeout):
+        subscriber = queue.Queue()
+        with self.lock:
+            self.subscribers[channel].append(subscriber)
+        try:
+            while True:
+                try:
+                    yield subscriber.get(timeout=timeout)
+                except queue.Empty:
+                    yield None
+        finally:
+            with self.lock:
+                self.subscribers[channel].remove(subscriber)
+
+
+@lru_cache(maxsize=None)
+def get_pubsub():
+    return import_string(NOTIFICATION_PUBSUB_BACKEND)()
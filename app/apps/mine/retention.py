@@ -0,0 +1,78 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.mine.models import Notification, NotificationEvent, ArchivedNotification
+from config.settings.common import NOTIFICATION_RETENTION_DAYS, NOTIFICATION_RETENTION_ARCHIVE, \
+    NOTIFICATION_RETENTION_BATCH_SIZE
+
+
+logger = logging.getLogger(__name__)
+
+
+def expire_notifications(days=NOTIFICATION_RETENTION_DAYS, archive=NOTIFICATION_RETENTION_ARCHIVE,
+                         batch_size=NOTIFICATION_RETENTION_BATCH_SIZE):
+    """
+    Moves read notifications older than days into ArchivedNotification (or deletes them when
+    archive is False), then drops the events nobody references anymore. Rows are walked in
+    pk order and every batch is its own short transaction, so no long locks are held.
+    Returns throughput statistics.
+    """
+    cutoff = timezone.now() - timedelta(days=days)
+    start = time.monotonic()
+
+    expired = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(Notification.objects.filter(pk__gt=last_pk, read=True, date__lt=cutoff)
+                         .select_related('event').order_by('pk')[:batch_size])
+            if not batch:
+                break
+            if archive:
+                ArchivedNotification.objects.bulk_create([archived(notification) for notification in batch])
+            Notification.objects.filter(pk__in=[notification.pk for notification in batch]).delete()
+        last_pk = batch[-1].pk
+        expired += len(batch)
+
+    events = 0
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            pks = list(NotificationEvent.objects.filter(pk__gt=last_pk, date__lt=cutoff, notifications__isnull=True)
+                       .order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            NotificationEvent.objects.filter(pk__in=pks).delete()
+        last_pk = pks[-1]
+        events += len(pks)
+
+    seconds = time.monotonic() - start
+    stats = {
+        'notifications': expired,
+        'events': events,
+        'archived': archive,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(expired / seconds) if seconds else 0,
+    }
+    logger.info('Expired %(notifications)d notifications and %(events)d events in %(seconds)ss '
+                '(%(rows_per_second)d rows/s, archived: %(archived)s)', stats)
+    return stats
+
+
+def archived(notification):
+    date = timezone.localtime(notification.date)
+    return ArchivedNotification(user_id=notification.user_id,
+                                date=notification.date,
+                                link=notification.event.link,
+                                description=notification.event.description,
+                                period=date.date().replace(day=1))
+
+
+def drop_archive_periods(before):
+    """Removes the archived months older than the before date with one indexed delete."""
+    deleted, _ = ArchivedNotification.objects.filter(period__lt=before).delete()
+    return deleted
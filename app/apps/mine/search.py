@@ -0,0 +1,98 @@
+"""
+Search for moderators and admins. Essays, corrections and tasks have a tsvector search column
+kept up to date by triggers and indexed with GIN (migration 0054), queried here with a ranking
+query. Snippets are highlighted with ts_headline in a second query over the page of results
+only. People are found by trigram similarity of their names and email.
+
+The columns exist on PostgreSQL only and are not model fields, so they are never loaded with
+the rows. Other databases fall back to substring matching, good enough for development.
+Documents are indexed with the 'simple' configuration, PostgreSQL has no Kazakh dictionary:
+words are lowercased but not stemmed.
+"""
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Func, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from apps.mine.models import ModeratedText, Task, Text
+from config.settings.common import SEARCH_RESULTS
+
+
+CONFIG = 'simple'
+# Control characters essays do not contain, escaped snippets get their <mark>s in place of them
+START, STOP = '\x01', '\x02'
+HEADLINE_OPTIONS = 'StartSel={}, StopSel={}, MaxWords=35, MinWords=15, MaxFragments=2'.format(START, STOP)
+# Which field each searchable model is shown by
+FIELDS = {
+    Text: 'content',
+    ModeratedText: 'content',
+    Task: 'task_description',
+}
+
+
+class Headline(Func):
+    function = 'ts_headline'
+    output_field = TextField()
+
+    def __init__(self, expression, query, options=HEADLINE_OPTIONS):
+        super().__init__(Value(CONFIG), expression, query, Value(options))
+
+
+def postgres():
+    return connection.vendor == 'postgresql'
+
+
+def vector(model):
+    return RawSQL('{}.search'.format(model._meta.db_table), [], output_field=SearchVectorField())
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(START, '<mark>').replace(STOP, '</mark>'))
+
+
+def documents(queryset, query, limit=SEARCH_RESULTS):
+    """
+    The limit best matches of query among queryset, a Text, ModeratedText or Task queryset,
+    best first, each with a highlighted snippet.
+    """
+    model, field = queryset.model, FIELDS[queryset.model]
+    if not postgres():
+        filters = Q(**{field + '__icontains': query})
+        if model is Task:
+            filters |= Q(task_title__icontains=query)
+        objects = list(queryset.filter(filters).order_by('-pk')[:limit])
+        for obj in objects:
+            obj.snippet = escape(getattr(obj, field)[:200])
+        return objects
+
+    search_query = SearchQuery(query, config=CONFIG)
+    pks = list(queryset.annotate(search=vector(model)).filter(search=search_query)
+               .annotate(rank=SearchRank(F('search'), search_query))
+               .order_by('-rank', '-pk').values_list('pk', flat=True)[:limit])
+    objects = queryset.filter(pk__in=pks).annotate(headline=Headline(F(field), search_query)).in_bulk(pks)
+    for obj in objects.values():
+        obj.snippet = highlight(obj.headline)
+    return [objects[pk] for pk in pks]
+
+
+def people(users, query, limit=SEARCH_RESULTS):
+    """Users whose names or email look like query, most similar first."""
+    words = query.split()
+    if not postgres():
+        filters = Q()
+        for word in words:
+            filters &= Q(email__icontains=word) | Q(first_name__icontains=word) | Q(last_name__icontains=word)
+        return list(users.filter(filters).order_by('pk')[:limit])
+
+    # Every word has to match somewhere, each test can use a trigram index of its column, the
+    # icontains one the upper(email) index of migration 0059
+    filters = Q()
+    for word in words:
+        filters &= Q(email__trigram_similar=word) | Q(first_name__trigram_similar=word) \
+            | Q(last_name__trigram_similar=word) | Q(email__icontains=word)
+    similarity = Greatest(TrigramSimilarity('email', query), TrigramSimilarity('first_name', query),
+                          TrigramSimilarity('last_name', query))
+    return list(users.filter(filters).annotate(similarity=similarity).order_by('-similarity', 'pk')[:limit])
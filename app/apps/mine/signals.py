@@ -0,0 +1,222 @@
+"""
+Keeps apps.mine.progress, apps.mine.counters, apps.mine.gradebook, apps.mine.frequencies,
+apps.mine.corrections, the caches of apps.mine.pending, the moderation state of texts, their
+tokens, fingerprints and alignments in step with classrooms, tasks, texts, grades and memberships.
+"""
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.mine import corrections, counters, frequencies, gradebook, moderation, pending, progress, tokens
+from apps.mine.models import Classroom, ClassroomCounter, Miner, ModeratedText, Task, Text
+from apps.mine.task import align_moderations, count_frequencies, fingerprint_texts, tokenize_texts
+
+
+def skipped(field, update_fields):
+    """Whether a save with update_fields left field alone."""
+    return update_fields is not None and not {field, field + '_id'} & set(update_fields)
+
+
+def recount_frequencies(text_pks):
+    """Queues the n-gram recount of text_pks for when the transaction commits, off the request."""
+    text_pks = list(text_pks)
+    if text_pks:
+        transaction.on_commit(lambda: count_frequencies.delay(text_pks))
+
+
+@receiver(post_save, sender=Classroom)
+def classroom_saved(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        ClassroomCounter.objects.create(classroom=instance)
+
+
+@receiver(post_delete, sender=Classroom)
+def classroom_deleted(sender, instance, **kwargs):
+    # Its tasks stay, out of any classroom, and with them their texts in the counts of every classroom
+    frequencies.forget_classroom(instance.pk)
+    corrections.forget_classroom(instance.pk)
+
+
+@receiver(post_init, sender=Task)
+def remember_task_classroom(sender, instance, **kwargs):
+    instance._saved_classroom_id = instance.__dict__.get('classroom_id')
+    instance._saved_task_level = instance.__dict__.get('task_level')
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, update_fields, raw, **kwargs):
+    pending.forget_classroom_tasks([instance._saved_classroom_id, instance.__dict__.get('classroom_id')])
+    if raw:
+        return
+    if not created and not (skipped('classroom', update_fields) and skipped('task_level', update_fields)):
+        placed = (instance._saved_classroom_id, instance._saved_task_level)
+        if placed != (instance.classroom_id, instance.task_level):
+            gradebook.count_task(instance.pk, *placed, -1)
+            gradebook.count_task(instance.pk, instance.classroom_id, instance.task_level, 1)
+            recount_frequencies(Text.objects.filter(task=instance).values_list('pk', flat=True))
+            corrections.count_task(instance.pk, (instance.classroom_id, instance.task_level))
+    instance._saved_task_level = instance.task_level
+    if skipped('classroom', update_fields):
+        return
+    previous, current = instance._saved_classroom_id, instance.classroom_id
+    if created:
+        if current is not None:
+            progress.task_added(current)
+            counters.shift(current, tasks=1)
+    elif previous != current:
+        if previous is not None:
+            progress.count_task(instance.pk, previous, -1)
+            counters.shift(previous, tasks=-1)
+        if current is not None:
+            progress.count_task(instance.pk, current, 1)
+            counters.shift(current, tasks=1)
+    instance._saved_classroom_id = current
+
+
+@receiver(pre_delete, sender=Task)
+def task_deleted(sender, instance, **kwargs):
+    # Before the texts of the task are detached from it
+    recount_frequencies(Text.objects.filter(task=instance).values_list('pk', flat=True))
+    corrections.count_task(instance.pk, None)
+    if instance.classroom_id is not None:
+        gradebook.count_task(instance.pk, instance.classroom_id, instance.task_level, -1)
+        progress.count_task(instance.pk, instance.classroom_id, -1)
+        counters.shift(instance.classroom_id, tasks=-1)
+        pending.forget_classroom_tasks([instance.classroom_id])
+
+
+@receiver(post_init, sender=Text)
+def remember_text_placement(sender, instance, **kwargs):
+    instance._saved_task_id = instance.__dict__.get('task_id')
+    instance._saved_classroom_id = instance.__dict__.get('classroom_id')
+    instance._saved_content = instance.__dict__.get('content')
+
+
+@receiver(post_save, sender=Text)
+def text_saved(sender, instance, created, update_fields, raw, **kwargs):
+    if raw:
+        return
+    rewritten = created or not skipped('content', update_fields) and instance.content != instance._saved_content
+    moved = not skipped('task', update_fields) and (None if created else instance._saved_task_id) != instance.task_id
+    if moved and not created:
+        corrections.recount([instance.pk])
+    if rewritten:
+        if not created:
+            tokens.forget(Text, [instance.pk])
+        # Fingerprinting tokenizes it again, realigning its moderations recounts its corrections
+        transaction.on_commit(lambda: fingerprint_texts.delay([instance.pk]))
+        moderated_text_pks = [] if created else list(ModeratedText.objects.filter(original=instance).values_list('pk', flat=True))
+        if moderated_text_pks:
+            transaction.on_commit(lambda: align_moderations.delay(moderated_text_pks))
+        instance._saved_content = instance.content
+    if rewritten or moved:
+        # Once its stale tokens are gone, outside a transaction the task runs at once
+        recount_frequencies([instance.pk])
+    if not skipped('classroom', update_fields):
+        previous, current = None if created else instance._saved_classroom_id, instance.classroom_id
+        if previous != current:
+            counters.shift_text(previous, instance.status, -1)
+            counters.shift_text(current, instance.status, 1)
+        instance._saved_classroom_id = current
+    if skipped('task', update_fields):
+        return
+    previous, current = None if created else instance._saved_task_id, instance.task_id
+    if previous != current:
+        if previous is not None:
+            progress.count_text(instance.pk, instance.creator_id, previous, -1)
+            gradebook.count_text(instance.pk, previous, -1)
+            pending.forget_completed([instance.creator_id])
+        if current is not None:
+            progress.count_text(instance.pk, instance.creator_id, current, 1)
+            gradebook.count_text(instance.pk, current, 1)
+            pending.mark_completed(instance.creator_id, current)
+    instance._saved_task_id = current
+
+
+@receiver(pre_delete, sender=Text)
+def text_deleting(sender, instance, **kwargs):
+    # Before its corrections go with it, in whatever order
+    corrections.forget([instance.pk])
+
+
+@receiver(post_delete, sender=Text)
+def text_deleted(sender, instance, **kwargs):
+    # Its moderations were deleted first and made it pending again
+    counters.shift_text(instance.classroom_id, Text.PENDING, -1)
+    recount_frequencies([instance.pk])
+    if instance.task_id is not None:
+        progress.count_text(instance.pk, instance.creator_id, instance.task_id, -1)
+        pending.forget_completed([instance.creator_id])
+
+
+@receiver(post_init, sender=ModeratedText)
+def remember_grades(sender, instance, **kwargs):
+    instance._saved_grades = (instance.__dict__.get('grammar_grade'), instance.__dict__.get('essay_grade'))
+    instance._saved_content = instance.__dict__.get('content')
+
+
+@receiver(post_save, sender=ModeratedText)
+def grade_saved(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    grades = (instance.grammar_grade, instance.essay_grade)
+    recount = False
+    if created:
+        if moderation.link(instance):
+            gradebook.count_grade(instance.original_id, *grades, 1)
+            recount = True
+        progress.count_grade(instance.pk, instance.original_id, 1)
+    elif (grades, instance.content) != (instance._saved_grades, instance._saved_content) \
+            and Text.objects.filter(moderated_text=instance).exists():
+        if grades != instance._saved_grades:
+            gradebook.count_grade(instance.original_id, *instance._saved_grades, -1)
+            gradebook.count_grade(instance.original_id, *grades, 1)
+        recount = instance.content != instance._saved_content
+    if created or instance.content != instance._saved_content:
+        if not created:
+            tokens.forget(ModeratedText, [instance.pk])
+        transaction.on_commit(lambda: align_moderations.delay([instance.pk]))
+        transaction.on_commit(lambda: tokenize_texts.delay(moderated_text_pks=[instance.pk]))
+    if recount:
+        # Once its stale tokens are gone, outside a transaction the task runs at once
+        recount_frequencies([instance.original_id])
+    instance._saved_grades = grades
+    instance._saved_content = instance.content
+
+
+@receiver(pre_delete, sender=ModeratedText)
+def grade_deleting(sender, instance, **kwargs):
+    # A cascade nulls Text.moderated_text and deletes every moderation of the text before any post_delete
+    instance._linked = Text.objects.filter(moderated_text=instance).exists()
+
+
+@receiver(post_delete, sender=ModeratedText)
+def grade_deleted(sender, instance, **kwargs):
+    remaining = moderation.unlink(instance.original_id)
+    if instance._linked:
+        gradebook.count_grade(instance.original_id, instance.grammar_grade, instance.essay_grade, -1)
+        if remaining is not None:
+            gradebook.count_grade(instance.original_id, remaining.grammar_grade, remaining.essay_grade, 1)
+        progress.count_grade(instance.pk, instance.original_id, -1)
+        recount_frequencies([instance.original_id])
+        corrections.recount([instance.original_id])
+
+
+@receiver(m2m_changed, sender=Miner.classroom.through)
+def membership_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        instance._cleared_classroom_pks = list(instance.classroom.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        miner_pks, classroom_pks = pk_set, [instance.pk]
+    else:
+        miner_pks, classroom_pks = [instance.pk], pk_set
+    if action == 'post_add':
+        if pk_set:
+            progress.rebuild(miner_pks, classroom_pks)
+    else:
+        progress.forget(miner_pks, classroom_pks)
+    if action == 'post_clear' and not reverse:
+        classroom_pks = instance._cleared_classroom_pks
+    counters.refresh_participants(classroom_pks or [])
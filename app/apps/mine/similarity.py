@@ -0,0 +1,191 @@
+"""
+Near-duplicate essays. Every text is fingerprinted once it is written: the hash of its words
+finds exact copies, and a MinHash signature of its word shingles estimates how much of it it
+shares with any other text, its Jaccard similarity. The signature is cut into BANDS bands,
+each stored as an LshBucket key, so that texts sharing a key are the only candidates compared:
+two texts with similarity s share a key with probability 1 - (1 - s^ROWS)^BANDS, about even
+odds at 0.42 and 99% from 0.65. Candidates at least SIMILARITY_THRESHOLD alike are stored as a
+Similarity and shown to the moderators grading either text.
+
+Texts are read as the word forms stored by apps.mine.tokens. fingerprint_rows is free of the
+database so that the backfill can run in a process pool, see the fingerprint_texts command.
+Bumping VERSION marks every stored fingerprint stale.
+"""
+import hashlib
+import heapq
+import struct
+from collections import OrderedDict, defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from apps.mine import tokens
+from apps.mine.models import Fingerprint, LshBucket, Similarity, Text
+from config.settings.common import SIMILARITY_BATCH_SIZE, SIMILARITY_MAX_MATCHES, SIMILARITY_THRESHOLD
+
+
+VERSION = 2
+SHINGLE_SIZE = 3
+BANDS, ROWS = 32, 4
+PERMUTATIONS = BANDS * ROWS
+EMPTY = (1 << 32) - 1
+SIGNATURE = struct.Struct('<{}I'.format(PERMUTATIONS))
+BAND = struct.Struct('<H{}I'.format(ROWS))
+
+
+def content_hash(words):
+    """Equal for texts with the same word forms, whatever their case, spacing and punctuation."""
+    return hashlib.sha256(' '.join(words).encode()).hexdigest()
+
+
+def shingles(words):
+    """The runs of SHINGLE_SIZE of words, the forms of a text, a short text is one shingle."""
+    size = min(SHINGLE_SIZE, len(words))
+    return {' '.join(words[i:i + size]).encode() for i in range(len(words) - size + 1)} if words else set()
+
+
+def signature(shingles):
+    """
+    The minimum of every hash function over shingles, all EMPTY for a text without words. The
+    PERMUTATIONS hash functions of a shingle are the 32-bit words of one SHAKE-128 digest of it,
+    and the minimums are taken column by column in C, several times faster than hashing each
+    shingle PERMUTATIONS times.
+    """
+    if not shingles:
+        return [EMPTY] * PERMUTATIONS
+    return list(map(min, zip(*(SIGNATURE.unpack(hashlib.shake_128(shingle).digest(SIGNATURE.size)) for shingle in shingles))))
+
+
+def keys(signature):
+    """The LSH key of every band of signature, the band number is hashed in so that bands never collide."""
+    return [
+        int.from_bytes(hashlib.blake2b(BAND.pack(band, *signature[band * ROWS:(band + 1) * ROWS]), digest_size=8).digest(),
+                       'little', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def estimate(a, b):
+    """The share of equal minimums of two signatures, an unbiased estimate of the Jaccard similarity."""
+    return sum(x == y for x, y in zip(a, b)) / PERMUTATIONS
+
+
+def fingerprint_rows(rows):
+    """[(pk, content hash, packed signature, keys)] for rows of (pk, word forms), runs in pool workers."""
+    results = []
+    for pk, words in rows:
+        text_shingles = shingles(words)
+        minimums = signature(text_shingles)
+        # Texts without words all look alike, the content hash is enough for them
+        results.append((pk, content_hash(words), SIGNATURE.pack(*minimums), keys(minimums) if text_shingles else []))
+    return results
+
+
+def store(results):
+    """Saves the fingerprints of fingerprint_rows, replacing older ones of the same texts."""
+    text_pks = [pk for pk, _, _, _ in results]
+    with transaction.atomic():
+        Fingerprint.objects.filter(text_id__in=text_pks).delete()
+        LshBucket.objects.filter(text_id__in=text_pks).delete()
+        Fingerprint.objects.bulk_create([
+            Fingerprint(text_id=pk, version=VERSION, content_hash=digest, signature=packed)
+            for pk, digest, packed, _ in results
+        ], batch_size=500)
+        LshBucket.objects.bulk_create(
+            [LshBucket(key=key, text_id=pk) for pk, _, _, text_keys in results for key in text_keys], batch_size=500)
+
+
+def candidates(text_pks):
+    """
+    The texts sharing an LSH key with each of text_pks, and the SIMILARITY_MAX_MATCHES newest
+    sharing its content hash, which are all equally alike.
+    """
+    text_pks = set(text_pks)
+    near, copies = defaultdict(set), defaultdict(set)
+    for pk, key in LshBucket.objects.filter(key__in=LshBucket.objects.filter(text_id__in=text_pks).values('key')) \
+            .values_list('text_id', 'key'):
+        near[key].add(pk)
+    for pk, digest in Fingerprint.objects.filter(
+            content_hash__in=Fingerprint.objects.filter(text_id__in=text_pks).values('content_hash')) \
+            .values_list('text_id', 'content_hash'):
+        copies[digest].add(pk)
+    found = defaultdict(set)
+    for group in near.values():
+        for pk in group & text_pks:
+            found[pk] |= group
+    for group in copies.values():
+        for pk in group & text_pks:
+            found[pk] -= group
+            found[pk] |= set(heapq.nlargest(SIMILARITY_MAX_MATCHES, group - {pk}))
+    for pk, others in found.items():
+        others.discard(pk)
+    return found
+
+
+def match(text_pks):
+    """
+    Recomputes the similarities found for text_pks, the SIMILARITY_MAX_MATCHES most alike texts
+    of each, newest first among equals, so that an essay copied a thousand times costs no more
+    than one copied twenty times. Returns how many there are.
+    """
+    found = candidates(text_pks)
+    fingerprints = {
+        pk: (digest, SIGNATURE.unpack(packed)) for pk, digest, packed in Fingerprint.objects
+        .filter(text_id__in=set(found).union(*found.values())).values_list('text_id', 'content_hash', 'signature')
+    }
+    similarities = []
+    for pk, others in found.items():
+        # Texts deleted since their buckets were read took their fingerprints with them
+        if pk not in fingerprints:
+            continue
+        digest, minimums = fingerprints[pk]
+        alike = []
+        for other in others:
+            if other not in fingerprints:
+                continue
+            other_digest, other_minimums = fingerprints[other]
+            exact = digest == other_digest
+            jaccard = 1.0 if exact else estimate(minimums, other_minimums)
+            if jaccard >= SIMILARITY_THRESHOLD:
+                alike.append((exact, jaccard, other))
+        similarities += [Similarity(text_id=pk, other_id=other, jaccard=jaccard, exact=exact)
+                         for exact, jaccard, other in heapq.nlargest(SIMILARITY_MAX_MATCHES, alike)]
+    with transaction.atomic():
+        Similarity.objects.filter(text_id__in=text_pks).delete()
+        Similarity.objects.bulk_create(similarities, batch_size=500)
+    return len(similarities)
+
+
+def rows(texts, batch_size=SIMILARITY_BATCH_SIZE):
+    """(pk, word forms) of texts in pk order."""
+    for pk, text_tokens in tokens.stream(texts, batch_size):
+        yield pk, text_tokens.words
+
+
+def stale():
+    """Texts without a fingerprint of the current version."""
+    return Text.objects.filter(Q(fingerprint__isnull=True) | Q(fingerprint__version__lt=VERSION))
+
+
+def compute(text_pks):
+    """Fingerprints and matches text_pks in this process, returns how many texts there were."""
+    results = fingerprint_rows(rows(Text.objects.filter(pk__in=text_pks)))
+    # Committed before matching, so that of two texts fingerprinted at once at least one sees the other
+    store(results)
+    match([pk for pk, _, _, _ in results])
+    return len(results)
+
+
+def similar(text):
+    """
+    The Similarity rows found for or against text, most alike first, each with the other text
+    as resembling. A pair found from both sides shows once.
+    """
+    similarities = Similarity.objects.filter(Q(text=text) | Q(other=text)) \
+        .select_related('text__creator__user', 'text__classroom', 'other__creator__user', 'other__classroom') \
+        .order_by('-exact', '-jaccard', '-pk')
+    shown = OrderedDict()
+    for similarity in similarities:
+        similarity.resembling = similarity.other if similarity.text_id == text.pk else similarity.text
+        shown.setdefault(similarity.resembling.pk, similarity)
+    return list(shown.values())
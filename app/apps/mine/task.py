@@ -1,44 +1,144 @@
-# from celery import shared_task
+import logging
+from datetime import timedelta
+from smtplib import SMTPException
 
+from celery import shared_task
 from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.db import OperationalError, transaction
+from django.db.models import Min
+from django.urls import reverse
+from django.utils import timezone
 
-from config.settings.common import EMAIL_HOST_USER
-from apps.mine.models import Classroom, Task, Text, Notification
+from config.settings.common import EMAIL_HOST_USER, MAIL_TASK_MAX_RETRIES, MAIL_TASK_RETRY_BACKOFF_MAX, \
+    NOTIFICATION_DIGEST_WINDOW
+from apps.mine.mail import render_html_template, send_mass_email
+from apps.mine.models import Classroom, Task, Miner, DigestEntry, ModeratedText, Text
+from apps.mine.notifications import notify
+from apps.mine import alignment, corrections, frequencies, moderation, retention, similarity, tokens
 
 
-# @shared_task
+logger = logging.getLogger(__name__)
+
+
+# SMTPException covers refused/disconnected sessions, OSError covers socket timeouts and resets
+MAIL_TASK_OPTIONS = {
+    'autoretry_for': (SMTPException, OSError),
+    'retry_backoff': True,
+    'retry_backoff_max': MAIL_TASK_RETRY_BACKOFF_MAX,
+    'retry_jitter': True,
+    'retry_kwargs': {'max_retries': MAIL_TASK_MAX_RETRIES},
+}
+
+
+@shared_task(**MAIL_TASK_OPTIONS)
 def send_email(name, subject, title, message, url, recipient):
     template = render_html_template(name, title, message, url)
     send_mail(subject, message, EMAIL_HOST_USER, recipient, html_message=template)
 
 
-# @shared_task
+@shared_task(**MAIL_TASK_OPTIONS)
 def send_emails(classroom_pk, task_pk, subject, message, url):
-    classroom = Classroom.objects.get(pk=classroom_pk)
     task = Task.objects.get(pk=task_pk)
+    recipients = Miner.objects.filter(classroom__pk=classroom_pk).values_list('user__first_name', 'user__email')
 
-    for recipient in classroom.participants.all():
-        template = render_html_template(recipient.user.first_name, task.task_title, message, url)
-        send_mail(subject, message, EMAIL_HOST_USER, [recipient.user.email], html_message=template)
+    failed = send_mass_email(subject, task.task_title, message, url, recipients)
+    if failed:
+        logger.warning('Task %s: %d of %d emails were not delivered', task_pk, len(failed), len(recipients))
+    return failed
 
 
-# @shared_task
-def send_mass_notification(classroom_pk, message, url):
+@shared_task(**MAIL_TASK_OPTIONS)
+def send_grade_emails(classroom_pk, miner_pks, url):
+    """Tells the miners of a bulk grading that their essays in the classroom were graded."""
     classroom = Classroom.objects.get(pk=classroom_pk)
+    recipients = Miner.objects.filter(pk__in=miner_pks).values_list('user__first_name', 'user__email')
+
+    failed = send_mass_email('Сіздің эссеңіз тексерілді', classroom.title, 'Сіздің мұғаліміңіз эссеңізді тексерді', url, recipients)
+    if failed:
+        logger.warning('Classroom %s: %d of %d grade emails were not delivered', classroom_pk, len(failed), len(recipients))
+    return failed
+
+
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def send_mass_notification(classroom_pk, message, url):
+    recipients = Miner.objects.filter(classroom__pk=classroom_pk).values_list('user_id', flat=True)
+    notify(recipients, message, url)
+
+
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def flush_digests(window=NOTIFICATION_DIGEST_WINDOW):
+    """Sends every digest whose first buffered essay is older than window seconds."""
+    due = timezone.now() - timedelta(seconds=window)
+    groups = DigestEntry.objects.values('recipient', 'classroom').annotate(first=Min('date')).filter(first__lte=due)
+    for group in groups:
+        flush_digest(group['recipient'], group['classroom'])
+
+
+def flush_digest(recipient_pk, classroom_pk):
+    """
+    Replaces the buffered entries of one (recipient, classroom) pair with a single notification
+    and email. Entries are deleted in the same transaction that creates the notification,
+    so a worker restarting mid-flush neither loses nor repeats a digest.
+    """
+    with transaction.atomic():
+        entries = list(DigestEntry.objects.select_for_update(skip_locked=True, of=('self', ))
+                       .filter(recipient__pk=recipient_pk, classroom__pk=classroom_pk)
+                       .select_related('recipient', 'classroom', 'text__creator__user')
+                       .order_by('date'))
+        if not entries:
+            return
+        DigestEntry.objects.filter(pk__in=[entry.pk for entry in entries]).delete()
+
+        first = entries[0]
+        classroom = first.classroom
+        if len(entries) == 1:
+            title = '{} {}'.format(first.text.creator.user.first_name, first.text.creator.user.last_name)
+            message = '{} сыныбында жаңа эссе жіберілді'.format(classroom.title)
+            link = first.text.get_absolute_url()
+        else:
+            title = classroom.title
+            message = '{} сыныбында {} жаңа эссе жіберілді'.format(classroom.title, len(entries))
+            link = reverse('mine:moderator-classroom-detail', kwargs={'pk': classroom.pk})
+        notify([recipient_pk], message, link)
+
+        name = first.recipient.first_name
+        subject = 'Жаңа эссе жіберілді'
+        url = first.host + link
+        recipient = [first.recipient.email]
+        transaction.on_commit(lambda: send_email.delay(name, subject, title, message, url, recipient))
+
+
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def expire_notifications():
+    return retention.expire_notifications()
+
+
+@shared_task
+def release_expired_claims():
+    return moderation.release_expired()
+
+
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def align_moderations(moderated_text_pks):
+    """Aligns moderated_text_pks, then recounts the corrections of the texts they are the moderation of."""
+    count = alignment.compute(moderated_text_pks)
+    corrections.recount(Text.objects.filter(moderated_text_id__in=moderated_text_pks).values_list('pk', flat=True))
+    return count
+
+
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def fingerprint_texts(text_pks):
+    """Fingerprints text_pks, tokenizing them on the way when their tokens are missing."""
+    return similarity.compute(text_pks)
+
+
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def tokenize_texts(text_pks=(), moderated_text_pks=()):
+    return tokens.compute(Text, text_pks) + tokens.compute(ModeratedText, moderated_text_pks)
+
 
-    for recipient in classroom.participants.all():
-        Notification.objects.create(user=recipient.user,
-                                    link=url,
-                                    description=message)
-
-
-def render_html_template(name, title, text, url):
-    context = {
-        'name': name,
-        'card_title': title,
-        'card_text': text,
-        'text_url': url
-    }
-    template = render_to_string('mine/email_body.html', context)
-    return template
+@shared_task(autoretry_for=(OperationalError, ), retry_backoff=True, retry_kwargs={'max_retries': MAIL_TASK_MAX_RETRIES})
+def count_frequencies(text_pks):
+    """Recounts the n-grams of text_pks, those deleted meanwhile are taken away."""
+    frequencies.recount(text_pks)
+    return len(text_pks)
@@ -1,3 +1,88 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase
 
-# Create your tests here.
+from apps.authentication.models import User
+from apps.mine import analysis, gradebook, progress, tokens
+from apps.mine.models import Classroom, ClassroomProgress, LevelGrade, Miner, MinerGrade, ModeratedText, Task, \
+    TaskGrade, Text
+
+
+class StemTests(SimpleTestCase):
+
+    def assertStems(self, stems):
+        for word, stem in stems.items():
+            with self.subTest(word=word):
+                self.assertEqual(analysis.stem(word), stem)
+
+    def test_roots_ending_like_a_suffix_are_kept(self):
+        self.assertStems({
+            'халық': 'халық', 'халықтар': 'халық', 'сынып': 'сынып', 'сыныпта': 'сынып',
+            'мұғалім': 'мұғалім', 'мұғалімдер': 'мұғалім', 'шеше': 'шеше', 'дене': 'дене',
+            'бастық': 'бастық', 'бастықтар': 'бастық', 'жақсы': 'жақсы', 'жақсының': 'жақсы',
+        })
+
+    def test_suffix_chains_are_stripped(self):
+        self.assertStems({
+            'мектептерімізде': 'мектеп', 'кітабымда': 'кітап', 'кітаптардан': 'кітап', 'барамын': 'бар',
+            'балалар': 'бала', 'жазған': 'жаз', 'оқушылар': 'оқушы',
+        })
+
+
+class FormTests(SimpleTestCase):
+
+    def test_invisible_tokens_are_dropped(self):
+        text = 'сөз \u00ad бала\u200b \u200b'
+        self.assertEqual(analysis.words(text), ['сөз', 'бала'])
+        [(_, found)] = tokens.tokenize_rows([(1, text)])
+        self.assertEqual(found.words, ['сөз', 'бала'])
+        self.assertEqual(found.spans(), [(0, 3), (6, 11)])
+
+
+class RollupTests(TestCase):
+    """The rollups kept up by the signal handlers agree with those rebuilt from scratch."""
+
+    def setUp(self):
+        owner = User.objects.create_user('owner@example.com', first_name='O', last_name='O')
+        self.moderator = User.objects.create_user('moderator@example.com', first_name='M', last_name='M')
+        self.classroom = Classroom.objects.create(owner=owner, title='A', invitation_code='AAAAAAAA')
+        self.task = Task.objects.create(classroom=self.classroom, task_title='A', task_description='A')
+        self.miner = Miner.objects.create(
+            user=User.objects.create_user('miner@example.com', first_name='M', last_name='M'))
+        self.miner.classroom.add(self.classroom)
+
+    def write(self, *grades):
+        text = Text.objects.create(creator=self.miner, task=self.task, classroom=self.classroom, content='Мен барамын')
+        for grade in grades:
+            ModeratedText.objects.create(original=text, moderator=self.moderator, content='Мен бардым',
+                                         grammar_grade=grade, essay_grade=grade)
+        return text
+
+    def grades(self):
+        return {model.__name__: sorted(model.objects.exclude(grammar=0, essay=0).values_list(
+            *[field.attname for field in model._meta.concrete_fields if not field.primary_key]))
+            for model in (MinerGrade, TaskGrade, LevelGrade)}
+
+    def progress(self):
+        return sorted(ClassroomProgress.objects.values_list('miner_id', 'classroom_id', 'pending', 'completed', 'graded'))
+
+    def assertRollupsRebuilt(self):
+        live = self.grades(), self.progress()
+        gradebook.rebuild()
+        progress.rebuild()
+        self.assertEqual(live, (self.grades(), self.progress()))
+
+    def test_deleting_a_text_with_several_moderations(self):
+        self.write(5)
+        self.write(9, 2).delete()
+        self.assertRollupsRebuilt()
+
+    def test_deleting_several_moderations_at_once(self):
+        text = self.write(9, 2, 7)
+        ModeratedText.objects.filter(original=text).exclude(grammar_grade=7).delete()
+        self.assertRollupsRebuilt()
+        ModeratedText.objects.filter(original=text).delete()
+        self.assertRollupsRebuilt()
+
+    def test_deleting_the_moderator(self):
+        self.write(9, 2)
+        self.moderator.delete()
+        self.assertRollupsRebuilt()
@@ -0,0 +1,175 @@
+"""
+Essays and corrections tokenized once. The tokens of every Text and ModeratedText are stored
+next to it as a TextTokens or ModeratedTextTokens row: their (start, end) offsets into the
+content and the ids of their word forms, each packed as little-endian 32-bit integers, 8 and 4
+bytes a token. A word form id is the pk of a WordForm, the vocabulary shared by every content.
+
+Contents are tokenized in the background after they are saved, see the signal handlers in
+apps.mine.signals, and their stored tokens are deleted on the spot so that nothing reads them
+stale. Rows stored by an earlier version of apps.mine.analysis, or missing, are tokenized again
+when they are read. Passes over the whole corpus stream the stored tokens instead of the raw
+contents, see stream(), and tokenize_rows is free of the database so that the backfill can run
+in a process pool, see the tokenize_texts command.
+"""
+import sys
+from array import array
+from collections import namedtuple
+from itertools import islice
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from apps.mine import analysis
+from apps.mine.models import ModeratedText, ModeratedTextTokens, Text, TextTokens, WordForm
+from config.settings.common import ANALYSIS_CACHE_SIZE, TOKENS_BATCH_SIZE
+
+
+STORES = {
+    Text: TextTokens,
+    ModeratedText: ModeratedTextTokens,
+}
+MAX_LENGTH = WordForm._meta.get_field('form').max_length
+BATCH_SIZE = 500
+# Word form ids and forms seen by this process, form ids never change once committed
+IDS, FORMS = {}, {}
+
+
+class Tokens(namedtuple('Tokens', 'offsets words')):
+    """offsets holds start and end of every token in turn, words their word forms."""
+
+    def spans(self):
+        return list(zip(self.offsets[::2], self.offsets[1::2]))
+
+
+def pack(numbers):
+    packed = array('I', numbers)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack(data):
+    numbers = array('I')
+    numbers.frombytes(bytes(data))
+    if sys.byteorder == 'big':
+        numbers.byteswap()
+    return numbers
+
+
+def tokenize_rows(rows):
+    """[(pk, Tokens)] for rows of (pk, content), runs in pool workers."""
+    results = []
+    for pk, content in rows:
+        offsets, words = array('I'), []
+        for match in analysis.TOKEN.finditer(content):
+            word = analysis.form(match.group())[:MAX_LENGTH]
+            # Soft hyphens and zero width spaces on their own fold away to nothing
+            if word:
+                offsets.extend(match.span())
+                words.append(word)
+        results.append((pk, Tokens(offsets, words)))
+    return results
+
+
+def chunks(items, size=BATCH_SIZE):
+    items = iter(items)
+    chunk = list(islice(items, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(items, size))
+
+
+def form_ids(words):
+    """{form: id} for the forms of words, adding the forms the vocabulary is missing."""
+    # Ids of forms added inside a transaction that rolls back are never remembered
+    remember = not connection.in_atomic_block
+    found = {word: IDS[word] for word in words if word in IDS}
+    missing = sorted({word for word in words if word not in found})
+    table = connection.ops.quote_name(WordForm._meta.db_table)
+    with connection.cursor() as cursor:
+        for batch in chunks(missing):
+            # In form order, so that concurrent writers lock rows in the same order
+            cursor.execute('INSERT INTO {} (form) VALUES {} ON CONFLICT (form) DO NOTHING'.format(
+                table, ', '.join(['(%s)'] * len(batch))), batch)
+            found.update(WordForm.objects.filter(form__in=batch).values_list('form', 'pk'))
+    if remember and missing:
+        if len(IDS) + len(missing) > ANALYSIS_CACHE_SIZE:
+            IDS.clear()
+        IDS.update((word, found[word]) for word in missing)
+    return found
+
+
+def forms(ids):
+    """{id: form} for ids, word form ids."""
+    found = {pk: FORMS[pk] for pk in ids if pk in FORMS}
+    missing = sorted({pk for pk in ids if pk not in found})
+    for batch in chunks(missing):
+        found.update(WordForm.objects.filter(pk__in=batch).values_list('pk', 'form'))
+    if missing:
+        if len(FORMS) + len(missing) > ANALYSIS_CACHE_SIZE:
+            FORMS.clear()
+        FORMS.update((pk, found[pk]) for pk in missing)
+    return found
+
+
+def store(model, results):
+    """Saves results of tokenize_rows for the contents of model, Text or ModeratedText, replacing older rows."""
+    if not results:
+        return
+    ids = form_ids([word for _, tokens in results for word in tokens.words])
+    tokens_model = STORES[model]
+    table = connection.ops.quote_name(tokens_model._meta.db_table)
+    column = connection.ops.quote_name(tokens_model._meta.pk.column)
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in chunks(sorted(results)):
+            # Contents read while their tokens are missing may be tokenized by two processes at once
+            cursor.execute(
+                'INSERT INTO {table} ({column}, version, offsets, forms) VALUES {values} ON CONFLICT ({column}) '
+                'DO UPDATE SET version = EXCLUDED.version, offsets = EXCLUDED.offsets, forms = EXCLUDED.forms'.format(
+                    table=table, column=column, values=', '.join(['(%s, %s, %s, %s)'] * len(batch))),
+                [param for pk, tokens in batch for param in (
+                    pk, analysis.VERSION, pack(tokens.offsets), pack(ids[word] for word in tokens.words))])
+
+
+def load(model, pks):
+    """{pk: Tokens} of pks, contents of model, tokenizing those without tokens of the current version."""
+    found = {}
+    for batch in chunks(pks):
+        rows = list(STORES[model].objects.filter(pk__in=batch, version=analysis.VERSION)
+                    .values_list('pk', 'offsets', 'forms'))
+        rows = [(pk, unpack(offsets), unpack(ids)) for pk, offsets, ids in rows]
+        words = forms([form_pk for _, _, ids in rows for form_pk in ids])
+        found.update((pk, Tokens(offsets, [words[form_pk] for form_pk in ids])) for pk, offsets, ids in rows)
+        results = tokenize_rows(model.objects.filter(pk__in=[pk for pk in batch if pk not in found])
+                                .values_list('pk', 'content'))
+        store(model, results)
+        found.update(results)
+    return found
+
+
+def stream(queryset, batch_size=TOKENS_BATCH_SIZE):
+    """(pk, Tokens) of every row of queryset, Texts or ModeratedTexts, in pk order, batch_size rows a query."""
+    pks = queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    for batch in chunks(pks, batch_size):
+        found = load(queryset.model, batch)
+        # Rows deleted meanwhile are skipped
+        for pk in batch:
+            if pk in found:
+                yield pk, found[pk]
+
+
+def forget(model, pks):
+    """Deletes the tokens of pks, contents of model that were rewritten."""
+    STORES[model].objects.filter(pk__in=pks).delete()
+
+
+def stale(model):
+    """Contents of model without tokens of the current version."""
+    return model.objects.filter(Q(tokens__isnull=True) | Q(tokens__version__lt=analysis.VERSION))
+
+
+def compute(model, pks):
+    """Tokenizes pks, contents of model, in this process, returns how many there were."""
+    results = tokenize_rows(model.objects.filter(pk__in=pks).order_by('pk').values_list('pk', 'content'))
+    store(model, results)
+    return len(results)
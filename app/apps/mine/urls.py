@@ -13,6 +13,10 @@ admin_patterns = [
     path('admin/texts/<int:pk>/moderate/', admin.AdminModerateTextView.as_view(), name='admin-raw-text-moderate'),
     path('admin/texts/moderated/', admin.AdminModeratedTextListView.as_view(), name='admin-moderated-text'),
     path('admin/texts/moderated/<int:pk>/', admin.AdminModeratedTextDetailView.as_view(), name='admin-moderated-text-detail'),
+    path('admin/texts/export/', admin.AdminCorpusExportView.as_view(), name='admin-corpus-export'),
+    path('admin/search/', admin.AdminSearchView.as_view(), name='admin-search'),
+    path('admin/api/frequencies', admin.AdminFrequencyAPIView.as_view(), name='admin-api-frequencies'),
+    path('admin/api/corrections', admin.AdminCorrectionAPIView.as_view(), name='admin-api-corrections'),
     path('admin/users/miners/', admin.AdminMinerListView.as_view(), name='admin-miners'),
     path('admin/users/moderators/', admin.AdminModeratorListView.as_view(), name='admin-moderators'),
     path('admin/users/<int:pk>/activate/', admin.AdminUserActivateView.as_view(), name='admin-user-turn'),
@@ -24,14 +28,24 @@ moderator_patterns = [
     path('moderator/texts/<int:pk>/text/<int:tpk>', moderator.ModeratorTextDetailView.as_view(), name='moderator-text-detail'),
     path('moderator/classrooms/', moderator.ModeratorClassroomListView.as_view(), name='moderator-classrooms'),
     path('moderator/classroom/<int:pk>', moderator.ModeratorClassroomDetailView.as_view(), name='moderator-classroom-detail'),
+    path('moderator/classroom/<int:pk>/gradebook', moderator.ModeratorClassroomGradebookView.as_view(), name='moderator-classroom-gradebook'),
+    path('moderator/classroom/<int:pk>/panel/<str:panel>', moderator.ModeratorClassroomPanelView.as_view(), name='moderator-classroom-panel'),
     path('moderator/classroom/create', moderator.ModeratorClassroomCreateView.as_view(), name='moderator-classroom-create'),
     path('moderator/classroom/<int:cpk>/user/<int:upk>/remove', moderator.ModeratorRemoveUserView.as_view(), name='moderator-classroom-user-remove'),
     path('moderator/classroom/<int:pk>/tasks/create/', moderator.ModeratorClassroomTaskCreateView.as_view(), name='moderator-classroom-task-create'),
     path('moderator/classroom/<int:cpk>/task/<int:tpk>/edit', moderator.ModeratorClassroomTaskEditView.as_view(), name='moderator-classroom-edit-task'),
     path('moderator/classroom/<int:cpk>/text/<int:tpk>/moderate/', moderator.ModeratorClassroomModerateTextView.as_view(), name='moderator-classroom-text-moderate'),
     path('moderator/classroom/<int:cpk>/text/moderated/<int:tpk>/', moderator.ModeratorClassroomModeratedTextView.as_view(), name='moderator-classroom-moderated-text'),
+    path('moderator/inbox/', moderator.ModeratorInboxView.as_view(), name='moderator-inbox'),
+    path('moderator/queue/next', moderator.ModeratorQueueNextView.as_view(), name='moderator-queue-next'),
+    path('moderator/queue/<int:tpk>/', moderator.ModeratorQueueTextView.as_view(), name='moderator-queue-text'),
+    path('moderator/search/', moderator.ModeratorSearchView.as_view(), name='moderator-search'),
+    path('moderator/grades/import', moderator.ModeratorGradeImportView.as_view(), name='moderator-grade-import'),
+    path('moderator/api/grades', moderator.ModeratorGradeAPIView.as_view(), name='moderator-api-grades'),
     path('moderator/notifications/unread', moderator.ModeratorUnreadNotificationsView.as_view(), name='moderator-notifications-unread'),
     path('moderator/notifications/read', moderator.ModeratorReadNotificationsView.as_view(), name='moderator-notifications-read'),
+    path('moderator/notifications/mark-read', moderator.ModeratorNotificationsMarkReadView.as_view(), name='moderator-notifications-mark-read'),
+    path('moderator/notifications/stream', moderator.ModeratorNotificationStreamView.as_view(), name='moderator-notifications-stream'),
     path('moderator/notifications/<int:pk>/toggle', moderator.ModeratorNotificationToggleView.as_view(), name='moderator-notification-status-toggle'),
     path('moderator/profile/', moderator.ModeratorProfileView.as_view(), name='moderator-profile')
 ]
@@ -49,6 +63,8 @@ miner_patterns = [
     path('miner/classroom/<int:cpk>/result/<int:tpk>/', miner.MinerClassroomResultDetailView.as_view(), name='miner-classroom-result-detail'),
     path('miner/notifications/unread', miner.MinerUnreadNotificationsView.as_view(), name='miner-notifications-unread'),
     path('miner/notifications/read', miner.MinerReadNotificationsView.as_view(), name='miner-notifications-read'),
+    path('miner/notifications/mark-read', miner.MinerNotificationsMarkReadView.as_view(), name='miner-notifications-mark-read'),
+    path('miner/notifications/stream', miner.MinerNotificationStreamView.as_view(), name='miner-notifications-stream'),
     path('miner/notifications/<int:pk>/toggle', miner.MinerNotificationToggleView.as_view(), name='miner-notification-status-toggle'),
     path('miner/profile/', miner.MinerProfileView.as_view(), name='miner-profile'),
 ]
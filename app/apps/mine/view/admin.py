@@ -1,14 +1,27 @@
 from braces.views import SuperuserRequiredMixin
+from django.contrib import messages
 from django.db.models import Q
-from django.http import Http404
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
+from django.utils.translation import ugettext as _
 
 from django.urls import reverse_lazy
-from django.views.generic import CreateView, TemplateView, ListView, DetailView, RedirectView, UpdateView
+from django.utils import timezone
+from django.views.generic import CreateView, FormView, TemplateView, ListView, DetailView, RedirectView, UpdateView
 
 from apps.authentication.forms import ProfileForm
 from apps.authentication.models import User
-from apps.mine.forms import TextForm, ModerateTextForm, CreateTaskForm, CreateClassroomForm, JoinClassroomForm
-from apps.mine.models import Text, ModeratedText, Task, Classroom
+from apps.mine import corpus, corrections, frequencies
+from apps.mine.forms import TextForm, ModerateTextForm, CreateTaskForm, CreateClassroomForm, JoinClassroomForm, \
+    CorpusExportForm
+from apps.mine.models import Text, ModeratedText, NgramCount, Task, Classroom
+from apps.mine.moderation import AlreadyModerated, Claimed, moderate
+from apps.mine.pagination import KeysetPaginationMixin
+from apps.mine.permissions import IsSuperuser
+from apps.mine.view.search import SearchView
+
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 class BaseTextCreateView(CreateView):
     form_class = TextForm
@@ -50,10 +63,16 @@ class BaseTextModerationView(CreateView):
         return kwargs
 
     def form_valid(self, form):
-        self.object = form.save(commit=False)
-        self.object.raw_text = self.initial_text
-        self.object.moderator = self.request.user
-        self.object.save()
+        moderated_text = form.save(commit=False)
+        moderated_text.moderator = self.request.user
+        try:
+            self.object = moderate(self.initial_text.pk, moderated_text)
+        except AlreadyModerated:
+            messages.error(self.request, _("Бұл эссе тексеріліп қойған"))
+            return HttpResponseRedirect(self.get_success_url())
+        except Claimed:
+            messages.error(self.request, _("Бұл эссені басқа модератор тексеріп жатыр"))
+            return HttpResponseRedirect(self.get_success_url())
         return super().form_valid(form)
 
 
@@ -61,9 +80,9 @@ class BaseAdminView(SuperuserRequiredMixin):
     pass
 
 
-class AdminRawTextListView(BaseAdminView, ListView):
+class AdminRawTextListView(BaseAdminView, KeysetPaginationMixin, ListView):
     template_name = 'mine/admin/raw_texts.html'
-    queryset = Text.objects.all()
+    queryset = Text.objects.select_related('creator__user')
 
 
 class AdminRawTextCreateView(BaseAdminView, BaseTextCreateView):
@@ -110,9 +129,9 @@ class AdminModerateTextView(BaseAdminView, BaseTextModerationView):
     success_url = reverse_lazy('mine:admin-moderated-text')
 
 
-class AdminModeratedTextListView(BaseAdminView, ListView):
+class AdminModeratedTextListView(BaseAdminView, KeysetPaginationMixin, ListView):
     template_name = 'mine/admin/moderated_texts.html'
-    queryset = ModeratedText.objects.all()
+    queryset = ModeratedText.objects.select_related('original__creator__user', 'moderator')
 
 
 class AdminModeratedTextDetailView(BaseAdminView, DetailView):
@@ -120,6 +139,94 @@ class AdminModeratedTextDetailView(BaseAdminView, DetailView):
     queryset = ModeratedText.objects.all()
 
 
+class AdminCorpusExportView(BaseAdminView, FormView):
+    """Streams the corpus as an attachment once the filters are submitted, shows them until then."""
+    form_class = CorpusExportForm
+    template_name = 'mine/admin/corpus_export.html'
+
+    def get(self, request, *args, **kwargs):
+        if 'format' not in request.GET:
+            return super().get(request, *args, **kwargs)
+        form = self.form_class(request.GET)
+        if not form.is_valid():
+            return self.form_invalid(form)
+        format = form.cleaned_data['format']
+        response = StreamingHttpResponse(corpus.export(format, corpus.pairs(**form.filters())),
+                                         content_type='{}; charset=utf-8'.format(corpus.FORMATS[format]))
+        response['Content-Disposition'] = 'attachment; filename="corpus-{:%Y%m%d}.{}"'.format(timezone.now(), format)
+        return response
+
+
+class AdminFrequencyAPIView(APIView):
+    """
+    GET the top k n-grams of a scope, ?side=o|c&n=1..3&k=&classroom=&level=, or with ?ngram= the
+    frequency of one n-gram. The scope defaults to the original side of the whole corpus.
+    """
+    permission_classes = (IsSuperuser, )
+    max_k = 1000
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        side = params.get('side', NgramCount.ORIGINAL)
+        level = params.get('level', frequencies.EVERY_LEVEL)
+        try:
+            classroom_pk, n, k = (int(params.get(name, default)) for name, default in
+                                  (('classroom', frequencies.EVERY_CLASSROOM), ('n', 1), ('k', 50)))
+        except ValueError:
+            return Response({'error': 'classroom, n and k must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if side not in dict(NgramCount.SIDE_CHOICES) or n not in frequencies.SIZES or not 0 < k <= self.max_k:
+            return Response({'error': 'side must be o or c, n one of {} and k at most {}'.format(
+                frequencies.SIZES, self.max_k)}, status=status.HTTP_400_BAD_REQUEST)
+        scope = {'side': side, 'classroom': classroom_pk, 'task_level': level}
+        if 'ngram' in params:
+            count = frequencies.frequency(params['ngram'], side, classroom_pk, level)
+            return Response(dict(scope, ngram=params['ngram'], count=count))
+        return Response(dict(scope, n=n, top=frequencies.top(side, n, k, classroom_pk, level)))
+
+
+class AdminCorrectionAPIView(APIView):
+    """
+    GET the top k corrections of a scope, ?k=&classroom=&level=, with ?original=&corrected= the
+    miners whose texts had original corrected, to corrected or to anything, or with ?miner= the
+    corrections made most often to the texts of a miner.
+    """
+    permission_classes = (IsSuperuser, )
+    max_k = 1000
+
+    def get(self, request, *args, **kwargs):
+        params = request.query_params
+        level = params.get('level', corrections.EVERY_LEVEL)
+        try:
+            classroom_pk, k = (int(params.get(name, default)) for name, default in
+                               (('classroom', corrections.EVERY_CLASSROOM), ('k', 50)))
+            miner_pk = int(params['miner']) if 'miner' in params else None
+        except ValueError:
+            return Response({'error': 'classroom, k and miner must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < k <= self.max_k:
+            return Response({'error': 'k must be at most {}'.format(self.max_k)}, status=status.HTTP_400_BAD_REQUEST)
+        fields = ('original', 'corrected', 'count')
+        if 'original' in params:
+            found = corrections.miners(params['original'], params.get('corrected'), k)
+            return Response({'original': params['original'], 'corrected': params.get('corrected'),
+                             'miners': [{'miner': pk, 'count': count} for pk, count in found]})
+        if miner_pk is not None:
+            return Response({'miner': miner_pk, 'top': [dict(zip(fields, row)) for row in corrections.mistakes(miner_pk, k)]})
+        return Response({'classroom': classroom_pk, 'task_level': level,
+                         'top': [dict(zip(fields, row)) for row in corrections.top(k, classroom_pk, level)]})
+
+
+class AdminSearchView(BaseAdminView, SearchView):
+    template_name = 'mine/admin/search.html'
+
+    def get_scope(self):
+        return {
+            'texts': Text.objects.select_related('creator__user'),
+            'moderated': ModeratedText.objects.select_related('original__creator__user', 'moderator'),
+            'tasks': Task.objects.select_related('classroom'),
+            'people': User.objects.all(),
+        }
+
+
 class AdminProfileView(BaseAdminView, UpdateView):
     form_class = ProfileForm
     template_name = 'mine/admin/profile.html'
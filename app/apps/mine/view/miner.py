@@ -1,14 +1,18 @@
 from braces.views import GroupRequiredMixin as BaseGroupRequiredMixin, SuperuserRequiredMixin
 from django.http import HttpResponseRedirect
 from django.shortcuts import get_object_or_404
-from django.db.models import Count, Q
+from django.db.models import F
 from django.urls import reverse_lazy
 from django.views.generic import CreateView, ListView, DetailView, UpdateView, FormView, RedirectView
 
 from apps.authentication.forms import ProfileForm
+from apps.mine import alignment
 from apps.mine.forms import TextForm, ModerateTextForm, CreateTaskForm, CreateClassroomForm, JoinClassroomForm
-from apps.mine.models import Text, ModeratedText, Task, Classroom, Notification, Miner
-from apps.mine.task import send_email
+from apps.mine.models import Text, Task, Classroom, Notification, Miner
+from apps.mine.notifications import queue_digest, toggle_read, mark_read
+from apps.mine.pagination import KeysetPaginationMixin
+from apps.mine.pending import pending_tasks
+from apps.mine.view.stream import NotificationStreamView
 from config.settings.common import EMAIL_HOST_USER
 
 
@@ -23,24 +27,13 @@ class BaseTextCreateView(CreateView):
         self.object.task = Task.objects.get(pk=self.kwargs['tpk'])
         self.object.classroom = Classroom.objects.get(pk=self.kwargs['cpk'])
         self.object.save()
-        self.configure_email(self.object.classroom, self.object)
-        self.configure_notification(self.object.classroom)
+        self.configure_digest(self.object.classroom, self.object)
         return super().form_valid(form)
 
-    def configure_email(self, classroom, text):
-        name = classroom.owner.first_name
-        subject = 'Жаңа эссе жіберілді'
-        title = '{} {}'.format(text.creator.user.first_name, text.creator.user.last_name)
-        message = '{} сыныбында жаңа эссе жіберілді'.format(classroom.title)
-        url = self.request.META['HTTP_HOST'] + text.get_absolute_url()
-        recipient = [classroom.owner.email]
-        send_email(name, subject, title, message, url, recipient)
-
-    def configure_notification(self, classroom):
-        message = '{} сыныбында жаңа эссе жіберілді'.format(classroom.title)
-        Notification.objects.create(user=classroom.owner,
-                                    link=self.object.get_absolute_url(),
-                                    description=message)
+    def configure_digest(self, classroom, text):
+        if classroom.owner_id is None:
+            return
+        queue_digest(classroom.owner, classroom, text, self.request.META['HTTP_HOST'])
 
 
 class BaseMinerView(BaseGroupRequiredMixin):
@@ -59,10 +52,8 @@ class MinerInitialView(BaseMinerView, DetailView):
         return Classroom.objects.filter(owner__email=self.app_superuser)
 
     def get_context_data(self, **kwargs):
-        classroom = self.get_object()
-        miner = self.request.user.miner
-        texts = miner.task.all().filter(classroom=classroom).values_list('pk', flat=True)
-        context = {'tasks': classroom.tasks.order_by('-date').exclude(pk__in=texts)}
+        # The miner shares its pk with the user
+        context = {'tasks': pending_tasks(self.request.user.pk, self.object.pk)}
         kwargs.update(context)
         return super().get_context_data(**kwargs)
 
@@ -125,18 +116,15 @@ class MinerResultDetailView(BaseMinerView, DetailView):
     model = Text
 
     def get_context_data(self, **kwargs):
-        try:
-            moderated_text = ModeratedText.objects.get(original__pk=self.kwargs['tpk'])
-            context = {'moderated': True, 'moderated_text': moderated_text}
-        except ModeratedText.DoesNotExist:
-            context = {'moderated': False}
+        moderated = self.object.status == Text.MODERATED
+        context = {'moderated': moderated, 'moderated_text': self.object.moderated_text if moderated else None}
         kwargs.update(context)
         return super().get_context_data(**kwargs)
 
     def get_queryset(self):
         classroom = get_object_or_404(Classroom, pk=self.kwargs['pk'])
         miner = self.request.user.miner
-        texts = miner.completed_tasks.filter(task__classroom=classroom)
+        texts = miner.completed_tasks.filter(task__classroom=classroom).select_related('moderated_text')
         return texts
 
     def get_success_url(self, **kwargs):
@@ -154,7 +142,7 @@ class MinerProfileView(BaseMinerView, UpdateView):
         return self.request.user
 
 
-class MinerNotificationsView(BaseMinerView, ListView):
+class MinerNotificationsView(BaseMinerView, KeysetPaginationMixin, ListView):
     model = Notification
     context_object_name = 'notifications'
 
@@ -163,29 +151,43 @@ class MinerUnreadNotificationsView(MinerNotificationsView):
     template_name = 'mine/miner/notifications_unread.html'
 
     def get_queryset(self):
-        return self.request.user.notifications.filter(read=False).order_by('-date')
+        return self.request.user.notifications.filter(read=False).select_related('event').order_by('-date')
 
 
 class MinerReadNotificationsView(MinerNotificationsView):
     template_name = 'mine/miner/notifications_read.html'
 
     def get_queryset(self):
-        return self.request.user.notifications.filter(read=True).order_by('-date')
+        return self.request.user.notifications.filter(read=True).select_related('event').order_by('-date')
 
 
 class MinerNotificationToggleView(BaseMinerView, RedirectView):
     url = reverse_lazy('mine:miner-notifications-unread')
 
     def get(self, request, *args, **kwargs):
-        notifications = Notification.objects.filter(pk=kwargs['pk'])
-        if notifications.exists():
-            notification = notifications.first()
+        read = toggle_read(request.user, kwargs['pk'])
+        if read is not None:
             unread_url = reverse_lazy('mine:miner-notifications-unread')
             read_url = reverse_lazy('mine:miner-notifications-read')
-            self.url = read_url if notification.read else unread_url
-            notification.read = not notification.read
-            notification.save()
+            self.url = unread_url if read else read_url
+        return super().get(request, *args, **kwargs)
+
+
+class MinerNotificationsMarkReadView(BaseMinerView, RedirectView):
+    """GET marks every unread notification as read, POST only the selected ones."""
+    url = reverse_lazy('mine:miner-notifications-unread')
+
+    def get(self, request, *args, **kwargs):
+        mark_read(request.user)
+        return super().get(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        mark_read(request.user, [pk for pk in request.POST.getlist('notifications') if pk.isdigit()])
         return super().get(request, *args, **kwargs)
+
+
+class MinerNotificationStreamView(BaseMinerView, NotificationStreamView):
+    pass
 # endregion MinerPersonal
 
 
@@ -206,9 +208,9 @@ class MinerClassroomListView(BaseMinerView, ListView):
     template_name = "mine/miner/classroom_list.html"
 
     def get_queryset(self):
-        miner = self.request.user.miner
-        return self.request.user.miner.classroom.all() \
-            .annotate(badge=Count('tasks', distinct=True) - Count('completed_tasks', filter=Q(completed_tasks__creator=miner), distinct=True))
+        # One progress row per membership, see apps.mine.progress
+        return Classroom.objects.filter(progress__miner=self.request.user.miner).select_related('owner') \
+            .annotate(badge=F('progress__pending'), completed=F('progress__completed'), graded=F('progress__graded'))
 
 
 class BaseClassroomDetailView(DetailView):
@@ -223,10 +225,8 @@ class MinerClassroomDetailView(BaseMinerView, BaseClassroomDetailView):
     template_name = "mine/miner/classroom.html"
 
     def get_context_data(self, **kwargs):
-        classroom = self.get_object()
-        miner = self.request.user.miner
-        texts = miner.task.all().filter(classroom=classroom).values_list('pk', flat=True)
-        context = {'tasks': classroom.tasks.order_by('-date').exclude(pk__in=texts)}
+        # The miner shares its pk with the user
+        context = {'tasks': pending_tasks(self.request.user.pk, self.object.pk)}
         kwargs.update(context)
         return super().get_context_data(**kwargs)
 
@@ -276,15 +276,16 @@ class MinerClassroomResultDetailView(BaseMinerView, DetailView):
     def get_queryset(self):
         classroom = get_object_or_404(Classroom, pk=self.kwargs['cpk'])
         miner = self.request.user.miner
-        texts = miner.completed_tasks.filter(task__classroom=classroom)
+        texts = miner.completed_tasks.filter(task__classroom=classroom) \
+            .select_related('task__classroom', 'moderated_text__alignment')
         return texts
 
     def get_context_data(self, **kwargs):
-        try:
-            moderated_text = ModeratedText.objects.get(original__pk=self.kwargs['tpk'])
-            context = {'moderated': True, 'moderated_text': moderated_text}
-        except ModeratedText.DoesNotExist:
-            context = {'moderated': False}
+        moderated = self.object.status == Text.MODERATED
+        context = {'moderated': moderated, 'moderated_text': self.object.moderated_text if moderated else None}
+        if moderated:
+            edits = alignment.edits_of(self.object)
+            context['corrections'] = alignment.segments(self.object.content, self.object.moderated_text.content, edits)
         kwargs.update(context)
         return super().get_context_data(**kwargs)
 # endregion Classroom
@@ -2,20 +2,35 @@ from braces.views import GroupRequiredMixin as BaseGroupRequiredMixin, Superuser
 from django.http import Http404, HttpResponseRedirect
 from django.urls import reverse_lazy
 from django.shortcuts import get_object_or_404
-from django.views.generic import CreateView, ListView, DetailView, RedirectView, UpdateView
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Count
+from django.views.generic import CreateView, FormView, ListView, DetailView, RedirectView, UpdateView
+from django.db import transaction
+from django.db.models import F
 from django.contrib import messages
+from django.utils import timezone
 from django.utils.translation import ugettext as _
 
 from apps.authentication.forms import ProfileForm
 from apps.authentication.models import User
-from apps.mine.forms import TextForm, ModerateTextForm, CreateTaskForm, CreateClassroomForm, JoinClassroomForm, ModifyTaskForm
-from apps.mine.models import Text, ModeratedText, Task, Classroom, Notification
+from apps.mine.counters import counter
+from apps.mine.forms import TextForm, ModerateTextForm, CreateTaskForm, CreateClassroomForm, JoinClassroomForm, ModifyTaskForm, \
+    GradeImportForm
+from apps.mine.gradebook import KINDS, distributions
+from apps.mine.grading import GradeError, grade, read_rows
+from apps.mine.models import Text, ModeratedText, Task, TaskGrade, Classroom, Miner, Notification
+from apps.mine.moderation import AlreadyModerated, Claimed, claim, claim_next, moderate, queue, queue_classrooms, release
+from apps.mine.notifications import notify, toggle_read, mark_read
+from apps.mine.permissions import IsModerator
+from apps.mine.pagination import KeysetPaginationMixin, KeysetPaginator
+from apps.mine.similarity import similar
+from apps.mine.view.search import SearchView
+from apps.mine.view.stream import NotificationStreamView
 from apps.mine.task import send_email, send_emails, send_mass_notification
 from config.settings.common import EMAIL_HOST_USER
 
 from nanoid import generate
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 
 # region Base
@@ -28,6 +43,9 @@ class BaseTextModerationView(CreateView):
 
     def get(self, request, *args, **kwargs):
         self.get_initial_text(kwargs.get(self.pk_url_kwarg))
+        if not claim(request.user, self.initial_text.pk):
+            messages.error(request, _("Бұл эссені басқа модератор тексеріп жатыр"))
+            return HttpResponseRedirect(self.get_claimed_url())
         return super().get(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
@@ -35,10 +53,7 @@ class BaseTextModerationView(CreateView):
         return super().post(request, *args, **kwargs)
 
     def get_initial_text(self, pk):
-        text = Text.objects.filter(pk=pk)
-        if not text.exists():
-            raise Http404
-        self.initial_text = text.first()
+        self.initial_text = get_object_or_404(Text, pk=pk)
 
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
@@ -47,14 +62,28 @@ class BaseTextModerationView(CreateView):
         return kwargs
 
     def form_valid(self, form):
-        self.object = form.save(commit=False)
-        self.object.original = self.initial_text
-        self.object.moderator = self.request.user
-        self.object.save()
+        moderated_text = form.save(commit=False)
+        moderated_text.moderator = self.request.user
+        try:
+            self.object = moderate(self.initial_text.pk, moderated_text)
+        except AlreadyModerated:
+            messages.error(self.request, _("Бұл эссе тексеріліп қойған"))
+            return HttpResponseRedirect(self.get_claimed_url())
+        except Claimed:
+            messages.error(self.request, _("Бұл эссені басқа модератор тексеріп жатыр"))
+            return HttpResponseRedirect(self.get_claimed_url())
         self.configure_email(self.object.original.classroom, self.object)
         self.configure_notification(self.object.original.classroom, self.object)
         return super().form_valid(form)
 
+    def get_claimed_url(self):
+        """Where to go when the text is graded or held by someone else."""
+        return self.get_success_url()
+
+    def get_context_data(self, **kwargs):
+        kwargs.update({'similar': similar(self.initial_text)})
+        return super().get_context_data(**kwargs)
+
     def configure_email(self, classroom, moderated_text):
         name = moderated_text.original.creator.user.first_name
         subject = 'Сіздің эссеңіз тексерілді'
@@ -62,13 +91,11 @@ class BaseTextModerationView(CreateView):
         message = 'Сіздің мұғаліміңіз эссеңізді тексерді'
         url = self.request.META['HTTP_HOST'] + moderated_text.get_absolute_url()
         recipient = [moderated_text.original.creator.user.email]
-        send_email(name, subject, title, message, url, recipient)
+        transaction.on_commit(lambda: send_email.delay(name, subject, title, message, url, recipient))
 
     def configure_notification(self, classroom, moderated_text):
         message = '{} сыныбында эссеңіз тексерілді'.format(classroom.title)
-        Notification.objects.create(user=moderated_text.original.creator.user,
-                                    link=self.object.get_absolute_url(),
-                                    description=message)
+        notify([moderated_text.original.creator.user_id], message, self.object.get_absolute_url())
 
 
 class BaseTaskCreateView(CreateView):
@@ -86,12 +113,12 @@ class BaseTaskCreateView(CreateView):
         subject = 'Жаңа тапсырма'
         message = '{} сыныбында жаңа тапсырма жарияланды'.format(classroom.title)
         url = self.request.META['HTTP_HOST'] + task.get_absolute_url()
-        send_emails(classroom.pk, task.pk, subject, message, url)
+        transaction.on_commit(lambda: send_emails.delay(classroom.pk, task.pk, subject, message, url))
 
     def configure_notification(self, classroom, task):
         message = '{} сыныбында жаңа тапсырма жарияланды'.format(classroom.title)
         url = task.get_absolute_url()
-        send_mass_notification(classroom.pk, message, url)
+        transaction.on_commit(lambda: send_mass_notification.delay(classroom.pk, message, url))
 
 
 class BaseModeratorView(BaseGroupRequiredMixin):
@@ -111,8 +138,7 @@ class ModeratorInitialView(BaseModeratorView, DetailView):
 
     def get_context_data(self, **kwargs):
         classroom = self.get_object()
-        moderated_texts = ModeratedText.objects.filter(original__task__classroom=classroom).values_list('original__pk', flat=True)
-        context = {'texts': classroom.completed_tasks.order_by('-date').exclude(pk__in=moderated_texts)}
+        context = {'texts': classroom.completed_tasks.filter(status=Text.PENDING).order_by('-date', '-pk')}
         kwargs.update(context)
         return super().get_context_data(**kwargs)
 
@@ -127,6 +153,9 @@ class ModeratorTextDetailView(BaseModeratorView, CreateView, DetailView):
 
     def get(self, request, *args, **kwargs):
         self.get_initial_text(kwargs.get(self.pk_url_kwarg))
+        if not claim(request.user, self.initial_text.pk):
+            messages.error(request, _("Бұл эссені басқа модератор тексеріп жатыр"))
+            return HttpResponseRedirect(self.get_success_url())
         return super().get(request, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
@@ -146,17 +175,18 @@ class ModeratorTextDetailView(BaseModeratorView, CreateView, DetailView):
         return kwargs
 
     def form_valid(self, form):
-        moderated_texts = ModeratedText.objects.filter(original__pk=self.kwargs['tpk'])
-        if moderated_texts.exists():
+        moderated_text = form.save(commit=False)
+        moderated_text.moderator = self.request.user
+        try:
+            self.object = moderate(self.initial_text.pk, moderated_text)
+        except AlreadyModerated:
             messages.error(self.request, _("Бұл эссе тексеріліп қойған"))
             return HttpResponseRedirect(
-                reverse_lazy('mine:moderator-text-detail', kwargs={'pk': self.kwargs['pk'], 'tpk': self.get_object().pk}))
-        else:
-            self.object = form.save(commit=False)
-            self.object.original = self.initial_text
-            self.object.moderator = self.request.user
-            self.object.save()
-            return super().form_valid(form)
+                reverse_lazy('mine:moderator-text-detail', kwargs={'pk': self.kwargs['pk'], 'tpk': self.kwargs['tpk']}))
+        except Claimed:
+            messages.error(self.request, _("Бұл эссені басқа модератор тексеріп жатыр"))
+            return HttpResponseRedirect(self.get_success_url())
+        return super().form_valid(form)
 
     def get_queryset(self):
         return Text.objects.filter(classroom__pk=self.kwargs['pk'])
@@ -176,7 +206,7 @@ class ModeratorProfileView(BaseModeratorView, UpdateView):
         return self.request.user
 
 
-class ModeratorNotificationsView(BaseModeratorView, ListView):
+class ModeratorNotificationsView(BaseModeratorView, KeysetPaginationMixin, ListView):
     model = Notification
     context_object_name = 'notifications'
 
@@ -185,29 +215,43 @@ class ModeratorUnreadNotificationsView(ModeratorNotificationsView):
     template_name = 'mine/moderator/notifications_unread.html'
 
     def get_queryset(self):
-        return self.request.user.notifications.filter(read=False).order_by('-date')
+        return self.request.user.notifications.filter(read=False).select_related('event').order_by('-date')
 
 
 class ModeratorReadNotificationsView(ModeratorNotificationsView):
     template_name = 'mine/moderator/notifications_read.html'
 
     def get_queryset(self):
-        return self.request.user.notifications.filter(read=True).order_by('-date')
+        return self.request.user.notifications.filter(read=True).select_related('event').order_by('-date')
 
 
 class ModeratorNotificationToggleView(BaseModeratorView, RedirectView):
     url = reverse_lazy('mine:moderator-notifications-unread')
 
     def get(self, request, *args, **kwargs):
-        notifications = Notification.objects.filter(pk=kwargs['pk'])
-        if notifications.exists():
-            notification = notifications.first()
+        read = toggle_read(request.user, kwargs['pk'])
+        if read is not None:
             unread_url = reverse_lazy('mine:moderator-notifications-unread')
             read_url = reverse_lazy('mine:moderator-notifications-read')
-            self.url = read_url if notification.read else unread_url
-            notification.read = not notification.read
-            notification.save()
+            self.url = unread_url if read else read_url
+        return super().get(request, *args, **kwargs)
+
+
+class ModeratorNotificationsMarkReadView(BaseModeratorView, RedirectView):
+    """GET marks every unread notification as read, POST only the selected ones."""
+    url = reverse_lazy('mine:moderator-notifications-unread')
+
+    def get(self, request, *args, **kwargs):
+        mark_read(request.user)
+        return super().get(request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        mark_read(request.user, [pk for pk in request.POST.getlist('notifications') if pk.isdigit()])
         return super().get(request, *args, **kwargs)
+
+
+class ModeratorNotificationStreamView(BaseModeratorView, NotificationStreamView):
+    pass
 # endregion Personal
 
 
@@ -234,53 +278,106 @@ class ModeratorClassroomListView(BaseModeratorView, ListView):
 
     def get_queryset(self):
         return self.request.user.classrooms \
-            .annotate(tasks_count=Count('tasks', distinct=True)) \
-            .annotate(participants_count=Count('participants', distinct=True))
+            .annotate(tasks_count=F('counter__tasks'), participants_count=F('counter__participants'))
+
+
+class ModeratorClassroomPanelMixin:
+    """
+    The tasks, pending texts and moderated texts panels of a classroom. Each panel pages with its
+    own ?<panel>_after=/?<panel>_before= cursors over an index on (classroom, date, pk).
+    """
+    panels = {
+        'task': 5,
+        'text': 10,
+        'moderated': 5,
+    }
+
+    def get_queryset(self):
+        return self.request.user.classrooms
+
+    def get_panel(self, classroom, panel):
+        if panel == 'task':
+            paginator = KeysetPaginator(classroom.tasks.all(), self.panels[panel])
+        elif panel == 'text':
+            paginator = KeysetPaginator(classroom.completed_tasks.filter(status=Text.PENDING)
+                                        .select_related('task', 'creator__user'), self.panels[panel])
+        else:
+            paginator = KeysetPaginator(classroom.completed_tasks.filter(status=Text.MODERATED)
+                                        .select_related('task', 'creator__user'),
+                                        self.panels[panel], date_field='moderated_at')
+        return paginator.page(after=self.request.GET.get(panel + '_after'),
+                              before=self.request.GET.get(panel + '_before'))
 
 
-class ModeratorClassroomDetailView(BaseModeratorView, DetailView):
+class ModeratorClassroomDetailView(BaseModeratorView, ModeratorClassroomPanelMixin, DetailView):
     model = Classroom
     context_object_name = 'classroom'
     template_name = "mine/moderator/classroom.html"
 
+    def get_context_data(self, **kwargs):
+        context = {
+            'tasks': self.get_panel(self.object, 'task'),
+            'texts': self.get_panel(self.object, 'text'),
+            'moderated_texts': self.get_panel(self.object, 'moderated'),
+            'counter': counter(self.object),
+            'participants': self.object.participants.select_related('user').order_by('user__first_name', 'user__last_name'),
+        }
+        kwargs.update(context)
+        return super().get_context_data(**kwargs)
+
+
+class ModeratorClassroomGradebookView(BaseModeratorView, DetailView):
+    """Grade distributions of a classroom per level, task and student, read from the gradebook rollups only."""
+    model = Classroom
+    context_object_name = 'classroom'
+    template_name = 'mine/moderator/classroom_gradebook.html'
+
     def get_queryset(self):
         return self.request.user.classrooms
 
     def get_context_data(self, **kwargs):
-        classroom = self.get_object()
+        levels = distributions(self.object.level_grades.order_by('task_level', 'grade'), 'task_level')
+        tasks = distributions(TaskGrade.objects.filter(task__classroom=self.object).order_by('-task__date', 'task_id', 'grade'),
+                              'task_id', 'task__task_title')
+        miners = distributions(self.object.miner_grades.order_by('miner__user__first_name', 'miner__user__last_name',
+                                                                 'miner_id', 'grade'),
+                               'miner_id', 'miner__user__first_name', 'miner__user__last_name')
+        context = {
+            'levels': [(title, self.kinds(levels[level])) for level, title in Task.LEVEL_CHOICES if level in levels],
+            'tasks': [(title, self.kinds(grades)) for (_, title), grades in tasks.items()],
+            'miners': [('{} {}'.format(first, last), self.kinds(grades)) for (_, first, last), grades in miners.items()],
+        }
+        kwargs.update(context)
+        return super().get_context_data(**kwargs)
 
-        tasks = Task.objects.filter(classroom=classroom).order_by('-date')
-        moderated_texts = ModeratedText.objects.filter(original__task__classroom=classroom).order_by('-date')
-        texts = Text.objects.filter(task__classroom=classroom).order_by('-date').exclude(
-            pk__in=moderated_texts.values_list('original__pk', flat=True))
-        participants = classroom.participants.all().order_by('user__first_name', 'user__last_name')
+    @staticmethod
+    def kinds(grades):
+        return [grades[kind] for kind in KINDS]
 
-        paginator = Paginator(tasks, 5)
-        page = self.request.GET.get('task')
-        try:
-            tasks = paginator.page(page)
-        except (PageNotAnInteger, EmptyPage):
-            tasks = paginator.page(1)
 
-        paginator = Paginator(texts, 10)
-        page = self.request.GET.get('text')
-        try:
-            texts = paginator.page(page)
-        except(PageNotAnInteger, EmptyPage):
-            texts = paginator.page(1)
+class ModeratorClassroomPanelView(BaseModeratorView, ModeratorClassroomPanelMixin, DetailView):
+    """Renders a single panel of ModeratorClassroomDetailView, so that it can be paged on its own."""
+    model = Classroom
+    context_object_name = 'classroom'
+    context_names = {
+        'task': 'tasks',
+        'text': 'texts',
+        'moderated': 'moderated_texts',
+    }
 
-        paginator = Paginator(moderated_texts, 5)
-        page = self.request.GET.get('moderated')
-        try:
-            moderated_texts = paginator.page(page)
-        except(PageNotAnInteger, EmptyPage):
-            moderated_texts = paginator.page(1)
+    def get(self, request, *args, **kwargs):
+        if kwargs['panel'] not in self.panels:
+            raise Http404
+        return super().get(request, *args, **kwargs)
 
+    def get_template_names(self):
+        return ['mine/moderator/classroom_panel_{}.html'.format(self.kwargs['panel'])]
+
+    def get_context_data(self, **kwargs):
+        panel = self.kwargs['panel']
         context = {
-            'tasks': tasks,
-            'texts': texts,
-            'moderated_texts': moderated_texts,
-            'participants': participants
+            self.context_names[panel]: self.get_panel(self.object, panel),
+            'counter': counter(self.object),
         }
         kwargs.update(context)
         return super().get_context_data(**kwargs)
@@ -346,3 +443,113 @@ class ModeratorRemoveUserView(BaseModeratorView, RedirectView):
     def get_redirect_url(self, *args, **kwargs):
         return reverse_lazy('mine:moderator-classroom-detail', kwargs={'pk': self.kwargs['cpk']})
 # endregion Classroom
+
+
+# region Queue
+class ModeratorInboxView(BaseModeratorView, KeysetPaginationMixin, ListView):
+    """Pending texts of every classroom the moderator grades, with who is grading them."""
+    context_object_name = 'texts'
+    template_name = 'mine/moderator/inbox.html'
+
+    def get_queryset(self):
+        return queue(self.request.user).select_related('task', 'classroom', 'creator__user', 'claimed_by')
+
+    def get_context_data(self, **kwargs):
+        kwargs.update({'now': timezone.now()})
+        return super().get_context_data(**kwargs)
+
+
+class ModeratorQueueNextView(BaseModeratorView, RedirectView):
+    """Claims the next texts of the queue and opens the first, ?skip= gives a claimed text back."""
+    def get_redirect_url(self, *args, **kwargs):
+        skipped = [int(pk) for pk in self.request.GET.getlist('skip') if pk.isdigit()]
+        texts = claim_next(self.request.user, exclude_pks=skipped)
+        if skipped:
+            release(self.request.user, skipped)
+        if not texts:
+            messages.info(self.request, _("Тексерілмеген эсселер жоқ"))
+            return reverse_lazy('mine:moderator-inbox')
+        return reverse_lazy('mine:moderator-queue-text', kwargs={'tpk': texts[0].pk})
+
+
+class ModeratorQueueTextView(BaseModeratorView, BaseTextModerationView, DetailView):
+    model = Text
+    context_object_name = 'text'
+    template_name = 'mine/moderator/queue_text.html'
+    success_url = reverse_lazy('mine:moderator-queue-next')
+
+    def get_queryset(self):
+        return queue(self.request.user).select_related('task__classroom')
+
+    def get_initial_text(self, pk):
+        self.initial_text = get_object_or_404(self.get_queryset(), pk=pk)
+
+    def get_claimed_url(self):
+        return reverse_lazy('mine:moderator-inbox')
+
+    def get_context_data(self, **kwargs):
+        # The next text claim_next leased ahead, so the browser can fetch it while this one is graded
+        next_text = Text.objects.filter(claimed_by=self.request.user, status=Text.PENDING) \
+            .exclude(pk=self.initial_text.pk).order_by('date', 'pk').first()
+        kwargs.update({'text': self.initial_text, 'next_text': next_text})
+        return super().get_context_data(**kwargs)
+# endregion Queue
+
+
+# region Grading
+class ModeratorGradeImportView(BaseModeratorView, FormView):
+    """Grades every text of an uploaded CSV or JSON lines file at once, or none of them."""
+    form_class = GradeImportForm
+    template_name = 'mine/moderator/grade_import.html'
+    success_url = reverse_lazy('mine:moderator-inbox')
+
+    def form_valid(self, form):
+        file = form.cleaned_data['file']
+        try:
+            graded = grade(self.request.user, read_rows(file, file.name), self.request.META['HTTP_HOST'])
+        except GradeError as e:
+            return self.render_to_response(self.get_context_data(form=form, errors=e.errors))
+        messages.success(self.request, _("{} эссе тексерілді").format(graded))
+        return super().form_valid(form)
+
+
+class ModeratorGradeAPIView(APIView):
+    """
+    POST a JSON list of {text_id, content, grammar_grade, essay_grade}, or a CSV or JSON lines
+    file as multipart field file. Answers {"graded": n}, or 400 with the errors of every row.
+    """
+    permission_classes = (IsModerator, )
+
+    def post(self, request, *args, **kwargs):
+        file = request.FILES.get('file')
+        try:
+            if file is not None:
+                rows = read_rows(file, file.name)
+            elif isinstance(request.data, list):
+                rows = list(enumerate(request.data, 1))
+            else:
+                return Response({'errors': [{'line': None, 'message': _("Бағалар тізімі керек")}]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            graded = grade(request.user, rows, request.META['HTTP_HOST'])
+        except GradeError as e:
+            return Response({'errors': e.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'graded': graded})
+# endregion Grading
+
+
+# region Search
+class ModeratorSearchView(BaseModeratorView, SearchView):
+    """Searches the essays, corrections, tasks and students of the classrooms the moderator grades."""
+    template_name = 'mine/moderator/search.html'
+
+    def get_scope(self):
+        classrooms = queue_classrooms(self.request.user)
+        members = Miner.classroom.through.objects.filter(classroom__in=classrooms).values('miner_id')
+        return {
+            'texts': Text.objects.filter(classroom__in=classrooms).select_related('creator__user', 'classroom', 'task'),
+            'moderated': ModeratedText.objects.filter(original__classroom__in=classrooms)
+                                             .select_related('original__creator__user', 'original__classroom'),
+            'tasks': Task.objects.filter(classroom__in=classrooms).select_related('classroom'),
+            'people': User.objects.filter(pk__in=members),
+        }
+# endregion Search
@@ -0,0 +1,27 @@
+from django.views.generic import TemplateView
+
+from apps.mine import search
+
+
+class SearchView(TemplateView):
+    """
+    Searches one kind of thing for ?q=, picked with ?in=. Subclasses give the querysets
+    the user may search through get_scope.
+    """
+    kinds = ('texts', 'moderated', 'tasks', 'people')
+
+    def get_scope(self):
+        """A queryset per kind."""
+        raise NotImplementedError
+
+    def get_context_data(self, **kwargs):
+        query = self.request.GET.get('q', '').strip()
+        kind = self.request.GET.get('in')
+        if kind not in self.kinds:
+            kind = self.kinds[0]
+        results = None
+        if query:
+            queryset = self.get_scope()[kind]
+            results = search.people(queryset, query) if kind == 'people' else search.documents(queryset, query)
+        kwargs.update({'query': query, 'kind': kind, 'results': results})
+        return super().get_context_data(**kwargs)
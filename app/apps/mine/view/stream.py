@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.views.generic import View
+
+from apps.mine.notifications import notification_message
+from apps.mine.pubsub import get_pubsub, user_channel
+from config.settings.common import NOTIFICATION_STREAM_HEARTBEAT, NOTIFICATION_STREAM_LIFETIME
+
+
+class NotificationStreamView(View):
+    """
+    Server-sent events stream of the user's new notifications. It is served by the gevent
+    workers of the stream service, so an idle client costs a greenlet rather than a worker.
+    Streams end after lifetime seconds and EventSource reconnects with Last-Event-ID.
+    """
+    heartbeat = NOTIFICATION_STREAM_HEARTBEAT
+    lifetime = NOTIFICATION_STREAM_LIFETIME
+    missed_limit = 50
+
+    def get(self, request, *args, **kwargs):
+        missed = self.get_missed_messages(request.META.get('HTTP_LAST_EVENT_ID'))
+        response = StreamingHttpResponse(self.stream(request.user.pk, missed), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def get_missed_messages(self, last_event_id):
+        if not last_event_id or not last_event_id.isdigit():
+            return []
+        notifications = self.request.user.notifications.filter(read=False, event__pk__gt=int(last_event_id)) \
+            .select_related('event').order_by('event__pk')[:self.missed_limit]
+        return [notification_message(notification.event) for notification in notifications]
+
+    def stream(self, user_pk, missed):
+        # The stream stays open for minutes, it must not hold a database connection meanwhile
+        connection.close()
+        yield 'retry: 5000\n\n'
+        for message in missed:
+            yield self.format(message)
+
+        deadline = time.monotonic() + self.lifetime
+        for message in get_pubsub().subscribe(user_channel(user_pk), self.heartbeat):
+            yield ': keepalive\n\n' if message is None else self.format(message)
+            if time.monotonic() > deadline:
+                break
+
+    def format(self, message):
+        return 'id: {}\nevent: notification\ndata: {}\n\n'.format(message['id'], json.dumps(message))
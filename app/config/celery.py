@@ -1,13 +1,11 @@
-# import os
-# from celery import Celery
-#
-#
-# os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
-#
-# app = Celery('proj')
-# app.config_from_object('django.conf:settings', namespace='CELERY')
-# app.autodiscover_tasks()
-#
-# @app.task(bind=True)
-# def debug_task(self):
-#     print('Request: {0!r}'.format(self.request))
+import os
+from celery import Celery
+
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
+# apps.mine keeps its background jobs in task.py rather than tasks.py
+app.autodiscover_tasks(related_name='task')
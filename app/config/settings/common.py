@@ -62,7 +62,8 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'django.contrib.humanize'
+    'django.contrib.humanize',
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -113,7 +114,8 @@ TEMPLATES = [
                 'django.contrib.messages.context_processors.messages',
                 'social_django.context_processors.backends',
                 'social_django.context_processors.login_redirect',
-                'apps.mine.context_processor.main_classrooms'
+                'apps.mine.context_processor.main_classrooms',
+                'apps.mine.context_processor.unread_notifications'
             ],
         },
     },
@@ -207,15 +209,17 @@ MEDIA_URL = '/public/media/'
 
 FILE_UPLOAD_PERMISSIONS = 0o777
 
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         "LOCATION": env('REDIS_URL'),
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient"
-#         }
-#     }
-# }
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": env('REDIS_URL'),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            # A missing cache falls back to the database instead of failing the request
+            "IGNORE_EXCEPTIONS": True,
+        }
+    }
+}
 
 CACHE_TTL = 60 * 15
 
@@ -265,10 +269,70 @@ CELERY_RESULT_BACKEND = env('RABBITMQ_URL')
 CELERY_ACCEPT_CONTENT = ['application/json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-
-# from celery.schedules import crontab
+CELERY_TASK_IGNORE_RESULT = True
+# Acknowledge only after the task finished so a killed worker hands the message back to the broker
+CELERY_TASK_ACKS_LATE = True
+CELERY_TASK_REJECT_ON_WORKER_LOST = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_DEFAULT_QUEUE = 'mine'
+CELERY_BROKER_TRANSPORT_OPTIONS = {'confirm_publish': True}
+# Run tasks in-process (tests, local development without a broker)
+CELERY_TASK_ALWAYS_EAGER = env.bool('CELERY_TASK_ALWAYS_EAGER', default=False)
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# Retry policy shared by the mail tasks, see apps.mine.task
+MAIL_TASK_MAX_RETRIES = 5
+MAIL_TASK_RETRY_BACKOFF_MAX = 60 * 10
+# Messages sent per SMTP session by the classroom-wide mailings
+EMAIL_BATCH_SIZE = 100
+# Essay submissions to the same teacher and classroom within this many seconds are sent as one digest
+NOTIFICATION_DIGEST_WINDOW = 60 * 5
+# Read notifications older than this many days leave the hot table, archived or purged
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_ARCHIVE = True
+NOTIFICATION_RETENTION_BATCH_SIZE = 1000
+# Seconds a moderator keeps a claimed essay to themselves, and how many more are claimed ahead
+# for them, see apps.mine.moderation
+MODERATION_LEASE = 60 * 15
+MODERATION_PREFETCH = 1
+# Rows fetched per round trip from the server-side cursor of the corpus export, and written per chunk
+CORPUS_EXPORT_CHUNK_SIZE = 2000
+# Essays per shard of the grammatical error correction export, see apps.mine.gec
+GEC_EXPORT_SHARD_SIZE = 50000
+# Moderations aligned per background task and per process pool job, see apps.mine.alignment
+ALIGNMENT_BATCH_SIZE = 500
+# Results per search, see apps.mine.search
+SEARCH_RESULTS = 50
+# Estimated Jaccard similarity from which two texts are flagged as near-duplicates, how many are
+# kept per text, and texts fingerprinted per background task and per process pool job, see apps.mine.similarity
+SIMILARITY_THRESHOLD = 0.5
+SIMILARITY_MAX_MATCHES = 20
+SIMILARITY_BATCH_SIZE = 500
+# Distinct word forms memoized by the tokenizer and the stemmer of each process, see apps.mine.analysis
+ANALYSIS_CACHE_SIZE = 2 ** 17
+# Texts tokenized per background task and per process pool job, and streamed per query, see apps.mine.tokens
+TOKENS_BATCH_SIZE = 500
+
+# Live notifications, see apps.mine.pubsub and apps.mine.view.stream
+NOTIFICATION_PUBSUB_BACKEND = env('NOTIFICATION_PUBSUB_BACKEND', default='apps.mine.pubsub.RedisPubSub')
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_LIFETIME = 60 * 5
+
+from celery.schedules import crontab
 
 CELERY_BEAT_SCHEDULE = {
+    'flush-notification-digests': {
+        'task': 'apps.mine.task.flush_digests',
+        'schedule': 60.0,
+    },
+    'expire-notifications': {
+        'task': 'apps.mine.task.expire_notifications',
+        'schedule': crontab(hour=4, minute=0),
+    },
+    'release-expired-claims': {
+        'task': 'apps.mine.task.release_expired_claims',
+        'schedule': 60.0,
+    },
 }
 
 # SOCIAL AUTH SETTINGS